@@ -1,9 +1,20 @@
+from .archive import ArchiveFile
 from .constants import HEAL_TREE_HEADER, LIVE_TABLE_HEADER, TABLE_HEADER, TREE_HEADER
+from .database import CombatDatabase
 from .datamodels import DetectionInfo, TreeItem
-from .iofunc import compose_logfile, extract_bytes, repair_logfile
-from .liveparser import LiveParser
+from .history import PlayerHistory
+from .instrumentation import Instrumentation
+from .iofunc import archive_logfile, compose_logfile, extract_bytes, repair_logfile
+from .linecolumns import LineColumns
+from .liveparser import LiveParser, LiveParserGroup
 from .main import OSCR
+from .pipeline import PipelineMetrics
+from .progress import CancellationToken, Progress
+from .timeindex import TimestampIndex
 
 __all__ = (
-    'compose_logfile', 'DetectionInfo', 'extract_bytes', 'HEAL_TREE_HEADER', 'LIVE_TABLE_HEADER',
-    'LiveParser', 'OSCR', 'repair_logfile', 'TABLE_HEADER', 'TREE_HEADER', 'TreeItem')
+    'archive_logfile', 'ArchiveFile', 'CancellationToken', 'CombatDatabase', 'compose_logfile',
+    'DetectionInfo', 'extract_bytes', 'HEAL_TREE_HEADER', 'Instrumentation', 'LineColumns',
+    'LIVE_TABLE_HEADER', 'LiveParser', 'LiveParserGroup', 'OSCR', 'PipelineMetrics',
+    'PlayerHistory', 'Progress', 'repair_logfile', 'TABLE_HEADER', 'TimestampIndex', 'TREE_HEADER',
+    'TreeItem')
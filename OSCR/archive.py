@@ -0,0 +1,208 @@
+from bisect import bisect_right
+from collections import OrderedDict
+import io
+import json
+import lzma
+import os
+import struct
+from typing import BinaryIO, Iterable
+import zlib
+
+ARCHIVE_MAGIC = b'OSCRARCH'
+ARCHIVE_VERSION = 1
+ARCHIVE_BLOCK_SIZE = 1 << 20
+
+# magic, version, codec id
+_HEADER = struct.Struct('<8sBB')
+# index offset, index size, magic
+_FOOTER = struct.Struct('<QQ8s')
+_CODECS = {
+    'zlib': (1, lambda data: zlib.compress(data, 6)),
+    'lzma': (2, lambda data: lzma.compress(data, preset=6)),
+}
+_DECOMPRESSORS = {
+    1: zlib.decompress,
+    2: lzma.decompress,
+}
+
+
+def write_archive(
+        source_file: BinaryIO, target_file: BinaryIO, combats: Iterable[tuple] = (),
+        combat_settings: dict | None = None, codec: str = 'zlib',
+        block_size: int = ARCHIVE_BLOCK_SIZE):
+    """
+    Writes data of `source_file` to `target_file` as archive of independently compressed blocks.
+    The archive ends with an index containing the block offsets and the given combats.
+
+    Parameters:
+    - :param source_file: uncompressed logfile opened for reading
+    - :param target_file: file opened for writing, positioned at its start
+    - :param combats: combats contained in the logfile, in the format returned by
+    `OSCR.isolate_combats`
+    - :param combat_settings: settings that were used to isolate the combats
+    - :param codec: compression used for the blocks, "zlib" or "lzma"
+    - :param block_size: number of uncompressed bytes per block
+    """
+    try:
+        codec_id, compress = _CODECS[codec]
+    except KeyError:
+        raise ValueError(f'Unknown archive codec: {codec}')
+    target_file.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, codec_id))
+    compressed_position = _HEADER.size
+    uncompressed_position = 0
+    blocks = list()
+    while True:
+        data = source_file.read(block_size)
+        if not data:
+            break
+        compressed_data = compress(data)
+        target_file.write(compressed_data)
+        blocks.append(
+            (compressed_position, len(compressed_data), uncompressed_position, len(data)))
+        compressed_position += len(compressed_data)
+        uncompressed_position += len(data)
+    index = {
+        'size': uncompressed_position,
+        'blocks': blocks,
+        'combats': list(combats),
+        'combat_settings': combat_settings if combat_settings is not None else dict(),
+    }
+    index_data = zlib.compress(json.dumps(index, separators=(',', ':')).encode('utf-8'))
+    target_file.write(index_data)
+    target_file.write(_FOOTER.pack(compressed_position, len(index_data), ARCHIVE_MAGIC))
+
+
+def is_archive(header: bytes) -> bool:
+    """
+    Returns whether file starting with `header` is a combatlog archive.
+    """
+    return header.startswith(ARCHIVE_MAGIC)
+
+
+def read_archive_index(path: str) -> dict | None:
+    """
+    Returns index of the combatlog archive at `path` or `None` if the file is not an archive.
+
+    Parameters:
+    - :param path: path to the file
+    """
+    with open(path, 'rb') as file:
+        if not is_archive(file.read(len(ARCHIVE_MAGIC))):
+            return None
+    with ArchiveFile(path) as archive_file:
+        return archive_file.index
+
+
+class ArchiveFile(io.RawIOBase):
+    """
+    Seekable read-only view of the uncompressed data in a combatlog archive. Only blocks that are
+    actually read are decompressed.
+    """
+
+    def __init__(self, path: str, cache_size: int = 4):
+        """
+        Opens combatlog archive.
+
+        Parameters:
+        - :param path: path to the archive
+        - :param cache_size: number of decompressed blocks kept in memory
+        """
+        super().__init__()
+        self._file = open(path, 'rb')
+        try:
+            magic, version, codec_id = _HEADER.unpack(self._file.read(_HEADER.size))
+            if not is_archive(magic) or version > ARCHIVE_VERSION:
+                raise ValueError(f'{path} is not a supported combatlog archive')
+            self._decompress = _DECOMPRESSORS[codec_id]
+            self._file.seek(-_FOOTER.size, os.SEEK_END)
+            index_offset, index_size, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+            if not is_archive(magic):
+                raise ValueError(f'{path} is not a complete combatlog archive')
+            self._file.seek(index_offset)
+            self.index: dict = json.loads(zlib.decompress(self._file.read(index_size)))
+        except (KeyError, struct.error, zlib.error):
+            self._file.close()
+            raise ValueError(f'{path} is not a supported combatlog archive')
+        except BaseException:
+            self._file.close()
+            raise
+        self._blocks: list[list[int]] = self.index['blocks']
+        self._block_starts: list[int] = [block[2] for block in self._blocks]
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._cache_size = max(cache_size, 1)
+        self._position = 0
+        self.size: int = self.index['size']
+
+    @property
+    def combats(self) -> list[tuple]:
+        """
+        Combats stored in the archive index.
+        """
+        return [tuple(combat) for combat in self.index['combats']]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise ValueError(f'Negative seek position: {position}')
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._position
+        parts = list()
+        while size > 0 and self._position < self.size:
+            block_id = bisect_right(self._block_starts, self._position) - 1
+            block_offset = self._position - self._block_starts[block_id]
+            part = self._get_block(block_id)[block_offset:block_offset + size]
+            parts.append(part)
+            size -= len(part)
+            self._position += len(part)
+        return b''.join(parts)
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._cache.clear()
+        super().close()
+
+    def _get_block(self, block_id: int) -> bytes:
+        """
+        (Internal Function) Returns decompressed block, using the block cache.
+        """
+        try:
+            self._cache.move_to_end(block_id)
+            return self._cache[block_id]
+        except KeyError:
+            pass
+        compressed_offset, compressed_size, _, _ = self._blocks[block_id]
+        self._file.seek(compressed_offset)
+        data = self._decompress(self._file.read(compressed_size))
+        self._cache[block_id] = data
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return data
@@ -0,0 +1,143 @@
+"""Measures the processing stages of OSCR on existing logfiles"""
+
+from statistics import median
+import sys
+from time import perf_counter
+
+from .combat import Combat
+from .instrumentation import Instrumentation
+from .main import ALL_COMBATS, OSCR
+from .parser import analyze_combat
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def get_peak_rss() -> int | None:
+    """
+    Returns peak resident set size of the current process in bytes or None if the platform does
+    not support measuring it.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _stage_result(durations: list[float], lines: int, size: int) -> dict[str, float]:
+    """
+    (Internal Function) Summarizes the durations of a stage.
+    """
+    median_duration = median(durations)
+    return {
+        'median': median_duration,
+        'best': min(durations),
+        'lines_per_second': lines / median_duration if median_duration > 0 else 0.0,
+        'mb_per_second': size / median_duration / 1_000_000 if median_duration > 0 else 0.0,
+    }
+
+
+def benchmark_logfile(
+        log_path: str, repetitions: int = 3, warmup: int = 1, settings: dict | None = None) -> dict:
+    """
+    Isolates, parses and analyzes all combats of a logfile `warmup + repetitions` times and
+    returns the measurements of the last `repetitions` runs:
+        - "lines", "bytes", "combats": size of the processed data
+        - "stages": maps "isolate" (`OSCR.isolate_combats`), "parse" (reading, tokenizing and
+        splitting) and "analyze" (`analyze_combat` for all combats) to median and best wall time
+        in seconds, lines per second and MB per second
+        - "substages": median wall time of the instrumented stages of parsing and analysis
+        - "peak_rss": peak resident set size of the process in bytes, None if not available
+
+    Parameters:
+    - :param log_path: logfile to benchmark, plain, gzip-compressed or archived
+    - :param repetitions: number of measured runs
+    - :param warmup: number of unmeasured runs before the measured runs
+    - :param settings: settings passed to `OSCR`
+    """
+    parser = OSCR(settings=settings)
+    parse_settings = dict(parser._settings, instrumentation=True)
+    focus_players = parser._get_focus_players()
+    durations: dict[str, list[float]] = {'isolate': list(), 'parse': list(), 'analyze': list()}
+    substage_durations: dict[str, list[float]] = dict()
+    lines = size = combat_count = 0
+    for run_num in range(warmup + repetitions):
+        start = perf_counter()
+        parser.isolate_combats(log_path)
+        isolate_time = perf_counter() - start
+
+        combats: list[Combat] = list()
+        start = perf_counter()
+        OSCR._analyze_log_file(log_path, ALL_COMBATS, 0, -1, parse_settings, combats.append)
+        parse_time = perf_counter() - start
+
+        start = perf_counter()
+        for combat in combats:
+            analyze_combat(combat, focus_players)
+        analyze_time = perf_counter() - start
+
+        if run_num < warmup:
+            continue
+        durations['isolate'].append(isolate_time)
+        durations['parse'].append(parse_time)
+        durations['analyze'].append(analyze_time)
+        instrumentation = Instrumentation()
+        for combat in combats:
+            instrumentation.add_combat(combat.meta)
+        for stage, duration in instrumentation.timings.items():
+            substage_durations.setdefault(stage, list()).append(duration)
+        lines = instrumentation.counters.get('lines', 0)
+        size = instrumentation.counters.get('bytes', 0)
+        combat_count = len(combats)
+    return {
+        'log_path': log_path,
+        'lines': lines,
+        'bytes': size,
+        'combats': combat_count,
+        'repetitions': repetitions,
+        'stages': {
+            stage: _stage_result(stage_durations, lines, size)
+            for stage, stage_durations in durations.items()},
+        'substages': {
+            stage: median(stage_durations)
+            for stage, stage_durations in substage_durations.items()},
+        'peak_rss': get_peak_rss(),
+    }
+
+
+def profile_combat(log_path: str, combat_num: int = 1, settings: dict | None = None) -> dict | None:
+    """
+    Isolates and analyzes a single combat with instrumentation enabled and returns its per-stage
+    breakdown or None if the logfile has less combats:
+        - "combat", "map", "difficulty", "start_time": identify the combat
+        - "timings": wall time of the stages in seconds
+        - "counters": lines, bytes, broken and filtered lines and peak analysis tree size
+        - "total": sum of all stage timings
+        - "peak_rss": peak resident set size of the process in bytes, None if not available
+
+    Parameters:
+    - :param log_path: logfile containing the combat, plain, gzip-compressed or archived
+    - :param combat_num: number of the combat, counted from the end of the logfile starting at 1
+    - :param settings: settings passed to `OSCR`
+    """
+    parser = OSCR(settings=settings)
+    parse_settings = dict(parser._settings, instrumentation=True)
+    isolated: list[Combat] = list()
+    OSCR._analyze_log_file(
+        log_path, combat_num, 0, -1, parse_settings,
+        lambda combat: isolated.append(combat) if combat.id == combat_num - 1 else None)
+    if len(isolated) == 0:
+        return None
+    combat = analyze_combat(isolated[0], parser._get_focus_players())
+    return {
+        'combat': combat_num,
+        'map': combat.map,
+        'difficulty': combat.difficulty,
+        'start_time': combat.start_time.isoformat(),
+        'timings': combat.meta['timings'],
+        'counters': combat.meta['counters'],
+        'total': sum(combat.meta['timings'].values()),
+        'peak_rss': get_peak_rss(),
+    }
@@ -3,17 +3,22 @@
 from argparse import ArgumentParser
 import cProfile
 from datetime import datetime
+import json
 import os
 from pathlib import Path
 import pstats
+import shutil
 
 from . import OSCR
+from .benchmark import benchmark_logfile, profile_combat
 from .combat import Combat
+from .database import CombatDatabase
 
 
 OVERVIEW_HEADER = [
     'Player', 'DPS', 'Combat Time', 'Combat Time Share', 'Total Damage', 'Debuff',
     'Attacks-in Share', 'Taken Damage Share', 'Damage Share', 'Deaths']
+DEFAULT_DATABASE_PATH = os.path.join(os.path.expanduser('~'), '.oscr', 'combats.db')
 
 HELP = """OSCR CLI Usage:
 • help, h
@@ -86,7 +91,7 @@ def format_table(table: list[list[str]], header: list[str], column_alignment: li
         border += '─' * width + '┴'
     border = border[:-1] + '┘'
     output.append(border)
-    width = max(69, os.get_terminal_size().columns - 1)
+    width = max(69, shutil.get_terminal_size().columns - 1)
     if width < len(output[0]):
         return '\n'.join(map(lambda row: row[:width], output))
     else:
@@ -179,7 +184,7 @@ def produce_overview_data(parser: OSCR, isolated_combats: list[list], combat_id:
     """
     """
     if combat_id >= len(parser.combats):
-        parser.analyze_log_file(max_combats=combat_id - len(parser.combats) + 1)
+        parser.analyze_log_file_overview(max_combats=combat_id - len(parser.combats) + 1)
         for id, combat in enumerate(parser.combats):
             combat_summary = [
                 combat.id + 1,
@@ -212,11 +217,11 @@ def print_combat_announcer(combat: Combat):
           f'{formatted_date} {formatted_time}')
 
 
-def interactive_cli(log_path: str | None = None):
+def interactive_cli(log_path: str | None = None, settings: dict | None = None):
     """
     Executes interactive cli for OSCR.
     """
-    parser = OSCR()
+    parser = OSCR(settings=settings)
     # TODO this needs to be integrated into OSCR, but that requires a rewrite
     isolated_combats = list()
     print(
@@ -267,6 +272,120 @@ def interactive_cli(log_path: str | None = None):
                 continue
 
 
+def format_size(size: int | None) -> str:
+    """
+    Formats number of bytes as MiB.
+    """
+    if size is None:
+        return '-'
+    return f'{size / 1_048_576:,.1f} MiB'
+
+
+def print_bench_results(results: dict):
+    """
+    Prints results of `benchmark_logfile` as tables.
+    """
+    print(
+        f"{results['log_path']}: {results['lines']:,} lines, {format_size(results['bytes'])}, "
+        f"{results['combats']} combats, median of {results['repetitions']} runs")
+    table = list()
+    for stage, stage_result in results['stages'].items():
+        table.append([
+            stage,
+            f"{stage_result['median']:.3f}s",
+            f"{stage_result['best']:.3f}s",
+            f"{stage_result['lines_per_second']:,.0f}",
+            f"{stage_result['mb_per_second']:.2f}"])
+    print(format_table(
+        table, ['Stage', 'Median', 'Best', 'Lines/s', 'MB/s'], ['l', 'r', 'r', 'r', 'r']))
+    print_stage_timings(results['substages'])
+    print(f"Peak RSS: {format_size(results['peak_rss'])}")
+
+
+def print_stage_timings(timings: dict[str, float]):
+    """
+    Prints stage timings as table sorted by duration.
+    """
+    total = sum(timings.values())
+    table = list()
+    for stage, duration in sorted(timings.items(), key=lambda item: -item[1]):
+        share = duration / total if total > 0 else 0
+        table.append([stage, f'{duration:.4f}s', f'{share * 100:.1f}%'])
+    table.append(['total', f'{total:.4f}s', '100.0%'])
+    print(format_table(table, ['Stage', 'Time', 'Share'], ['l', 'r', 'r']))
+
+
+def print_profile(profile: dict):
+    """
+    Prints result of `profile_combat` as tables.
+    """
+    difficulty = '' if profile['difficulty'] is None else f" ({profile['difficulty']})"
+    print(f"[{profile['combat']}] -> {profile['map']}{difficulty} {profile['start_time']}")
+    print_stage_timings(profile['timings'])
+    print(format_table(
+        [[name, f'{value:,}'] for name, value in profile['counters'].items()],
+        ['Counter', 'Value'], ['l', 'r']))
+    print(f"Peak RSS: {format_size(profile['peak_rss'])}")
+
+
+def print_ingest_progress(path: str, added: int, skipped: int, error: str):
+    """
+    Prints result of ingesting a single logfile.
+    """
+    if error == '':
+        print(f'{path}: {added} added, {skipped} skipped')
+    else:
+        print(f'{path}: could not be read ({error})')
+
+
+def ingest(args, settings: dict | None):
+    """
+    Executes the `ingest` subcommand.
+    """
+    path = Path(args.folder)
+    if not path.exists() or not path.is_dir():
+        print('The specified folder does not exist. Please choose a different folder.')
+        return
+    with CombatDatabase(args.database) as database:
+        added, skipped = database.ingest_folder(
+            args.folder, args.recursive, settings, print_ingest_progress)
+        print(
+            f'{added} combats added, {skipped} already stored; {len(database)} combats in '
+            f'{args.database}')
+
+
+def run_subcommand(args, settings: dict | None):
+    """
+    Executes the `bench`, `profile` and `ingest` subcommands.
+    """
+    if args.command == 'ingest':
+        ingest(args, settings)
+        return
+    path = Path(args.log)
+    if not path.exists() or not path.is_file():
+        print('The specified logfile does not exist. Please choose a different file.')
+        return
+    if args.command == 'bench':
+        results = benchmark_logfile(args.log, max(1, args.repeat), max(0, args.warmup), settings)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_bench_results(results)
+    else:
+        if args.combat < 1:
+            print('The combat ID must be at least 1.')
+            return
+        profile = profile_combat(args.log, args.combat, settings)
+        if profile is None:
+            print(
+                'The specified combat does not exist in the given logfile. '
+                'Use "combats" / "--combats" to show available combats.')
+        elif args.json:
+            print(json.dumps(profile, indent=2))
+        else:
+            print_profile(profile)
+
+
 def main():
     """Main"""
     argparser = ArgumentParser(prog='OSCR', description='CLI for the Open Source Combatlog Reader')
@@ -278,16 +397,49 @@ def main():
     argparser.add_argument(
         '--overview', '-ov', type=int, required=False, metavar='ID', nargs='?', const=1,
         help='Shows overview table for given combat.')
+    argparser.add_argument(
+        '--player', '-p', type=str, required=False, metavar='HANDLE', action='append',
+        help='Restricts the analysis to the given player; can be given multiple times.')
+    subparsers = argparser.add_subparsers(dest='command', metavar='COMMAND')
+    bench_parser = subparsers.add_parser(
+        'bench', help='Measures isolation, parsing and analysis of all combats in a logfile.')
+    bench_parser.add_argument('log', type=str, metavar='PATH', help='Logfile to benchmark.')
+    bench_parser.add_argument(
+        '--repeat', '-r', type=int, default=3, metavar='N', help='Number of measured runs.')
+    bench_parser.add_argument(
+        '--warmup', '-w', type=int, default=1, metavar='N',
+        help='Number of unmeasured runs before the measured runs.')
+    bench_parser.add_argument('--json', action='store_true', help='Prints results as JSON.')
+    profile_parser = subparsers.add_parser(
+        'profile', help='Shows per-stage timings of the analysis of a single combat.')
+    profile_parser.add_argument(
+        'log', type=str, metavar='PATH', help='Logfile containing the combat.')
+    profile_parser.add_argument(
+        '--combat', '-c', type=int, default=1, metavar='ID',
+        help='Combat to profile, as listed by --combats.')
+    profile_parser.add_argument('--json', action='store_true', help='Prints results as JSON.')
+    ingest_parser = subparsers.add_parser(
+        'ingest', help='Stores all combats of the logfiles in a folder in a database.')
+    ingest_parser.add_argument(
+        'folder', type=str, metavar='PATH', help='Folder containing the logfiles.')
+    ingest_parser.add_argument(
+        '--database', '-d', type=str, default=DEFAULT_DATABASE_PATH, metavar='PATH',
+        help='Database file; created if it does not exist.')
+    ingest_parser.add_argument(
+        '--recursive', '-r', action='store_true', help='Also ingests logfiles in subfolders.')
     args, _ = argparser.parse_known_args()
-    if args.open is None:
+    settings = None if args.player is None else {'focus_players': args.player}
+    if args.command is not None:
+        run_subcommand(args, settings)
+    elif args.open is None:
         if args.combats is None and args.overview is None:
-            interactive_cli()
+            interactive_cli(settings=settings)
         else:
             print('Could not perform action: --open [PATH] must be specified')
     elif args.combats is None and args.overview is None:
-        interactive_cli(args.open)
+        interactive_cli(args.open, settings)
     else:
-        parser = OSCR()
+        parser = OSCR(settings=settings)
         isolated_combats = list()
         combats_to_show = 5
         if args.combats is not None and args.combats > 0:
@@ -1,14 +1,17 @@
 """This file implements the Combat class"""
 
 from collections import deque
+from collections.abc import Collection, Iterable
 from datetime import datetime
 
 from numpy import linspace as numpy__linspace, percentile as numpy__percentile
 from numpy.typing import NDArray
 from .constants import HEAL_TREE_HEADER, TREE_HEADER
-from .datamodels import CritterMeta, DetectionInfo, LogLine, OverviewTableRow, TreeItem, TreeModel
+from .datamodels import (
+    AnalysisState, CritterMeta, DetectionInfo, LogLine, OverviewTableRow, TreeItem, TreeModel)
 from .detection import Detection
 from .export import analysis_table_export
+from .intervals import IntervalIndex
 from .utilities import datetime_to_display, get_entity_name
 
 
@@ -89,7 +92,9 @@ class Combat:
             'log_duration': None,
             'player_duration': None,
             'detection_info': None,  # iterable of DetectionInfo
-            'broken_lines': list()
+            'broken_lines': list(),
+            'timings': None,  # stage name -> seconds, only filled if instrumentation is enabled
+            'counters': None  # counter name -> count, only filled if instrumentation is enabled
         }
         self.players: dict[str, OverviewTableRow] = dict()
         self.critters: dict[str, CritterMeta] = dict()
@@ -99,6 +104,10 @@ class Combat:
         self.damage_in: TreeModel = None
         self.heals_out: TreeModel = None
         self.heals_in: TreeModel = None
+        # only created when the combat was analyzed with `interval_index=True`
+        self.interval_index: IntervalIndex | None = None
+        # only kept when the combat was analyzed with `resumable=True`
+        self.analysis_state: AnalysisState | None = None
 
     @property
     def root_items(self):
@@ -131,6 +140,22 @@ class Combat:
         """Returns the list of players - for compatibility with previous versions"""
         return self.players
 
+    def interval_rows(self, item: TreeItem, start: float, end: float) -> dict[TreeItem, tuple]:
+        """
+        Returns rows of `item` and all items below it, calculated only from the lines inside the
+        given time window; see `IntervalIndex.rows`. Requires the combat to be analyzed with
+        `interval_index=True`.
+
+        Parameters:
+        - :param item: item of one of the analysis trees of this combat
+        - :param start: start of the window in seconds relative to the start of the combat
+        - :param end: end of the window in seconds relative to the start of the combat (not
+        included)
+        """
+        if self.interval_index is None:
+            raise ValueError('Combat was analyzed without interval index')
+        return self.interval_index.rows(item, start, end)
+
     def create_overview_graphs(self, player: OverviewTableRow, combat_interval: tuple[int, int]):
         """
         creates overview graphs from damage graph
@@ -148,7 +173,10 @@ class Combat:
         combat_time_array = player.graph_time - self.graph_resolution * combat_interval[0]
         player.DPS_graph_data = dmg_graph.cumsum() / combat_time_array
 
-    def create_overview(self, overview_graph_intervals: dict[str, tuple[int, int]]):
+    def create_overview(
+            self, overview_graph_intervals: dict[str, tuple[int, int]],
+            share_totals: tuple[float, int, float, float] | None = None,
+            focus_handles: Collection[str] | None = None):
         """
         Creates overview table from analysis data and overview graphs from self.overiew_graphs and
         creates players with that data in self.players
@@ -156,6 +184,9 @@ class Combat:
         Parameters:
         - :overview_graph_intervals: maps player handles to their active combat start and end times
         measured in graph points (1 / graph_resolution points per second of the log)
+        - :param share_totals: total outgoing damage, incoming attacks, incoming damage and
+        outgoing heals of all players; summed up from the analysis data if not given
+        - :param focus_handles: only creates players with these handles if given
         """
         combat_duration = self.meta['player_duration']
         if combat_duration == 0:
@@ -172,6 +203,8 @@ class Combat:
             if player_combat_duration <= 0:
                 continue
             player_name_handle_id = dmg_out_data[0]
+            if focus_handles is not None and player_name_handle_id[1] not in focus_handles:
+                continue
             player = OverviewTableRow(player_name_handle_id[0], player_name_handle_id[1])
             player.DPS = dmg_out_data[1]
             player.combat_time = player_combat_duration
@@ -218,6 +251,22 @@ class Combat:
             # player.build = build
             self.players[player_name_handle_id[0] + player_name_handle_id[1]] = player
 
+        if share_totals is None:
+            share_totals = (total_damage_out, total_attacks_in, total_damage_in, total_heals)
+        self.calculate_shares(*share_totals)
+
+    def calculate_shares(
+            self, total_damage_out: float, total_attacks_in: int, total_damage_in: float,
+            total_heals: float):
+        """
+        Calculates the share of each player in self.players on the given combat-wide totals.
+
+        Parameters:
+        - :param total_damage_out: damage dealt by all players
+        - :param total_attacks_in: attacks received by all players
+        - :param total_damage_in: damage taken by all players
+        - :param total_heals: heals by all players
+        """
         for player in self.players.values():
             try:
                 player.heal_share = player.total_heals / total_heals
@@ -236,12 +285,18 @@ class Combat:
             except ZeroDivisionError:
                 player.damage_share = 0.0
 
-    def map_is_hive_space(self):
+    def map_is_hive_space(self, npc_ids: Iterable[str] | None = None):
         """
         Checks whether the map is Hive Space by checking for existence of a certain entity.
+
+        Parameters:
+        - :param npc_ids: ids of the npcs in the combat; taken from the incoming damage tree if not
+        given
         """
-        for critter in self.damage_in._npc._children:
-            if 'Space_Borg_Dreadnought_Hive_Intro' in critter.data.id[0]:
+        if npc_ids is None:
+            npc_ids = (critter.data.id[0] for critter in self.damage_in._npc._children)
+        for npc_id in npc_ids:
+            if 'Space_Borg_Dreadnought_Hive_Intro' in npc_id:
                 return True
         return False
 
@@ -253,23 +308,30 @@ class Combat:
             if player.data[0] == name_and_handle:
                 return player
 
-    def detect_map(self):
+    def detect_map(self, npc_totals: Iterable[tuple[str, int, float]] | None = None):
         """
         Analyzes the entities on the parser to determine:
             - The map type
             - The difficulty of the map
         Requires combat to be fully analyzed
         Fills `self.meta['detection_info']` with information about the detection
+
+        Parameters:
+        - :param npc_totals: id, deaths and incoming damage of every npc; taken from the incoming
+        damage tree if not given
         """
         self.map = ''
+        if npc_totals is None:
+            npc_totals = (
+                (entity.data[0][2], entity.data[8], entity.data[2])
+                for entity in self.damage_in._npc._children)
         critters: dict[str, CritterMeta] = dict()
-        for entity in self.damage_in._npc._children:
-            entity_name = get_entity_name(entity.data[0][2])
+        for entity_id, deaths, damage in npc_totals:
+            entity_name = get_entity_name(entity_id)
             if entity_name in critters:
-                critters[entity_name].add_critter(entity.data[8], entity.data[2])
+                critters[entity_name].add_critter(deaths, damage)
             else:
-                critters[entity_name] = CritterMeta(
-                        entity_name, 1, entity.data[8], [entity.data[2]])
+                critters[entity_name] = CritterMeta(entity_name, 1, deaths, [damage])
         self.critters = critters
 
         # contains multiple values when multiple entities identify the same map
@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from collections.abc import Iterable, MutableSequence
+from datetime import datetime
+from itertools import count
+import os
+import pickle
+import shutil
+import tempfile
+from threading import RLock
+import zlib
+
+from .combat import Combat
+from .datamodels import TreeItem
+
+# rough memory usage on CPython measured on analyzed combats; graph arrays are counted separately
+LINE_SIZE = 700
+TREE_ITEM_SIZE = 1200
+COMBAT_SIZE = 4096
+
+
+def estimate_combat_size(combat: Combat) -> int:
+    """
+    Returns approximate number of bytes `combat` occupies in memory.
+    """
+    size = COMBAT_SIZE + len(combat.log_data) * LINE_SIZE
+    size += sum(graph.nbytes for graph in combat.overview_graphs.values())
+    if combat.interval_index is not None:
+        size += combat.interval_index.nbytes
+    if combat.damage_out is None:
+        return size
+    pending: list[TreeItem] = [tree_root for tree_root in combat.root_items]
+    state = combat.analysis_state
+    if state is not None:
+        pending.extend(tree_model._root for tree_model in state.tree_models)
+        size += sum(graph.nbytes for graph in state.overview_graphs.values())
+        if state.interval_events is not None:
+            # the events keep the lines alive
+            size += len(state.interval_events) * LINE_SIZE
+    while len(pending) > 0:
+        item = pending.pop()
+        size += TREE_ITEM_SIZE + item.graph_data.nbytes
+        pending.extend(item._children)
+    return size
+
+
+class _Slot:
+    """
+    (Internal Class) Holds a combat of the store either in memory or on disk.
+    """
+
+    __slots__ = ('combat', 'path', 'size', 'summary')
+
+    def __init__(self, combat: Combat, size: int):
+        self.combat: Combat | None = combat
+        self.path: str = ''
+        self.size: int = size
+        self.summary: tuple[str | None, str | None, datetime | None, tuple[int, int]] = (
+            combat.map, combat.difficulty, combat.start_time, tuple(combat.file_pos))
+
+
+class CombatStore(MutableSequence):
+    """
+    List of combats with a memory budget. When the combats held in memory exceed the budget, the
+    least recently used combats are written to disk and transparently read back when accessed.
+    Combats are treated as immutable once they have been stored. Slots can also hold None, like
+    the plain list this replaces.
+    """
+
+    def __init__(
+            self, memory_budget: int = 0, spill_folder_path: str = '',
+            keep_log_data: bool = True):
+        """
+        Parameters:
+        - :param memory_budget: approximate number of bytes that the combats held in memory may
+        occupy; 0 never evicts combats
+        - :param spill_folder_path: folder in which the store creates its own subfolder for evicted
+        combats on demand, so that multiple stores can share it
+        - :param keep_log_data: when False, the raw lines of analyzed combats are dropped when they
+        are stored; they can be re-read with `OSCR.reload_log_data`
+        """
+        super().__init__()
+        self.memory_budget: int = memory_budget
+        self.spill_folder_path: str = spill_folder_path
+        self._spill_subfolder_path: str = ''
+        self.keep_log_data: bool = keep_log_data
+        self._slots: list[_Slot | None] = list()
+        self._resident: OrderedDict[int, _Slot] = OrderedDict()
+        self._resident_size: int = 0
+        self._file_ids = count()
+        self._lock = RLock()
+
+    @property
+    def resident_size(self) -> int:
+        """
+        Approximate number of bytes occupied by the combats held in memory.
+        """
+        return self._resident_size
+
+    @property
+    def spilled_count(self) -> int:
+        """
+        Number of combats currently held on disk only.
+        """
+        with self._lock:
+            return sum(
+                1 for slot in self._slots if slot is not None and slot.combat is None)
+
+    def summaries(
+            self) -> list[tuple[str | None, str | None, datetime | None, tuple[int, int]] | None]:
+        """
+        Returns map, difficulty, start time and position in the logfile of every combat without
+        reading evicted combats from disk; empty slots are None.
+        """
+        with self._lock:
+            return [None if slot is None else slot.summary for slot in self._slots]
+
+    def rearrange(self, indices: Iterable[int | None]):
+        """
+        Replaces the combats with the combats at `indices` without reading evicted combats from
+        disk; None creates an empty slot. Combats not referenced by `indices` are removed.
+
+        Parameters:
+        - :param indices: current index of the combat for each new slot
+        """
+        with self._lock:
+            new_slots = [None if index is None else self._slots[index] for index in indices]
+            kept_slots = {id(slot) for slot in new_slots if slot is not None}
+            for slot in self._slots:
+                if slot is not None and id(slot) not in kept_slots:
+                    self._remove_slot(slot)
+            self._slots = new_slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __getitem__(self, index: int | slice) -> Combat | None | list[Combat | None]:
+        with self._lock:
+            if isinstance(index, slice):
+                return [self._load(slot) for slot in self._slots[index]]
+            return self._load(self._slots[index])
+
+    def __setitem__(self, index: int, combat: Combat | None):
+        with self._lock:
+            new_slot = self._create_slot(combat)
+            self._remove_slot(self._slots[index])
+            self._slots[index] = new_slot
+            self._evict()
+
+    def __delitem__(self, index: int | slice):
+        with self._lock:
+            if isinstance(index, slice):
+                for slot in self._slots[index]:
+                    self._remove_slot(slot)
+            else:
+                self._remove_slot(self._slots[index])
+            del self._slots[index]
+
+    def insert(self, index: int, combat: Combat | None):
+        with self._lock:
+            self._slots.insert(index, self._create_slot(combat))
+            self._evict()
+
+    def extend(self, combats: Iterable[Combat | None]):
+        with self._lock:
+            for combat in combats:
+                self._slots.append(self._create_slot(combat))
+            self._evict()
+
+    def clear(self):
+        """
+        Removes all combats and deletes their files and folder.
+        """
+        with self._lock:
+            for slot in self._slots:
+                self._remove_slot(slot)
+            self._slots.clear()
+            self._remove_spill_folder()
+
+    def __del__(self):
+        """
+        Deletes the folder holding the evicted combats when the store is garbage-collected.
+        """
+        self._remove_spill_folder()
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__}: {len(self._slots)} combats, '
+            f'{self._resident_size / 1_048_576:.1f} MiB in memory>')
+
+    def _remove_spill_folder(self):
+        """
+        (Internal Function) Deletes the folder holding the evicted combats if it has been created.
+        """
+        if self._spill_subfolder_path != '':
+            shutil.rmtree(self._spill_subfolder_path, ignore_errors=True)
+            self._spill_subfolder_path = ''
+
+    def _create_slot(self, combat: Combat | None) -> _Slot | None:
+        """
+        (Internal Function) Wraps combat into slot and registers it as resident.
+        """
+        if combat is None:
+            return None
+        if not self.keep_log_data and combat.meta['log_duration'] is not None:
+            combat.log_data.clear()
+        slot = _Slot(combat, estimate_combat_size(combat))
+        self._resident[id(slot)] = slot
+        self._resident_size += slot.size
+        return slot
+
+    def _remove_slot(self, slot: _Slot | None):
+        """
+        (Internal Function) Forgets slot and deletes its file.
+        """
+        if slot is None:
+            return
+        if self._resident.pop(id(slot), None) is not None:
+            self._resident_size -= slot.size
+        if slot.path != '':
+            try:
+                os.remove(slot.path)
+            except OSError:
+                pass
+            slot.path = ''
+        slot.combat = None
+
+    def _load(self, slot: _Slot | None) -> Combat | None:
+        """
+        (Internal Function) Returns combat of slot, reading it from disk if it was evicted.
+        """
+        if slot is None:
+            return None
+        if slot.combat is not None:
+            self._resident.move_to_end(id(slot))
+            return slot.combat
+        with open(slot.path, 'rb') as spill_file:
+            combat = pickle.loads(zlib.decompress(spill_file.read()))
+        slot.combat = combat
+        self._resident[id(slot)] = slot
+        self._resident_size += slot.size
+        self._evict()
+        return combat
+
+    def _evict(self):
+        """
+        (Internal Function) Writes least recently used combats to disk until the resident combats
+        fit into the memory budget; the most recently used combat is always kept in memory.
+        """
+        if self.memory_budget <= 0:
+            return
+        while self._resident_size > self.memory_budget and len(self._resident) > 1:
+            _, slot = self._resident.popitem(last=False)
+            if slot.path == '':
+                if self._spill_subfolder_path == '':
+                    os.makedirs(self.spill_folder_path, exist_ok=True)
+                    self._spill_subfolder_path = tempfile.mkdtemp(dir=self.spill_folder_path)
+                slot.path = os.path.join(
+                    self._spill_subfolder_path, f'combat_{next(self._file_ids)}.bin')
+                data = zlib.compress(pickle.dumps(slot.combat, pickle.HIGHEST_PROTOCOL), 1)
+                with open(slot.path, 'wb') as spill_file:
+                    spill_file.write(data)
+            slot.combat = None
+            self._resident_size -= slot.size
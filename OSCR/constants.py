@@ -19,6 +19,9 @@ HEAL_TREE_HEADER = (
 LIVE_TABLE_HEADER = (
     'DPS', 'Combat Time', 'Debuff', 'Attacks-in', 'HPS', 'Kills', 'Deaths')
 
+LIVE_FRAME_FIELDS = (
+    'dps', 'combat_time', 'local_debuff', 'local_attacks_in_share', 'hps', 'kills', 'deaths')
+
 BANNED_ABILITIES = {
     'Electrical Overload'}
 
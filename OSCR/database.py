@@ -0,0 +1,293 @@
+from collections.abc import Callable, Iterable
+from hashlib import blake2b
+import json
+import os
+import sqlite3
+
+from .combat import Combat
+from .constants import HEAL_TREE_HEADER, TREE_HEADER
+from .datamodels import OverviewTableRow, TreeModel
+from .main import ALL_COMBATS, default_settings, OSCR
+from .parser import analyze_combat
+
+FINGERPRINT_LINES = 16
+LOGFILE_SUFFIXES = ('.log', '.txt', '.gz', '.oscr')
+
+
+def _column_name(header: str) -> str:
+    """
+    (Internal Function) Converts table header to column name: "Crit Chance" -> "crit_chance"
+    """
+    return header.lower().replace(' ', '_')
+
+
+PLAYER_COLUMNS = tuple(
+    field.lower()
+    for field in OverviewTableRow.__slots__[2:OverviewTableRow.__slots__.index('base_damage') + 1])
+DAMAGE_COLUMNS = tuple(map(_column_name, TREE_HEADER[1:]))
+HEAL_COLUMNS = tuple(map(_column_name, HEAL_TREE_HEADER[1:]))
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS combats (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    log_file TEXT NOT NULL,
+    byte_start INTEGER,
+    byte_end INTEGER,
+    map TEXT,
+    difficulty TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    log_duration REAL,
+    player_duration REAL
+);
+CREATE INDEX IF NOT EXISTS combats_map ON combats (map, difficulty);
+CREATE INDEX IF NOT EXISTS combats_start_time ON combats (start_time);
+CREATE TABLE IF NOT EXISTS players (
+    combat_id INTEGER NOT NULL REFERENCES combats (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    build TEXT,
+    {', '.join(f'{column} REAL' for column in PLAYER_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS players_combat ON players (combat_id);
+CREATE INDEX IF NOT EXISTS players_handle ON players (handle);
+CREATE TABLE IF NOT EXISTS damage_abilities (
+    combat_id INTEGER NOT NULL REFERENCES combats (id) ON DELETE CASCADE,
+    player_id TEXT NOT NULL,
+    ability TEXT NOT NULL,
+    {', '.join(f'{column} REAL' for column in DAMAGE_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS damage_abilities_combat ON damage_abilities (combat_id);
+CREATE INDEX IF NOT EXISTS damage_abilities_ability ON damage_abilities (ability);
+CREATE TABLE IF NOT EXISTS heal_abilities (
+    combat_id INTEGER NOT NULL REFERENCES combats (id) ON DELETE CASCADE,
+    player_id TEXT NOT NULL,
+    ability TEXT NOT NULL,
+    {', '.join(f'{column} REAL' for column in HEAL_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS heal_abilities_combat ON heal_abilities (combat_id);
+CREATE INDEX IF NOT EXISTS heal_abilities_ability ON heal_abilities (ability);
+CREATE TABLE IF NOT EXISTS critters (
+    combat_id INTEGER NOT NULL REFERENCES combats (id) ON DELETE CASCADE,
+    name TEXT,
+    count INTEGER,
+    deaths INTEGER,
+    hull_values TEXT
+);
+CREATE INDEX IF NOT EXISTS critters_combat ON critters (combat_id);
+"""
+
+
+def combat_fingerprint(combat: Combat) -> str:
+    """
+    Returns fingerprint identifying the byte range of an isolated combat independent of the file
+    it was read from. Combines the length of the byte range, the number of lines and the first and
+    last lines of the combat, so it can be computed without reading the logfile again.
+    """
+    fingerprint = blake2b(digest_size=16)
+    fingerprint.update(
+        f'{combat.file_pos[1] - combat.file_pos[0]}:{len(combat.log_data)}'.encode())
+    line_count = len(combat.log_data)
+    if line_count <= 2 * FINGERPRINT_LINES:
+        boundary_lines = list(combat.log_data)
+    else:
+        boundary_lines = [combat.log_data[i] for i in range(FINGERPRINT_LINES)]
+        boundary_lines += [
+            combat.log_data[i] for i in range(line_count - FINGERPRINT_LINES, line_count)]
+    for line in boundary_lines:
+        fingerprint.update(repr(tuple(line)).encode())
+    return fingerprint.hexdigest()
+
+
+def _ability_rows(tree_model: TreeModel, combat_id: int) -> list[tuple]:
+    """
+    (Internal Function) Returns rows for the per-player ability tables from the first level below
+    the players of `tree_model`, like `analysis_table_export`.
+    """
+    rows = list()
+    for player in tree_model._player._children:
+        player_id = player.data[0][2]
+        for ability in player._children:
+            ability_name = ability.data[0]
+            if isinstance(ability_name, tuple):
+                ability_name = ''.join(ability_name)
+            rows.append((combat_id, player_id, ability_name, *ability.data[1:]))
+    return rows
+
+
+class CombatDatabase:
+    """
+    Persistent store of analyzed combats backed by sqlite.
+    """
+
+    __slots__ = ('path', '_connection', '_fingerprints')
+
+    def __init__(self, path: str):
+        """
+        Opens or creates database.
+
+        Parameters:
+        - :param path: database file
+        """
+        self.path: str = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('PRAGMA foreign_keys=ON')
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+        self._fingerprints: set[str] = {
+            row[0] for row in self._connection.execute('SELECT fingerprint FROM combats')}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._connection.close()
+
+    def contains(self, fingerprint: str) -> bool:
+        """
+        Returns True if a combat with this fingerprint is stored already.
+        """
+        return fingerprint in self._fingerprints
+
+    def query(self, sql: str, parameters: Iterable = ()) -> list[tuple]:
+        """
+        Executes a query and returns all resulting rows.
+        """
+        return self._connection.execute(sql, tuple(parameters)).fetchall()
+
+    def add_combats(self, combats: Iterable[tuple[str, Combat]]) -> int:
+        """
+        Stores analyzed combats in a single transaction and returns the number of added combats.
+        Combats whose fingerprint is stored already are skipped.
+
+        Parameters:
+        - :param combats: pairs of fingerprint and fully analyzed combat
+        """
+        player_rows = list()
+        damage_rows = list()
+        heal_rows = list()
+        critter_rows = list()
+        added_fingerprints = set()
+        with self._connection:
+            for fingerprint, combat in combats:
+                if fingerprint in self._fingerprints or fingerprint in added_fingerprints:
+                    continue
+                cursor = self._connection.execute(
+                    'INSERT INTO combats (fingerprint, log_file, byte_start, byte_end, map, '
+                    'difficulty, start_time, end_time, log_duration, player_duration) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                        fingerprint, os.path.abspath(combat.log_file), combat.file_pos[0],
+                        combat.file_pos[1], combat.map, combat.difficulty,
+                        combat.start_time.isoformat(), combat.end_time.isoformat(),
+                        combat.meta['log_duration'], combat.meta['player_duration']))
+                combat_id = cursor.lastrowid
+                added_fingerprints.add(fingerprint)
+                for player in combat.players.values():
+                    player_rows.append((
+                        combat_id, player.name, player.handle, player.build,
+                        *(getattr(player, field) for field in OverviewTableRow.__slots__[
+                            2:2 + len(PLAYER_COLUMNS)])))
+                if combat.damage_out is not None:
+                    damage_rows.extend(_ability_rows(combat.damage_out, combat_id))
+                    heal_rows.extend(_ability_rows(combat.heals_out, combat_id))
+                for critter in combat.critters.values():
+                    critter_rows.append((
+                        combat_id, critter.name, critter.count, critter.deaths,
+                        json.dumps(list(map(float, critter.hull_values)))))
+            self._connection.executemany(
+                f'INSERT INTO players VALUES ({", ".join("?" * (4 + len(PLAYER_COLUMNS)))})',
+                player_rows)
+            self._connection.executemany(
+                f'INSERT INTO damage_abilities VALUES '
+                f'({", ".join("?" * (3 + len(DAMAGE_COLUMNS)))})', damage_rows)
+            self._connection.executemany(
+                f'INSERT INTO heal_abilities VALUES ({", ".join("?" * (3 + len(HEAL_COLUMNS)))})',
+                heal_rows)
+            self._connection.executemany(
+                'INSERT INTO critters VALUES (?, ?, ?, ?, ?)', critter_rows)
+        self._fingerprints.update(added_fingerprints)
+        return len(added_fingerprints)
+
+    def ingest_log(
+            self, path: str, settings: dict | None = None, batch_size: int = 20) -> tuple[int, int]:
+        """
+        Isolates all combats of a logfile, analyzes those that are not stored yet and stores them.
+        Returns the number of added and skipped combats.
+
+        Parameters:
+        - :param path: logfile, plain, gzip-compressed or archived
+        - :param settings: settings passed to `OSCR`
+        - :param batch_size: number of analyzed combats stored per transaction
+        """
+        parse_settings = default_settings(settings)
+        batch: list[tuple[str, Combat]] = list()
+        counts = [0, 0]
+
+        def handle_combat(combat: Combat):
+            fingerprint = combat_fingerprint(combat)
+            if fingerprint in self._fingerprints or any(
+                    fingerprint == batched for batched, _ in batch):
+                counts[1] += 1
+                return
+            analyze_combat(combat)
+            combat.log_data.clear()
+            batch.append((fingerprint, combat))
+            if len(batch) >= batch_size:
+                counts[0] += self.add_combats(batch)
+                batch.clear()
+
+        OSCR._analyze_log_file(path, ALL_COMBATS, 0, -1, parse_settings, handle_combat)
+        counts[0] += self.add_combats(batch)
+        return counts[0], counts[1]
+
+    def ingest_folder(
+            self, folder_path: str, recursive: bool = False, settings: dict | None = None,
+            progress_callback: Callable[[str, int, int, str], None] | None = None
+    ) -> tuple[int, int]:
+        """
+        Ingests all logfiles in a folder, see `ingest_log`. Returns the total number of added and
+        skipped combats. Logfiles that cannot be read are left out.
+
+        Parameters:
+        - :param folder_path: folder containing the logfiles; files ending with one of
+        `LOGFILE_SUFFIXES` are ingested
+        - :param recursive: also ingests logfiles in subfolders
+        - :param settings: settings passed to `OSCR`
+        - :param progress_callback: called after every logfile with its path, the number of added
+        and skipped combats and an empty string on success or the class name of the error on
+        failure
+        """
+        total_added = total_skipped = 0
+        for folder, subfolders, files in os.walk(folder_path):
+            if not recursive:
+                subfolders.clear()
+            subfolders.sort()
+            for file_name in sorted(files):
+                if not file_name.lower().endswith(LOGFILE_SUFFIXES):
+                    continue
+                path = os.path.join(folder, file_name)
+                error = ''
+                try:
+                    added, skipped = self.ingest_log(path, settings)
+                except (OSError, ValueError, EOFError) as ex:
+                    added = skipped = 0
+                    error = ex.__class__.__name__
+                total_added += added
+                total_skipped += skipped
+                if progress_callback is not None:
+                    progress_callback(path, added, skipped, error)
+        return total_added, total_skipped
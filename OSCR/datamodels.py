@@ -1,8 +1,12 @@
 from collections import namedtuple
+from datetime import datetime
+from typing import Iterable
 
 from numpy import float64, zeros as numpy__zeros
 from numpy.typing import NDArray
 
+from .constants import HEAL_TREE_HEADER, TREE_HEADER
+
 LogLine = namedtuple(
     'LogLine',
     (
@@ -61,6 +65,77 @@ class CritterMeta:
         return f'<CritterMeta "Nane: {self.name} Count: {self.count} Deaths: {self.deaths}">'
 
 
+class CombatTotals:
+    """
+    Combat-wide scalar totals per actor. Replaces the analysis trees as source for shares and map
+    detection when the trees only contain a subset of the actors.
+    """
+
+    __slots__ = ('damage_out', 'damage_in', 'attacks_in', 'heals_out', 'npc_deaths', 'npc_damage')
+
+    def __init__(self):
+        self.damage_out: dict[str, float] = dict()
+        self.damage_in: dict[str, float] = dict()
+        self.attacks_in: dict[str, int] = dict()
+        self.heals_out: dict[str, float] = dict()
+        self.npc_deaths: dict[str, int] = dict()
+        self.npc_damage: dict[str, float] = dict()
+
+    def add_line(self, line: LogLine, is_heal: bool, is_kill: bool):
+        """
+        Adds line to the totals, mirroring how `analyze_combat` sorts it into the trees.
+
+        Parameters:
+        - :param line: line to add
+        - :param is_heal: whether the line is a heal
+        - :param is_kill: whether the line has the kill flag
+        """
+        magnitude = abs(line.magnitude)
+        owner_id = line.owner_id
+        if is_heal:
+            if owner_id.startswith('P'):
+                self.heals_out[owner_id] = self.heals_out.get(owner_id, 0) + magnitude
+            return
+        if owner_id.startswith('P'):
+            self.damage_out[owner_id] = self.damage_out.get(owner_id, 0) + magnitude
+        target_id = line.target_id
+        if target_id.startswith('P'):
+            self.damage_in[target_id] = self.damage_in.get(target_id, 0) + magnitude
+            self.attacks_in[target_id] = self.attacks_in.get(target_id, 0) + 1
+        else:
+            self.npc_damage[target_id] = self.npc_damage.get(target_id, 0) + magnitude
+            self.npc_deaths[target_id] = self.npc_deaths.get(target_id, 0) + is_kill
+
+    def get_share_totals(
+            self, combat_durations: dict[str, float]) -> tuple[float, int, float, float]:
+        """
+        Returns total outgoing damage, incoming attacks, incoming damage and outgoing heals of all
+        players with a combat time above zero.
+
+        Parameters:
+        - :param combat_durations: maps actor ids to their combat time
+        """
+        total_damage_out = 0
+        total_attacks_in = 0
+        total_damage_in = 0
+        total_heals = 0
+        for player_id, damage in self.damage_out.items():
+            if combat_durations.get(player_id, 0) <= 0:
+                continue
+            total_damage_out += damage
+            total_attacks_in += self.attacks_in.get(player_id, 0)
+            total_damage_in += self.damage_in.get(player_id, 0)
+            total_heals += self.heals_out.get(player_id, 0)
+        return total_damage_out, total_attacks_in, total_damage_in, total_heals
+
+    def iter_npcs(self) -> Iterable[tuple[str, int, float]]:
+        """
+        Yields id, deaths and incoming damage of every npc.
+        """
+        for npc_id, damage in self.npc_damage.items():
+            yield npc_id, self.npc_deaths[npc_id], damage
+
+
 class DetectionInfo:
     """
     Stores information on the detection process
@@ -505,3 +580,135 @@ class TreeModel():
         source.append_child(ability)
         self.ability_index[actor_id][source_id][ability_id] = ability
         return ability
+
+
+class AnalysisState:
+    """
+    Accumulators of the analysis of a combat before the analysis trees are completed. Keeping them
+    allows adding lines appended to the combat later without analyzing its earlier lines again.
+    """
+
+    __slots__ = (
+        'damage_out', 'damage_in', 'heals_out', 'heals_in', 'actor_combat_durations',
+        'overview_graphs', 'combat_start', 'last_line_time', 'end_time', 'graph_resolution',
+        'graph_duration', 'focus_handles', 'focus_ids', 'combat_totals', 'interval_events')
+
+    def __init__(
+            self, combat_start: datetime, graph_resolution: float, graph_duration: int,
+            focus_handles: frozenset[str] | None = None, interval_index: bool = False):
+        """
+        Parameters:
+        - :param combat_start: timestamp of the first line of the combat
+        - :param graph_resolution: duration of one overview graph interval
+        - :param graph_duration: number of seconds the graphs of the analysis trees are allocated
+        for; the graphs grow when lines after that are added
+        - :param focus_handles: handles of the players to analyze, including the leading "@"; all
+        players are analyzed if not given
+        - :param interval_index: collects the events needed to create an `IntervalIndex`
+        """
+        self.damage_out: TreeModel = TreeModel(TREE_HEADER)
+        self.damage_in: TreeModel = TreeModel(TREE_HEADER)
+        self.heals_out: TreeModel = TreeModel(HEAL_TREE_HEADER)
+        self.heals_in: TreeModel = TreeModel(HEAL_TREE_HEADER)
+        # actor id -> timestamps of the first and last line counting towards its combat time
+        self.actor_combat_durations: dict[str, list[datetime]] = dict()
+        # player handle -> damage per graph interval
+        self.overview_graphs: dict[str, NDArray] = dict()
+        self.combat_start: datetime = combat_start
+        self.last_line_time: datetime = combat_start
+        # timestamp of the Queen kill line in the Hive Space queue; later lines are ignored
+        self.end_time: datetime | None = None
+        self.graph_resolution: float = graph_resolution
+        self.graph_duration: int = graph_duration
+        self.focus_handles: frozenset[str] | None = focus_handles
+        self.focus_ids: dict[str, bool] | None = None
+        self.combat_totals: CombatTotals | None = None
+        if focus_handles is not None:
+            self.focus_ids = dict()
+            self.combat_totals = CombatTotals()
+        self.interval_events: list[tuple] | None = list() if interval_index else None
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__}: {len(self.actor_combat_durations)} actors, '
+            f'{self.graph_duration}s>')
+
+    @property
+    def tree_models(self) -> tuple[TreeModel, TreeModel, TreeModel, TreeModel]:
+        """Uncompleted analysis trees: Damage Out, Damage In, Heals Out, Heals In"""
+        return (self.damage_out, self.damage_in, self.heals_out, self.heals_in)
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer holding the most recent values of a time series. Keeps running sums over
+    trailing windows, so appending a value and retrieving a window sum cost O(1).
+    """
+
+    __slots__ = ('_values', '_capacity', '_position', '_count', '_window_sums')
+
+    def __init__(self, capacity: int, windows: Iterable[int] = ()):
+        """
+        Parameters:
+        - :param capacity: maximum number of values held by the buffer
+        - :param windows: lengths of the trailing windows to keep sums for, measured in number of
+        values; must not exceed `capacity`
+        """
+        self._values: list[float] = [0.0] * capacity
+        self._capacity: int = capacity
+        self._position: int = 0
+        self._count: int = 0
+        self._window_sums: dict[int, float] = {window: 0.0 for window in windows}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self._count}/{self._capacity} values>'
+
+    def append(self, value: float):
+        """
+        Adds value to the buffer, replacing the oldest value if the buffer is full.
+
+        Parameters:
+        - :param value: value to add
+        """
+        for window in self._window_sums:
+            if self._count >= window:
+                self._window_sums[window] += value - self._values[self._position - window]
+            else:
+                self._window_sums[window] += value
+        self._values[self._position] = value
+        self._position += 1
+        if self._position == self._capacity:
+            self._position = 0
+            # recalculating once per wrap prevents floating point errors from accumulating
+            for window in self._window_sums:
+                self._window_sums[window] = sum(self._values[-window:])
+        if self._count < self._capacity:
+            self._count += 1
+
+    def window_sum(self, window: int) -> float:
+        """
+        Returns sum of the last `window` values. Window must have been passed on creation.
+        """
+        return self._window_sums[window]
+
+    def window_mean(self, window: int) -> float:
+        """
+        Returns average of the last `window` values; only considers values that have been appended
+        already. Window must have been passed on creation.
+        """
+        try:
+            return self._window_sums[window] / min(window, self._count)
+        except ZeroDivisionError:
+            return 0.0
+
+    def history(self, length: int) -> list[float]:
+        """
+        Returns the last `length` values, oldest first.
+        """
+        length = min(length, self._count)
+        if length <= self._position:
+            return self._values[self._position - length:self._position]
+        return self._values[self._position - length:] + self._values[:self._position]
@@ -0,0 +1,338 @@
+from collections.abc import Iterable
+from datetime import datetime
+from threading import RLock
+
+from numpy import (
+    add as numpy__add, append as numpy__append, arange as numpy__arange, argsort as numpy__argsort,
+    array as numpy__array, cumsum as numpy__cumsum, datetime64, diff as numpy__diff,
+    empty as numpy__empty, flatnonzero as numpy__flatnonzero, float64, int32, int64,
+    isin as numpy__isin, lexsort as numpy__lexsort, maximum as numpy__maximum,
+    median as numpy__median, minimum as numpy__minimum, ones as numpy__ones,
+    zeros as numpy__zeros)
+from numpy.typing import NDArray
+
+from .combat import Combat
+from .datamodels import OverviewTableRow
+
+# numeric columns, taken from the overview table
+NUMERIC_FIELDS = OverviewTableRow.__slots__[2:OverviewTableRow.__slots__.index('base_damage') + 1]
+# columns holding strings, stored as codes into a list of distinct values
+CATEGORY_FIELDS = ('player', 'handle', 'map', 'difficulty')
+AGGREGATES = ('count', 'max', 'mean', 'median', 'min', 'sum')
+
+
+class PlayerHistory:
+    """
+    Columnar table with one row per player and combat. Contains the numeric columns of the overview
+    table (see `NUMERIC_FIELDS`), the category columns "player" (name and handle), "handle", "map"
+    and "difficulty", the column "start_time" holding the start of the combat in microseconds
+    since the epoch and the column "combat" numbering the combats in order of insertion.
+    Combats can be added and removed while other threads query the table.
+    """
+
+    __slots__ = (
+        '_numeric', '_categories', '_category_values', '_category_codes', '_start_time',
+        '_combat', '_size', '_combat_keys', '_next_combat_num', '_lock')
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Parameters:
+        - :param capacity: number of rows to allocate initially; grows as needed
+        """
+        self._numeric: dict[str, NDArray[float64]] = {
+            field: numpy__empty(capacity, float64) for field in NUMERIC_FIELDS}
+        self._categories: dict[str, NDArray[int32]] = {
+            field: numpy__empty(capacity, int32) for field in CATEGORY_FIELDS}
+        self._category_values: dict[str, list[str | None]] = {
+            field: list() for field in CATEGORY_FIELDS}
+        self._category_codes: dict[str, dict[str | None, int]] = {
+            field: dict() for field in CATEGORY_FIELDS}
+        self._start_time: NDArray[int64] = numpy__empty(capacity, int64)
+        self._combat: NDArray[int64] = numpy__empty(capacity, int64)
+        self._size: int = 0
+        # maps logfile and position in the logfile of every added combat to its number
+        self._combat_keys: dict[tuple, int] = dict()
+        self._next_combat_num: int = 0
+        self._lock = RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self._size} rows, {len(self._combat_keys)} combats>'
+
+    @property
+    def combat_count(self) -> int:
+        """
+        Number of combats in the table.
+        """
+        return len(self._combat_keys)
+
+    def add_combat(self, combat: Combat) -> bool:
+        """
+        Adds one row per player of an analyzed combat. Returns False if the combat has already been
+        added or has no players.
+
+        Parameters:
+        - :param combat: analyzed combat
+        """
+        with self._lock:
+            combat_key = (combat.log_file, tuple(combat.file_pos))
+            if combat_key in self._combat_keys or len(combat.players) == 0:
+                return False
+            combat_num = self._combat_keys[combat_key] = self._next_combat_num
+            self._next_combat_num += 1
+            self._reserve(len(combat.players))
+            start_time = int(datetime64(combat.start_time, 'us').astype(int64))
+            for player in combat.players.values():
+                row = self._size
+                for field, column in self._numeric.items():
+                    column[row] = getattr(player, field)
+                self._set_category('player', row, player.name + player.handle)
+                self._set_category('handle', row, player.handle)
+                self._set_category('map', row, combat.map)
+                self._set_category('difficulty', row, combat.difficulty)
+                self._start_time[row] = start_time
+                self._combat[row] = combat_num
+                self._size += 1
+            return True
+
+    def remove_combat(self, combat: Combat) -> bool:
+        """
+        Removes the rows of a combat, for example when it has been replaced by a more complete
+        version. Returns False if the combat has not been added.
+
+        Parameters:
+        - :param combat: previously added combat
+        """
+        return self.remove_combat_at(combat.log_file, tuple(combat.file_pos))
+
+    def remove_combat_at(self, log_file: str, file_pos: tuple[int, int]) -> bool:
+        """
+        Removes the rows of the combat covering `file_pos` in `log_file`, see `remove_combat`; the
+        combat itself is not required, so evicted combats need not be read from disk.
+
+        Parameters:
+        - :param log_file: logfile the combat was parsed from
+        - :param file_pos: positions of the first byte and the byte after the combat
+        """
+        with self._lock:
+            combat_num = self._combat_keys.pop((log_file, tuple(file_pos)), None)
+            if combat_num is None:
+                return False
+            keep = numpy__flatnonzero(self._combat[:self._size] != combat_num)
+            new_size = len(keep)
+            for columns in (self._numeric, self._categories):
+                for column in columns.values():
+                    column[:new_size] = column[keep]
+            for column in (self._start_time, self._combat):
+                column[:new_size] = column[keep]
+            self._size = new_size
+            return True
+
+    def extend(self, combats: Iterable[Combat]):
+        """
+        Adds all given combats; see `add_combat`.
+        """
+        with self._lock:
+            for combat in combats:
+                if combat is not None:
+                    self.add_combat(combat)
+
+    def column(self, field: str) -> NDArray:
+        """
+        Returns column as array. Category columns are returned as arrays of strings.
+
+        Parameters:
+        - :param field: numeric field, category field, "start_time" or "combat"
+        """
+        with self._lock:
+            # copies, as removing a combat moves the rows of the table
+            if field in self._numeric:
+                return self._numeric[field][:self._size].copy()
+            elif field in self._categories:
+                values = numpy__empty(len(self._category_values[field]), object)
+                values[:] = self._category_values[field]
+                return values[self._categories[field][:self._size]]
+            elif field == 'start_time':
+                return self._start_time[:self._size].astype('datetime64[us]')
+            elif field == 'combat':
+                return self._combat[:self._size].copy()
+            raise KeyError(field)
+
+    def categories(self, field: str) -> list[str | None]:
+        """
+        Returns distinct values of a category column.
+        """
+        with self._lock:
+            return list(self._category_values[field])
+
+    def select(
+            self, player: str | Iterable[str] | None = None,
+            handle: str | Iterable[str] | None = None,
+            map: str | Iterable[str] | None = None,
+            difficulty: str | Iterable[str] | None = None, since: datetime | None = None,
+            until: datetime | None = None) -> NDArray:
+        """
+        Returns boolean mask of the rows matching all given conditions.
+
+        Parameters:
+        - :param player: player name and handle or iterable of them
+        - :param handle: handle or iterable of handles
+        - :param map: map or iterable of maps
+        - :param difficulty: difficulty or iterable of difficulties
+        - :param since: earliest start time of the combat
+        - :param until: latest start time of the combat (not included)
+        """
+        with self._lock:
+            mask = numpy__ones(self._size, bool)
+            for field, values in (
+                    ('player', player), ('handle', handle), ('map', map),
+                    ('difficulty', difficulty)):
+                if values is None:
+                    continue
+                if isinstance(values, str):
+                    values = (values,)
+                codes = [
+                    self._category_codes[field][value] for value in values
+                    if value in self._category_codes[field]]
+                mask &= numpy__isin(self._categories[field][:self._size], codes)
+            if since is not None:
+                mask &= self._start_time[:self._size] >= int(datetime64(since, 'us').astype(int64))
+            if until is not None:
+                mask &= self._start_time[:self._size] < int(datetime64(until, 'us').astype(int64))
+            return mask
+
+    def aggregate(
+            self, field: str, function: str = 'mean', by: str | tuple[str] = ('player',),
+            mask: NDArray | None = None, last: int = 0) -> dict[tuple, float]:
+        """
+        Groups the rows by the given category columns and aggregates a numeric column per group.
+        Returns dictionary mapping tuples of the group values to the aggregated value.
+
+        Parameters:
+        - :param field: numeric column to aggregate
+        - :param function: one of `AGGREGATES`
+        - :param by: category column or tuple of category columns to group by
+        - :param mask: boolean mask selecting the rows to consider, see `select`
+        - :param last: when larger than 0, only the most recent `last` combats of every group are
+        aggregated
+        """
+        with self._lock:
+            if function not in AGGREGATES:
+                raise ValueError(f'Unknown aggregate function: {function}')
+            if isinstance(by, str):
+                by = (by,)
+            values = self._numeric[field][:self._size]
+            group_codes = numpy__zeros(self._size, int64)
+            for category in by:
+                group_codes *= len(self._category_values[category])
+                group_codes += self._categories[category][:self._size]
+            start_times = self._start_time[:self._size]
+            if mask is not None:
+                values = values[mask]
+                group_codes = group_codes[mask]
+                start_times = start_times[mask]
+            if len(values) == 0:
+                return dict()
+            if last > 0:
+                order = numpy__lexsort((start_times, group_codes))
+            else:
+                order = numpy__argsort(group_codes, kind='stable')
+            group_codes = group_codes[order]
+            values = values[order]
+            group_starts = _get_group_starts(group_codes)
+            if last > 0:
+                # rows are sorted by start time within their group, so the last rows are the newest
+                group_ends = numpy__append(group_starts[1:], len(group_codes))
+                row_group_ends = group_ends[numpy__cumsum(_get_group_mask(group_codes)) - 1]
+                keep = row_group_ends - numpy__arange(len(group_codes)) <= last
+                values = values[keep]
+                group_codes = group_codes[keep]
+                group_starts = _get_group_starts(group_codes)
+            aggregated = _reduce(values, group_starts, function)
+            result = dict()
+            for group_code, value in zip(group_codes[group_starts].tolist(), aggregated.tolist()):
+                key = list()
+                for category in reversed(by):
+                    category_values = self._category_values[category]
+                    group_code, category_code = divmod(group_code, len(category_values))
+                    key.append(category_values[category_code])
+                result[tuple(reversed(key))] = value
+            return result
+
+    def _reserve(self, row_count: int):
+        """
+        (Internal Function) Grows the columns so that `row_count` more rows fit.
+        """
+        capacity = len(self._start_time)
+        if self._size + row_count <= capacity:
+            return
+        new_capacity = max(capacity * 2, self._size + row_count)
+        for columns in (self._numeric, self._categories):
+            for field, column in columns.items():
+                new_column = numpy__empty(new_capacity, column.dtype)
+                new_column[:self._size] = column[:self._size]
+                columns[field] = new_column
+        for attribute in ('_start_time', '_combat'):
+            column = getattr(self, attribute)
+            new_column = numpy__empty(new_capacity, column.dtype)
+            new_column[:self._size] = column[:self._size]
+            setattr(self, attribute, new_column)
+
+    def _set_category(self, field: str, row: int, value: str | None):
+        """
+        (Internal Function) Stores code of `value` in the category column.
+        """
+        codes = self._category_codes[field]
+        try:
+            code = codes[value]
+        except KeyError:
+            code = codes[value] = len(self._category_values[field])
+            self._category_values[field].append(value)
+        self._categories[field][row] = code
+
+
+def _get_group_mask(group_codes: NDArray) -> NDArray:
+    """
+    (Internal Function) Returns boolean mask of the first row of every group in sorted group codes.
+    """
+    group_mask = numpy__empty(len(group_codes), bool)
+    if len(group_codes) > 0:
+        group_mask[0] = True
+        group_mask[1:] = group_codes[1:] != group_codes[:-1]
+    return group_mask
+
+
+def _get_group_starts(group_codes: NDArray) -> NDArray:
+    """
+    (Internal Function) Returns indices of the first row of every group in sorted group codes.
+    """
+    return numpy__flatnonzero(_get_group_mask(group_codes))
+
+
+def _reduce(values: NDArray, group_starts: NDArray, function: str) -> NDArray:
+    """
+    (Internal Function) Aggregates consecutive groups of values.
+
+    Parameters:
+    - :param values: values sorted by group
+    - :param group_starts: index of the first value of every group
+    - :param function: one of `AGGREGATES`
+    """
+    group_sizes = numpy__diff(numpy__append(group_starts, len(values)))
+    match function:
+        case 'count':
+            return group_sizes
+        case 'sum':
+            return numpy__add.reduceat(values, group_starts)
+        case 'mean':
+            return numpy__add.reduceat(values, group_starts) / group_sizes
+        case 'max':
+            return numpy__maximum.reduceat(values, group_starts)
+        case 'min':
+            return numpy__minimum.reduceat(values, group_starts)
+        case _:
+            return numpy__array([
+                numpy__median(values[start:start + size])
+                for start, size in zip(group_starts.tolist(), group_sizes.tolist())])
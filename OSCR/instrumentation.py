@@ -0,0 +1,112 @@
+from threading import RLock
+from time import perf_counter
+
+from .datamodels import TreeItem, TreeModel
+
+
+def record_stage(timings: dict[str, float], stage: str, stage_start: float) -> float:
+    """
+    Adds the wall time since `stage_start` to `stage` and returns the current time, which can be
+    used as start of the next stage.
+
+    Parameters:
+    - :param timings: maps stage names to accumulated wall time in seconds
+    - :param stage: name of the stage
+    - :param stage_start: value of `time.perf_counter` at the start of the stage
+    """
+    now = perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - stage_start
+    return now
+
+
+def count_tree_items(tree_model: TreeModel) -> int:
+    """
+    Returns number of items in `tree_model`, excluding the root and category items.
+    """
+    item_count = 0
+    pending: list[TreeItem] = [tree_model._player, tree_model._npc]
+    while len(pending) > 0:
+        item = pending.pop()
+        item_count += len(item._children)
+        pending.extend(item._children)
+    return item_count
+
+
+class Instrumentation:
+    """
+    Accumulates stage timings and counters over multiple combats. Timings are wall times in
+    seconds; counters whose name starts with "peak_" keep their maximum instead of their sum.
+    Data can be added from multiple threads.
+    """
+
+    __slots__ = ('timings', 'counters', 'combats', '_lock')
+
+    def __init__(self):
+        self.timings: dict[str, float] = dict()
+        self.counters: dict[str, int] = dict()
+        self.combats: int = 0
+        self._lock = RLock()
+
+    def add_combat(self, combat_meta: dict):
+        """
+        Adds timings and counters of a single combat.
+
+        Parameters:
+        - :param combat_meta: `Combat.meta` of an analyzed combat
+        """
+        timings = combat_meta.get('timings')
+        counters = combat_meta.get('counters')
+        if timings is None or counters is None:
+            return
+        with self._lock:
+            self.combats += 1
+            for stage, duration in timings.items():
+                self.timings[stage] = self.timings.get(stage, 0.0) + duration
+            for name, value in counters.items():
+                self.add_counter(name, value)
+
+    def add_time(self, stage: str, duration: float):
+        """
+        Adds `duration` seconds to `stage`.
+        """
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + duration
+
+    def add_counter(self, name: str, value: int):
+        """
+        Adds `value` to counter `name`, or keeps the maximum if `name` starts with "peak_".
+        """
+        with self._lock:
+            if name.startswith('peak_'):
+                self.counters[name] = max(self.counters.get(name, 0), value)
+            else:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """
+        Clears all recorded data.
+        """
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+            self.combats = 0
+
+    def report(self) -> str:
+        """
+        Returns recorded data formatted as text table.
+        """
+        with self._lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+            combats = self.combats
+        total_time = sum(timings.values())
+        lines = [f'{combats} combats, {total_time:.3f}s total']
+        for stage, duration in sorted(timings.items(), key=lambda item: -item[1]):
+            share = duration / total_time if total_time > 0 else 0.0
+            lines.append(f'  {stage:<20}{duration:>10.4f}s {share:>7.1%}')
+        for name, value in sorted(counters.items()):
+            lines.append(f'  {name:<20}{value:>11,}')
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.combats} combats>'
@@ -0,0 +1,318 @@
+"""Time window queries on the analysis trees of a combat"""
+
+from collections.abc import Iterable
+from math import ceil, floor
+
+from numpy import (
+    add as numpy__add, arange as numpy__arange, argsort as numpy__argsort,
+    array as numpy__array, cumsum as numpy__cumsum, empty as numpy__empty,
+    flatnonzero as numpy__flatnonzero, float64, int64, maximum as numpy__maximum,
+    zeros as numpy__zeros)
+from numpy.typing import NDArray
+
+from .datamodels import LogLine, TreeItem
+
+# raw counters summed per second, in the order of the columns of the cumulative arrays
+DAMAGE_COUNTERS = (
+    'total_damage', 'kills', 'total_attacks', 'misses', 'crit_num', 'flank_num',
+    'total_shield_damage', 'total_hull_damage', 'total_base_damage', 'hull_attacks',
+    'shield_attacks')
+HEAL_COUNTERS = (
+    'total_heal', 'hull_heal', 'shield_heal', 'heal_ticks', 'critical_heals', 'hull_heal_ticks',
+    'shield_heal_ticks')
+
+# per line: second relative to combat start, leaf of the outgoing tree, leaf of the incoming tree,
+# line, is heal, is shield line, critical hit, miss, flank, kill
+IntervalEvent = tuple[int, TreeItem, TreeItem, LogLine, bool, bool, bool, bool, bool, bool]
+
+
+class _CumulativeTable:
+    """
+    (Internal Class) Cumulative per-second sums of the counters of all leaves of one kind. Only
+    seconds in which a leaf has lines are stored, sorted by leaf and second. The sums restart at
+    every leaf, so counters that are zero for a leaf stay exactly zero; the sums of leaf number `n`
+    are preceded by a row of zeros, so the sum of the first `i` stored seconds is `sums[i + n]`.
+    """
+
+    __slots__ = ('keys', 'sums', 'maxima', 'actors')
+
+    def __init__(
+            self, keys: list[int], values: list[tuple], magnitudes: list[float],
+            actors: list[str], column_count: int, stride: int):
+        """
+        Parameters:
+        - :param keys: leaf number times `stride` plus second of every line and leaf
+        - :param values: counters of every line and leaf
+        - :param magnitudes: magnitude of every line and leaf
+        - :param actors: actor id of every leaf, indexed by leaf number
+        - :param column_count: number of counters
+        - :param stride: number of seconds reserved per leaf in the keys
+        """
+        self.actors: list[str] = actors
+        if len(keys) == 0:
+            self.keys: NDArray[int64] = numpy__empty(0, int64)
+            self.sums: NDArray[float64] = numpy__zeros((1, column_count), float64)
+            self.maxima: NDArray[float64] = numpy__zeros(1, float64)
+            return
+        keys = numpy__array(keys, int64)
+        order = numpy__argsort(keys, kind='stable')
+        keys = keys[order]
+        bin_mask = numpy__empty(len(keys), bool)
+        bin_mask[0] = True
+        bin_mask[1:] = keys[1:] != keys[:-1]
+        bin_starts = numpy__flatnonzero(bin_mask)
+        self.keys = keys[bin_starts]
+        bin_values = numpy__add.reduceat(
+            numpy__array(values, float64)[order], bin_starts, axis=0)
+        leaf_bounds = self.keys.searchsorted(
+            numpy__arange(len(actors) + 1, dtype=int64) * stride).tolist()
+        self.sums = numpy__zeros((len(self.keys) + len(actors), column_count), float64)
+        for leaf_num, first_bin, end_bin in zip(
+                range(len(actors)), leaf_bounds[:-1], leaf_bounds[1:]):
+            numpy__cumsum(
+                bin_values[first_bin:end_bin], axis=0,
+                out=self.sums[first_bin + leaf_num + 1:end_bin + leaf_num + 1])
+        # the trailing zero allows slices ending behind the last second in `window_sums`
+        self.maxima = numpy__zeros(len(self.keys) + 1, float64)
+        self.maxima[:-1] = numpy__maximum.reduceat(
+            numpy__array(magnitudes, float64)[order], bin_starts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.sums.nbytes + self.maxima.nbytes
+
+    def window_sums(
+            self, leaves: NDArray[int64], stride: int, start: int,
+            end: int) -> tuple[NDArray[float64], NDArray[float64]]:
+        """
+        Returns counter sums and maximum magnitudes of the given leaves in the seconds
+        `start <= second < end`; one row per leaf.
+        """
+        first_bins = self.keys.searchsorted(leaves * stride + start)
+        end_bins = self.keys.searchsorted(leaves * stride + end)
+        sums = self.sums[end_bins + leaves] - self.sums[first_bins + leaves]
+        return sums, _range_maxima(self.maxima, first_bins, end_bins)
+
+
+class IntervalIndex:
+    """
+    Cumulative per-second sums of the raw counters of every leaf in the analysis trees of a combat.
+    Allows retrieving the rows of any subtree restricted to a time window without reparsing the
+    combat; the sums of a leaf in a window are the difference of two cumulative sums.
+    """
+
+    __slots__ = ('_leaves', '_damage', '_heal', '_actor_spans', '_stride', 'duration')
+
+    def __init__(
+            self, events: Iterable[IntervalEvent], actor_spans: dict[str, tuple[float, float]],
+            duration: int):
+        """
+        Parameters:
+        - :param events: one event per analyzed line, see `IntervalEvent`
+        - :param actor_spans: seconds of the first and last line that counts towards the combat
+        time of the actor, relative to the start of the combat
+        - :param duration: seconds between the first and last line of the combat, rounded up
+        """
+        self.duration: int = duration
+        self._stride: int = duration + 1
+        self._actor_spans: dict[str, tuple[float, float]] = actor_spans
+        # leaf -> (is heal leaf, leaf number)
+        self._leaves: dict[TreeItem, tuple[bool, int]] = dict()
+        columns = {
+            False: (list(), list(), list(), list()),
+            True: (list(), list(), list(), list())}
+        for (second, out_leaf, in_leaf, line, is_heal, is_shield, crit, miss, flank,
+                kill) in events:
+            keys, values, magnitudes, actors = columns[is_heal]
+            magnitude = abs(line.magnitude)
+            if is_heal:
+                if is_shield:
+                    row = (magnitude, 0.0, magnitude, 1, crit, 0, 1)
+                else:
+                    row = (magnitude, magnitude, 0.0, 1, crit, 1, 0)
+            elif is_shield:
+                row = (magnitude, kill, 1, miss, crit, flank, magnitude, 0.0, 0.0, 0, 1)
+            else:
+                row = (
+                    magnitude, kill, 1, miss, crit, flank, 0.0, magnitude,
+                    abs(line.magnitude2), 1, 0)
+            for leaf, actor_id in ((out_leaf, line.owner_id), (in_leaf, line.target_id)):
+                try:
+                    leaf_num = self._leaves[leaf][1]
+                except KeyError:
+                    leaf_num = len(actors)
+                    self._leaves[leaf] = (is_heal, leaf_num)
+                    actors.append(actor_id)
+                keys.append(leaf_num * self._stride + second)
+                values.append(row)
+                magnitudes.append(magnitude)
+        self._damage = _CumulativeTable(*columns[False], len(DAMAGE_COUNTERS), self._stride)
+        self._heal = _CumulativeTable(*columns[True], len(HEAL_COUNTERS), self._stride)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {len(self._leaves)} leaves, {self.duration}s>'
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes occupied by the cumulative arrays.
+        """
+        return self._damage.nbytes + self._heal.nbytes
+
+    def rows(self, item: TreeItem, start: float, end: float) -> dict[TreeItem, tuple]:
+        """
+        Returns rows of `item` and all items below it restricted to a time window, formatted like
+        the rows of the analysis trees (see `TREE_HEADER` and `HEAL_TREE_HEADER`). Items above the
+        actors ("Player", "NPC" and the root) have no rows of their own, their actors and all items
+        below them are returned. Counters have a resolution of one second; the combat time of a
+        row is the part of the window in which its actor was in combat.
+
+        Parameters:
+        - :param item: item of one of the analysis trees of the combat
+        - :param start: start of the window in seconds relative to the start of the combat
+        - :param end: end of the window in seconds relative to the start of the combat (not
+        included)
+        """
+        nodes: list[TreeItem] = list()
+        bounds: list[int] = list()
+        leaves: list[int] = list()
+        is_heal = _collect_leaves(item, self._leaves, nodes, bounds, leaves)
+        if len(nodes) == 0:
+            return dict()
+        table = self._heal if is_heal else self._damage
+        leaves = numpy__array(leaves, int64)
+        leaf_sums, leaf_maxima = table.window_sums(
+            leaves, self._stride, max(0, floor(start)), min(self._stride, ceil(end)))
+        node_bounds = numpy__array(bounds, int64).reshape(-1, 2)
+        # summing instead of subtracting cumulative sums keeps zero counters exactly zero
+        padded_sums = numpy__zeros((len(leaves) + 1, leaf_sums.shape[1]), float64)
+        padded_sums[:-1] = leaf_sums
+        sums = numpy__add.reduceat(padded_sums, node_bounds.ravel(), axis=0)[0::2]
+        sums[node_bounds[:, 0] == node_bounds[:, 1]] = 0.0
+        padded_maxima = numpy__zeros(len(leaves) + 1, float64)
+        padded_maxima[:-1] = leaf_maxima
+        maxima = _range_maxima(padded_maxima, node_bounds[:, 0], node_bounds[:, 1])
+        combat_times = numpy__zeros(len(nodes), float64)
+        for node_num, (first_leaf, end_leaf) in enumerate(node_bounds.tolist()):
+            if first_leaf == end_leaf:
+                continue
+            span_start, span_end = self._actor_spans.get(
+                table.actors[leaves[first_leaf]], (0.0, 0.0))
+            combat_times[node_num] = round(max(0.0, min(end, span_end) - max(start, span_start)), 1)
+        if is_heal:
+            row_data = _heal_rows(sums, maxima, combat_times)
+        else:
+            leaf_mask = numpy__array([node.child_count == 0 for node in nodes], bool)
+            row_data = _damage_rows(sums, maxima, combat_times, leaf_mask)
+        return {node: (node.data[0], *data) for node, data in zip(nodes, row_data)}
+
+    def row(self, item: TreeItem, start: float, end: float) -> tuple:
+        """
+        Returns row of `item` restricted to a time window, see `rows`.
+        """
+        return self.rows(item, start, end)[item]
+
+
+def _collect_leaves(
+        item: TreeItem, leaf_index: dict[TreeItem, tuple[bool, int]], nodes: list[TreeItem],
+        bounds: list[int], leaves: list[int]) -> bool:
+    """
+    (Internal Function) Collects the leaves below `item` in depth-first order. Appends all items
+    with rows to `nodes` and the range of their leaves in `leaves` to `bounds`. Returns True if the
+    leaves belong to a heal tree.
+    """
+    is_heal = False
+    if item.parent is None or item.parent.parent is None:
+        for child in item._children:
+            is_heal |= _collect_leaves(child, leaf_index, nodes, bounds, leaves)
+        return is_heal
+    pending: list[tuple[TreeItem, int]] = [(item, -1)]
+    while len(pending) > 0:
+        node, node_num = pending.pop()
+        if node_num >= 0:
+            bounds[2 * node_num + 1] = len(leaves)
+            continue
+        node_num = len(nodes)
+        nodes.append(node)
+        bounds.extend((len(leaves), len(leaves)))
+        if node.child_count == 0:
+            leaf = leaf_index.get(node)
+            if leaf is not None:
+                is_heal, leaf_num = leaf
+                leaves.append(leaf_num)
+            bounds[-1] = len(leaves)
+        else:
+            pending.append((node, node_num))
+            pending.extend((child, -1) for child in reversed(node._children))
+    return is_heal
+
+
+def _range_maxima(
+        values: NDArray[float64], starts: NDArray[int64], ends: NDArray[int64]) -> NDArray[float64]:
+    """
+    (Internal Function) Returns maximum of `values[start:end]` for all pairs of start and end; 0 for
+    empty ranges. The last element of `values` must be 0 and is never part of a range.
+    """
+    bounds = numpy__empty(2 * len(starts), int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    maxima = numpy__maximum.reduceat(values, bounds)[0::2]
+    maxima[starts == ends] = 0.0
+    return maxima
+
+
+def _ratio(numerators: NDArray[float64], denominators: NDArray[float64]) -> NDArray[float64]:
+    """
+    (Internal Function) Divides element-wise; division by zero results in 0.
+    """
+    result = numpy__zeros(len(numerators), float64)
+    mask = denominators != 0
+    result[mask] = numerators[mask] / denominators[mask]
+    return result
+
+
+def _damage_rows(
+        sums: NDArray[float64], maxima: NDArray[float64], combat_times: NDArray[float64],
+        leaf_mask: NDArray[bool]) -> Iterable[tuple]:
+    """
+    (Internal Function) Calculates the columns of `TREE_HEADER` following the name from raw
+    counter sums; see `calculate_damage_row_stats` and `combine_children_damage_stats`.
+    """
+    (total_damage, kills, total_attacks, misses, crit_num, flank_num, shield_damage, hull_damage,
+        base_damage, hull_attacks, shield_attacks) = sums.T
+    successful_attacks = hull_attacks - misses
+    debuff = _ratio(total_damage, base_damage)
+    debuff[base_damage != 0] -= 1
+    crit_chance = _ratio(crit_num, successful_attacks)
+    accuracy = _ratio(successful_attacks, hull_attacks)
+    flank_rate = _ratio(flank_num, successful_attacks)
+    # combined rows have all three ratios zeroed when one of them cannot be calculated
+    invalid_ratios = ~leaf_mask & ((successful_attacks == 0) | (hull_attacks == 0))
+    crit_chance[invalid_ratios] = 0.0
+    accuracy[invalid_ratios] = 0.0
+    flank_rate[invalid_ratios] = 0.0
+    counts = sums[:, [1, 2, 3, 4, 5, 9, 10]].astype(int64).T.tolist()
+    return zip(
+        _ratio(total_damage, combat_times).tolist(), total_damage.tolist(), debuff.tolist(),
+        maxima.tolist(), crit_chance.tolist(), accuracy.tolist(), flank_rate.tolist(), counts[0],
+        counts[1], counts[2], counts[3], counts[4], shield_damage.tolist(),
+        _ratio(shield_damage, combat_times).tolist(), hull_damage.tolist(),
+        _ratio(hull_damage, combat_times).tolist(), base_damage.tolist(),
+        _ratio(base_damage, combat_times).tolist(), combat_times.tolist(), counts[5], counts[6])
+
+
+def _heal_rows(
+        sums: NDArray[float64], maxima: NDArray[float64],
+        combat_times: NDArray[float64]) -> Iterable[tuple]:
+    """
+    (Internal Function) Calculates the columns of `HEAL_TREE_HEADER` following the name from raw
+    counter sums; see `calculate_heal_row_stats`.
+    """
+    total_heal, hull_heal, shield_heal, _, critical_heals, hull_heal_ticks, _ = sums.T
+    counts = sums[:, [3, 4, 5, 6]].astype(int64).T.tolist()
+    return zip(
+        _ratio(total_heal, combat_times).tolist(), total_heal.tolist(), hull_heal.tolist(),
+        _ratio(hull_heal, combat_times).tolist(), shield_heal.tolist(),
+        _ratio(shield_heal, combat_times).tolist(), maxima.tolist(),
+        _ratio(critical_heals, hull_heal_ticks).tolist(), counts[0], counts[1],
+        combat_times.tolist(), counts[2], counts[3])
@@ -1,10 +1,32 @@
+from collections.abc import Callable
 from gzip import open as gzip_open
+import io
 import os
+import re
 import shutil
-from time import time
-from typing import Iterable
+import tempfile
+from typing import BinaryIO, Iterable
 
+from numpy import (
+    add as numpy__add, concatenate as numpy__concatenate, flatnonzero as numpy__flatnonzero,
+    frombuffer as numpy__frombuffer, int32, uint8)
+
+from .archive import ARCHIVE_BLOCK_SIZE, ARCHIVE_MAGIC, ArchiveFile, is_archive, write_archive
 from .constants import PATCHES
+from .progress import CancellationToken
+
+REPAIR_BLOCK_SIZE = 1 << 23
+COPY_BUFFER_SIZE = 1 << 20
+
+_NATIVE_COPY = hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile')
+# O_BINARY keeps Windows from translating line breaks
+_NEW_FILE_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+
+_PATCH_REPLACEMENTS = dict(PATCHES)
+if len(PATCHES) > 0:
+    _PATCH_PATTERN = re.compile(b'|'.join(re.escape(broken) for broken, _ in PATCHES))
+else:
+    _PATCH_PATTERN = None
 
 
 def format_timestamp(timestamp: str) -> str:
@@ -14,6 +36,125 @@ def format_timestamp(timestamp: str) -> str:
     return timestamp.replace(':', '-', 2).replace(':', '_', 1).split('.')[0]
 
 
+def open_logfile(path: str) -> BinaryIO:
+    """
+    Opens logfile for reading in binary mode. Transparently decompresses gzip-compressed logfiles
+    and combatlog archives.
+
+    Parameters:
+    - :param path: path to the logfile
+    """
+    log_file = open(path, 'rb')
+    header = log_file.read(len(ARCHIVE_MAGIC))
+    if header.startswith(b'\x1f\x8b'):
+        log_file.close()
+        return gzip_open(path, 'rb')
+    if is_archive(header):
+        log_file.close()
+        return ArchiveFile(path)
+    log_file.seek(0)
+    return log_file
+
+
+def _copy_file_range_native(
+        source_file: BinaryIO, target_file: BinaryIO, start_pos: int, end_pos: int) -> int:
+    """
+    (Internal Function) Copies bytes from `start_pos` up to `end_pos` of `source_file` to the
+    current position of `target_file` inside the kernel. Returns the position up to which the data
+    was copied; copying stops early if the operation is not supported for the given files.
+    """
+    source_file.flush()
+    target_file.flush()
+    source_fd = source_file.fileno()
+    target_fd = target_file.fileno()
+    try:
+        while start_pos < end_pos:
+            if hasattr(os, 'copy_file_range'):
+                copied = os.copy_file_range(source_fd, target_fd, end_pos - start_pos, start_pos)
+            else:
+                copied = os.sendfile(target_fd, source_fd, start_pos, end_pos - start_pos)
+            if copied == 0:
+                break
+            start_pos += copied
+    except OSError:
+        pass
+    target_file.seek(os.lseek(target_fd, 0, os.SEEK_CUR))
+    return start_pos
+
+
+def _copy_file_range(source_file: BinaryIO, target_file: BinaryIO, start_pos: int, end_pos: int):
+    """
+    (Internal Function) Copies bytes from `start_pos` up to `end_pos` of `source_file` to the
+    current position of `target_file`. Regular files are copied by the kernel where supported, all
+    other files (like decompressing readers) are streamed through a bounded buffer.
+    """
+    if (_NATIVE_COPY and isinstance(source_file, (io.BufferedReader, io.BufferedRandom))
+            and isinstance(target_file, (io.BufferedWriter, io.BufferedRandom))):
+        start_pos = _copy_file_range_native(source_file, target_file, start_pos, end_pos)
+    source_file.seek(start_pos)
+    remaining = end_pos - start_pos
+    while remaining > 0:
+        data = source_file.read(min(remaining, COPY_BUFFER_SIZE))
+        if not data:
+            break
+        target_file.write(data)
+        remaining -= len(data)
+
+
+def _open_new_file(folder_path: str) -> tuple[int, str]:
+    """
+    (Internal Function) Creates file with unique name in `folder_path` and returns its file
+    descriptor and path. Unlike `tempfile.mkstemp`, the file gets the permissions of a regular new
+    file, the kernel applies the umask.
+    """
+    for _ in range(tempfile.TMP_MAX):
+        temp_path = os.path.join(folder_path, f'tmp{os.urandom(6).hex()}')
+        try:
+            return os.open(temp_path, _NEW_FILE_FLAGS, 0o666), temp_path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f'No usable temporary file name found in {folder_path}')
+
+
+def _create_temp_file(target_path: str, fallback_folder_path: str = '') -> tuple[BinaryIO, str]:
+    """
+    (Internal Function) Creates temporary file next to `target_path`, so that it can atomically
+    replace the target later. Falls back to `fallback_folder_path` if the target folder is not
+    writable. Returns the opened file and its path.
+    """
+    try:
+        fd, temp_path = _open_new_file(os.path.dirname(os.path.abspath(target_path)))
+    except OSError:
+        if not fallback_folder_path:
+            raise
+        fd, temp_path = _open_new_file(fallback_folder_path)
+    if os.path.exists(target_path):
+        shutil.copymode(target_path, temp_path)
+    return os.fdopen(fd, 'wb'), temp_path
+
+
+def _replace_with_temp_file(temp_path: str, target_path: str):
+    """
+    (Internal Function) Moves temporary file to `target_path`, replacing it atomically if both are
+    located in the same folder.
+    """
+    if os.path.dirname(temp_path) == os.path.dirname(os.path.abspath(target_path)):
+        os.replace(temp_path, target_path)
+    else:
+        shutil.copyfile(temp_path, target_path)
+        os.remove(temp_path)
+
+
+def _discard_temp_file(temp_file: BinaryIO | None, temp_path: str):
+    """
+    (Internal Function) Closes and deletes temporary file if it still exists.
+    """
+    if temp_file is not None:
+        temp_file.close()
+    if temp_path and os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
 def extract_bytes(source_path: str, target_path: str, start_pos: int, end_pos: int) -> bool:
     """
     Extracts combat from file at `source_path` by copying bytes from `start_pos` (including) up to
@@ -22,50 +163,75 @@ def extract_bytes(source_path: str, target_path: str, start_pos: int, end_pos: i
 
     Parameters:
     - :param source_path: path to source file
-    - :param source_path: path to target_file, will overwrite if it already exists
+    - :param target_path: path to target_file, will overwrite if it already exists
     - :param start_pos: first byte from source file to copy
     - :param end_pos: copies data until this byte, not including it
     """
-    try:
-        with open(source_path, 'rb') as source_file:
-            if source_file.read(2) == b'\x1f\x8b':
-                source_file.close()
-                source_file = gzip_open(source_path, 'rb')
-            source_file.seek(start_pos)
-            extracted_bytes = source_file.read(end_pos - start_pos)
-        with open(target_path, 'wb') as target_file:
-            target_file.write(extracted_bytes)
-        return True
-    except OSError:
-        return False
+    return compose_logfile(source_path, target_path, ((start_pos, end_pos),))
 
 
 def compose_logfile(
         source_path: str, target_path: str, intervals: Iterable[tuple[int, int]],
-        templog_folder_path: str) -> bool:
+        templog_folder_path: str = '') -> bool:
     """
     Grabs bytes in given `intervals` from `source_path` and writes them to `target_path`. Returns
-    `True` if successful, returns `False` if unsuccessful.
+    `True` if successful, returns `False` if unsuccessful. The data is written to a temporary file
+    next to the target first, which then replaces the target.
 
     Parameters:
     - :param source_path: path to source file, must be absolute
     - :param target_path: path to target file, must be absolute, will overwrite if it already exists
     - :param intervals: iterable with start and end position pairs (half-open interval)
-    - :param templog_folder_path: path to folder used for temporary logfiles
+    - :param templog_folder_path: path to folder used for temporary logfiles if the target folder
+    is not writable
     """
-    tempfile_path = f'{templog_folder_path}\\{int(time())}'
+    temp_file = None
+    temp_path = ''
     try:
-        with open(source_path, 'rb') as source_file, open(tempfile_path, 'wb') as temp_file:
-            if source_file.read(2) == b'\x1f\x8b':
-                source_file.close()
-                source_file = gzip_open(source_path, 'rb')
+        with open_logfile(source_path) as source_file:
+            temp_file, temp_path = _create_temp_file(target_path, templog_folder_path)
             for start_pos, end_pos in intervals:
-                source_file.seek(start_pos)
-                temp_file.write(source_file.read(end_pos - start_pos))
-        shutil.copyfile(tempfile_path, target_path)
+                _copy_file_range(source_file, temp_file, start_pos, end_pos)
+            temp_file.close()
+        _replace_with_temp_file(temp_path, target_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        _discard_temp_file(temp_file, temp_path)
+
+
+def archive_logfile(
+        source_path: str, target_path: str, combats: Iterable[tuple] = (),
+        combat_settings: dict | None = None, codec: str = 'zlib',
+        block_size: int = ARCHIVE_BLOCK_SIZE, templog_folder_path: str = '') -> bool:
+    """
+    Recompresses logfile at `source_path` into a seekable combatlog archive at `target_path`.
+    Returns `True` if successful, returns `False` if unsuccessful.
+
+    Parameters:
+    - :param source_path: path to source file, may be plain, gzip-compressed or an archive
+    - :param target_path: path to target file, will overwrite if it already exists
+    - :param combats: combats contained in the logfile, stored in the archive index
+    - :param combat_settings: settings that were used to isolate the combats
+    - :param codec: compression used for the blocks, "zlib" or "lzma"
+    - :param block_size: number of uncompressed bytes per block
+    - :param templog_folder_path: path to folder used for temporary logfiles if the target folder
+    is not writable
+    """
+    temp_file = None
+    temp_path = ''
+    try:
+        with open_logfile(source_path) as source_file:
+            temp_file, temp_path = _create_temp_file(target_path, templog_folder_path)
+            write_archive(source_file, temp_file, combats, combat_settings, codec, block_size)
+            temp_file.close()
+        _replace_with_temp_file(temp_path, target_path)
         return True
     except OSError:
         return False
+    finally:
+        _discard_temp_file(temp_file, temp_path)
 
 
 def fix_line(line: bytes) -> bytes:
@@ -85,48 +251,173 @@ def fix_line(line: bytes) -> bytes:
     return line
 
 
-def repair_logfile(path: str, templog_folder_path: str) -> str:
+def _patch_replacement(match: re.Match) -> bytes:
+    return _PATCH_REPLACEMENTS[match.group()]
+
+
+def _repair_line(line: bytes, repaired_parts: list[bytes], multiline_buffer: bytes) -> bytes:
     """
-    Replace bugged combatlog lines. Returns empty string on success, class name of error on failure.
+    (Internal Function) Repairs single suspect line. Appends the repaired line to `repaired_parts`
+    once it is complete and returns the new multiline buffer.
 
     Parameters:
-    - :param path: logfile to repair
+    - :param line: line to repair, including line break
+    - :param repaired_parts: list collecting the repaired data
+    - :param multiline_buffer: incomplete line data carried over from the previous lines
     """
-    tempfile_path = os.path.join(templog_folder_path, str(int(time())))
-    with open(path, 'rb') as log_file, open(tempfile_path, 'wb') as temp_file:
+    if line.strip() == b'':
+        return multiline_buffer
+    if multiline_buffer == b'':
+        if b'::' not in line:
+            return multiline_buffer
+    elif b'::' in line:
         multiline_buffer = b''
-        for line in log_file:
-            if line.strip() == b'':
-                continue
-            if multiline_buffer == b'':
-                if b'::' not in line:
-                    continue
-            else:
-                if b'::' in line:
-                    multiline_buffer = b''
-            for broken_string, fixed_string in PATCHES:
-                if broken_string in line:
-                    clean_line = line.replace(broken_string, fixed_string)
-                    break
-            else:
-                clean_line = line
-            line_parts = (multiline_buffer + clean_line).split(b',')
-            if len(line_parts) < 12:
-                multiline_buffer += clean_line.replace(b'\r', b'').replace(b'\n', b'')
-            else:
-                temp_file.write(fix_line(multiline_buffer + clean_line))
+    line_parts = (multiline_buffer + line).split(b',')
+    if len(line_parts) < 12:
+        return multiline_buffer + line.replace(b'\r', b'').replace(b'\n', b'')
+    repaired_parts.append(fix_line(multiline_buffer + line))
+    return b''
+
+
+def _find_suspect_lines(block: bytes) -> list[tuple[int, int]]:
+    """
+    (Internal Function) Returns start and end of every line in `block` that contains quotes, lacks
+    the timestamp separator or has less than 12 fields. All other lines are left untouched by the
+    repair.
+
+    Parameters:
+    - :param block: data to scan
+    """
+    data = numpy__frombuffer(block, uint8)
+    line_ends = numpy__flatnonzero(data == 10) + 1
+    if len(line_ends) == 0 or line_ends[-1] != len(data):
+        line_ends = numpy__concatenate((line_ends, (len(data),)))
+    line_starts = numpy__concatenate(((0,), line_ends[:-1]))
+    colons = data == 58
+    separators = numpy__concatenate((colons[:-1] & colons[1:], (False,)))
+    commas = numpy__add.reduceat(data == 44, line_starts, dtype=int32)
+    quotes = numpy__add.reduceat(data == 34, line_starts, dtype=int32)
+    separator_counts = numpy__add.reduceat(separators, line_starts, dtype=int32)
+    suspect_lines = numpy__flatnonzero((commas < 11) | (quotes > 0) | (separator_counts == 0))
+    return list(zip(line_starts[suspect_lines].tolist(), line_ends[suspect_lines].tolist()))
+
+
+def _repair_block(block: bytes, multiline_buffer: bytes) -> tuple[bytes, bytes]:
+    """
+    (Internal Function) Repairs block of complete lines. Only lines that do not match the regular
+    line format are inspected individually. Returns repaired block and the multiline buffer to carry
+    over to the next block.
+
+    Parameters:
+    - :param block: data to repair, must end with a line break unless it is the end of the file
+    - :param multiline_buffer: incomplete line data carried over from the previous block
+    """
+    if _PATCH_PATTERN is not None:
+        block = _PATCH_PATTERN.sub(_patch_replacement, block)
+    if len(block) == 0:
+        return block, multiline_buffer
+    repaired_parts = list()
+    last_end = 0
+    for start, end in _find_suspect_lines(block):
+        if start > last_end:
+            repaired_parts.append(block[last_end:start])
+            multiline_buffer = b''
+        multiline_buffer = _repair_line(block[start:end], repaired_parts, multiline_buffer)
+        last_end = end
+    if last_end == 0:
+        return block, b''
+    if last_end < len(block):
+        repaired_parts.append(block[last_end:])
+        multiline_buffer = b''
+    return b''.join(repaired_parts), multiline_buffer
+
+
+def repair_logfile(
+        path: str, templog_folder_path: str, start_pos: int = 0, end_pos: int = -1,
+        progress_callback: Callable[[int, int], None] | None = None,
+        cancel_token: CancellationToken | None = None) -> str:
+    """
+    Replace bugged combatlog lines. Returns empty string on success, class name of error on failure
+    and 'Cancelled' if cancelled. Returns 'EOFError' if the logfile shrinks during the repair.
+
+    The file is processed in large blocks. Lines are only inspected individually if they contain
+    quotes or have the wrong number of fields. The file is modified in place as long as the repair
+    does not change its length; otherwise the repaired data is written to a temporary file that
+    replaces the logfile.
+
+    Parameters:
+    - :param path: logfile to repair
+    - :param templog_folder_path: folder for the temporary file, used if no temporary file can be
+    created next to the logfile
+    - :param start_pos: first byte of the range to repair; must be the start of a line
+    - :param end_pos: end of the range to repair (not included); must be the end of a line; -1
+    repairs up to the end of the file
+    - :param progress_callback: called after every block with the number of processed bytes and the
+    total number of bytes to process
+    - :param cancel_token: checked before every block; when cancelled, blocks already repaired in
+    place are kept, while a temporary file is discarded, leaving the logfile unchanged
+    """
+    temp_file = None
+    temp_path = ''
     try:
-        shutil.copyfile(tempfile_path, path)
+        with open(path, 'r+b') as log_file:
+            file_size = log_file.seek(0, os.SEEK_END)
+            if end_pos < 0 or end_pos > file_size:
+                end_pos = file_size
+            total_bytes = end_pos - start_pos
+            position = start_pos
+            multiline_buffer = b''
+            while position < end_pos:
+                if cancel_token is not None and cancel_token.cancelled:
+                    return 'Cancelled'
+                log_file.seek(position)
+                block = log_file.read(min(REPAIR_BLOCK_SIZE, end_pos - position))
+                if not block:
+                    raise EOFError('Logfile shrank during repair')
+                if position + len(block) < end_pos:
+                    last_line_break = block.rfind(b'\n')
+                    if last_line_break >= 0:
+                        block = block[:last_line_break + 1]
+                repaired_block, multiline_buffer = _repair_block(block, multiline_buffer)
+                if temp_file is None and len(repaired_block) != len(block):
+                    temp_file, temp_path = _create_temp_file(path, templog_folder_path)
+                    _copy_file_range(log_file, temp_file, 0, position)
+                if temp_file is not None:
+                    temp_file.write(repaired_block)
+                elif repaired_block != block:
+                    log_file.seek(position)
+                    log_file.write(repaired_block)
+                position += len(block)
+                if progress_callback is not None:
+                    progress_callback(position - start_pos, total_bytes)
+            if temp_file is not None:
+                _copy_file_range(log_file, temp_file, end_pos, file_size)
+                temp_file.close()
+        if temp_file is not None:
+            _replace_with_temp_file(temp_path, path)
         res = ''
     except PermissionError:
         res = 'PermissionError'
+    except EOFError:
+        res = 'EOFError'
+    finally:
+        _discard_temp_file(temp_file, temp_path)
     return res
 
 
-def reset_temp_folder(path: str):
+def reset_temp_folder(path: str, kept_entries: Iterable[str] = ()):
     '''
-    Deletes and re-creates folder housing temporary log files.
+    Deletes the contents of the folder housing temporary log files, except for the entries named
+    in `kept_entries`, and creates the folder if it does not exist.
     '''
-    if os.path.exists(path) and os.path.isdir(path):
-        shutil.rmtree(path)
-    os.mkdir(path)
+    if not os.path.isdir(path):
+        os.mkdir(path)
+        return
+    for entry in os.listdir(path):
+        if entry in kept_entries:
+            continue
+        entry_path = os.path.join(path, entry)
+        if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+            shutil.rmtree(entry_path)
+        else:
+            os.remove(entry_path)
@@ -0,0 +1,329 @@
+"""Compact columnar copy of the parsed lines of a logfile"""
+
+from collections import deque
+from datetime import datetime
+
+from numpy import (
+    array as numpy__array, bincount as numpy__bincount, datetime64, diff as numpy__diff,
+    empty as numpy__empty, flatnonzero as numpy__flatnonzero, float64, int32, int64,
+    zeros as numpy__zeros)
+from numpy.typing import NDArray
+
+from .combat import Combat
+from .datamodels import LogLine
+from .parser import get_flags
+from .utilities import get_player_handle
+
+# string fields of `LogLine`, in the order of the columns of `LineColumns.codes`
+STRING_FIELDS = LogLine._fields[1:11]
+OWNER_ID = STRING_FIELDS.index('owner_id')
+TARGET_NAME = STRING_FIELDS.index('target_name')
+TARGET_ID = STRING_FIELDS.index('target_id')
+TYPE = STRING_FIELDS.index('type')
+QUEEN = 'Borg Queen Octahedron'
+
+
+def to_timestamp(time: datetime) -> int:
+    """
+    Converts datetime to the microseconds used in `LineColumns.timestamps`.
+    """
+    return int(datetime64(time, 'us').astype(int64))
+
+
+class LineColumns:
+    """
+    Holds the lines of a contiguous region of a logfile as columns, oldest line first: timestamps
+    in microseconds, both magnitudes, the string fields as codes into a shared list of distinct
+    values and the position of the end of every line in the file. Takes a fraction of the memory
+    of the equivalent `LogLine`s and allows recreating combats without reading the file again.
+    """
+
+    __slots__ = (
+        'log_path', 'region_start', 'region_end', 'boundary_gap', 'timestamps',
+        'magnitudes', 'magnitudes2', 'codes', 'values', 'line_ends')
+
+    def __init__(
+            self, log_path: str, lines: list[LogLine], line_ends: list[int], region_start: int,
+            region_end: int, boundary_gap: int = -1):
+        """
+        Parameters:
+        - :param log_path: logfile the lines were read from
+        - :param lines: parsed lines of the region, newest line first
+        - :param line_ends: position of the byte following every line, in the same order
+        - :param region_start: position of the first byte of the region
+        - :param region_end: position of the byte following the region
+        - :param boundary_gap: microseconds between the oldest line of the region and the line
+        preceding the region; -1 if the region starts at the beginning of the file
+        """
+        self.log_path: str = log_path
+        self.region_start: int = region_start
+        self.region_end: int = region_end
+        self.boundary_gap: int = boundary_gap
+        lines.reverse()
+        line_ends.reverse()
+        self.line_ends: NDArray[int64] = numpy__array(line_ends, int64)
+        self.codes: NDArray[int32] = numpy__empty((len(lines), len(STRING_FIELDS)), int32)
+        if len(lines) == 0:
+            self.timestamps: NDArray[int64] = numpy__empty(0, int64)
+            self.magnitudes: NDArray[float64] = numpy__empty(0, float64)
+            self.magnitudes2: NDArray[float64] = numpy__empty(0, float64)
+            self.values: list[str] = list()
+            return
+        timestamps, *string_columns, magnitudes, magnitudes2 = zip(*lines)
+        self.timestamps = numpy__array(timestamps, 'datetime64[us]').astype(int64)
+        self.magnitudes = numpy__array(magnitudes, float64)
+        self.magnitudes2 = numpy__array(magnitudes2, float64)
+        value_codes: dict[str, int] = dict()
+        for column_num, column in enumerate(string_columns):
+            self.codes[:, column_num] = [
+                value_codes.setdefault(value, len(value_codes)) for value in column]
+        self.values = list(value_codes)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__}: {len(self)} lines, bytes {self.region_start}-'
+            f'{self.region_end}, {self.nbytes / 1_048_576:.1f} MiB>')
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes occupied by the columns, not counting the distinct string values.
+        """
+        return (
+            self.timestamps.nbytes + self.magnitudes.nbytes + self.magnitudes2.nbytes
+            + self.codes.nbytes + self.line_ends.nbytes)
+
+    def prepend(self, older: 'LineColumns'):
+        """
+        Adds the lines of the region directly preceding this region in the file.
+        """
+        self._concatenate(older, self, len(older))
+        self.region_start = older.region_start
+        self.boundary_gap = older.boundary_gap
+
+    def append(self, newer: 'LineColumns') -> bool:
+        """
+        Adds the lines of a region starting at a line boundary within or directly after this
+        region; cached lines from the start of `newer` on are replaced. Returns False if `newer`
+        does not start at a line boundary of this region.
+        """
+        if newer.region_start == self.region_start:
+            end_line = 0
+        else:
+            end_line = int(self.line_ends.searchsorted(newer.region_start)) + 1
+            if end_line > len(self) or self.line_ends[end_line - 1] != newer.region_start:
+                return False
+        self._concatenate(self, newer, end_line)
+        self.region_end = newer.region_end
+        return True
+
+    def _concatenate(self, older: 'LineColumns', newer: 'LineColumns', older_lines: int):
+        """
+        (Internal Function) Replaces the columns with the first `older_lines` lines of `older`
+        followed by the lines of `newer`.
+        """
+        value_codes = {value: code for code, value in enumerate(self.values)}
+        older_map = _get_code_map(value_codes, older.values)
+        newer_map = _get_code_map(value_codes, newer.values)
+        self.values = list(value_codes)
+        self.codes = _concatenate_rows(
+            older_map[older.codes[:older_lines]], newer_map[newer.codes])
+        for attribute in ('timestamps', 'magnitudes', 'magnitudes2', 'line_ends'):
+            setattr(self, attribute, _concatenate_rows(
+                getattr(older, attribute)[:older_lines], getattr(newer, attribute)))
+
+    def truncate(self, first_line: int):
+        """
+        Removes all lines before `first_line`, so that the region starts with that line.
+        """
+        if first_line <= 0:
+            return
+        self.boundary_gap = int(
+            self.timestamps[first_line] - self.timestamps[first_line - 1])
+        self.region_start = int(self.line_ends[first_line - 1])
+        for attribute in ('timestamps', 'magnitudes', 'magnitudes2', 'line_ends', 'codes'):
+            setattr(self, attribute, getattr(self, attribute)[first_line:].copy())
+
+    def split(self, seconds_between_combats: float) -> list[tuple[int, int]]:
+        """
+        Returns the ranges of lines `(first_line, end_line)` of the parts of the region separated
+        by more than `seconds_between_combats` seconds without any line, oldest part first.
+        """
+        if len(self) == 0:
+            return list()
+        gaps = numpy__diff(self.timestamps) > seconds_between_combats * 1_000_000
+        boundaries = (numpy__flatnonzero(gaps) + 1).tolist()
+        return list(zip([0] + boundaries, boundaries + [len(self)]))
+
+    def byte_range(self, first_line: int, end_line: int) -> tuple[int, int]:
+        """
+        Returns the positions of the first byte and the byte after the given range of lines; the
+        bytes between two lines belong to the newer line, as when isolating combats.
+        """
+        start = self.region_start if first_line == 0 else int(self.line_ends[first_line - 1])
+        end = self.region_end if end_line == len(self) else int(self.line_ends[end_line - 1])
+        return start, end
+
+    def find_lines(self, byte_start: int, byte_end: int) -> tuple[int, int] | None:
+        """
+        Returns the range of lines `(first_line, end_line)` exactly covering the given bytes, None
+        if the bytes are not part of the region or do not start and end at a line boundary.
+        """
+        if byte_start < self.region_start or byte_end > self.region_end:
+            return None
+        if byte_start == self.region_start:
+            first_line = 0
+        else:
+            first_line = int(self.line_ends.searchsorted(byte_start)) + 1
+            if first_line > len(self) or self.line_ends[first_line - 1] != byte_start:
+                return None
+        if byte_end == self.region_end:
+            end_line = len(self)
+        else:
+            end_line = int(self.line_ends.searchsorted(byte_end)) + 1
+            if end_line > len(self) or self.line_ends[end_line - 1] != byte_end:
+                return None
+        return first_line, end_line
+
+    def lines(self, first_line: int, end_line: int) -> deque[LogLine]:
+        """
+        Recreates the lines in the given range.
+        """
+        values = self.values
+        string_columns = [
+            [values[code] for code in column]
+            for column in self.codes[first_line:end_line].T.tolist()]
+        timestamps = self.timestamps[first_line:end_line].astype('datetime64[us]').tolist()
+        return deque(map(
+            LogLine, timestamps, *string_columns, self.magnitudes[first_line:end_line].tolist(),
+            self.magnitudes2[first_line:end_line].tolist()))
+
+    def create_combat(
+            self, first_line: int, end_line: int, graph_resolution: float,
+            combat_id: int) -> Combat:
+        """
+        Creates isolated combat from the given range of lines, like `OSCR._analyze_log_file`.
+        """
+        combat = Combat(graph_resolution, combat_id, self.log_path)
+        combat.log_data = self.lines(first_line, end_line)
+        combat.start_time = combat.log_data[0].timestamp
+        combat.end_time = combat.log_data[-1].timestamp
+        combat.file_pos = list(self.byte_range(first_line, end_line))
+        combat.meta['filtered_lines'] = 0
+        return combat
+
+    def rebin_overview_graphs(self, combat: Combat, graph_resolution: float) -> bool:
+        """
+        Recalculates the overview graphs of an analyzed combat for a new graph resolution from the
+        lines of the combat. Returns False if the lines of the combat are not part of the region.
+
+        Parameters:
+        - :param combat: analyzed combat read from the region
+        - :param graph_resolution: new duration of one graph interval in seconds
+        """
+        line_range = self.find_lines(*combat.file_pos)
+        if line_range is None:
+            return False
+        first_line, end_line = line_range
+        timestamps = self.timestamps[first_line:end_line]
+        combat_start = int(timestamps[0])
+        total_graph_points = int(
+            (int(timestamps[-1]) - combat_start) / 1_000_000 // graph_resolution + 2)
+        analyzed_lines = len(timestamps)
+        end_time = to_timestamp(combat.end_time)
+        if end_time < timestamps[-1]:
+            # lines after the Queen kill in the Hive Space queue have not been analyzed
+            analyzed_lines = int(timestamps.searchsorted(end_time, 'right'))
+            tied_start = int(timestamps.searchsorted(end_time, 'left'))
+            tied_lines = self.lines(first_line + tied_start, first_line + analyzed_lines)
+            for line_num, line in enumerate(tied_lines, tied_start + 1):
+                if get_flags(line.flags)[3] and (line.target_name == QUEEN or (
+                        line.target_id == '*' and QUEEN in (line.owner_name, line.source_name))):
+                    analyzed_lines = line_num
+                    break
+        timestamps = timestamps[:analyzed_lines] - combat_start
+        codes = self.codes[first_line:first_line + analyzed_lines]
+        magnitudes = self.magnitudes[first_line:first_line + analyzed_lines]
+        magnitudes2 = self.magnitudes2[first_line:first_line + analyzed_lines]
+        values = self.values
+        type_codes = codes[:, TYPE]
+        hit_points_code = _find_code(values, 'HitPoints')
+        shield_code = _find_code(values, 'Shield')
+        is_heal = (
+            ((type_codes == hit_points_code) & (magnitudes < 0))
+            | ((type_codes == shield_code) & (magnitudes < 0) & (magnitudes2 >= 0)))
+        player_codes = numpy__zeros(len(values), bool)
+        player_codes[[code for code, value in enumerate(values) if value.startswith('P')]] = True
+        owner_codes = codes[:, OWNER_ID]
+        target_id_codes = codes[:, TARGET_ID]
+        damage_lines = ~is_heal & player_codes[owner_codes]
+        graph_lines = damage_lines
+        if combat.damage_out is not None and len(combat.meta.get('focus_players', ())) > 0:
+            # the full analysis leaves out lines not involving one of the focus players
+            focus_handles = frozenset(combat.meta['focus_players'])
+            focus_codes = numpy__zeros(len(values), bool)
+            focus_codes[[
+                code for code, value in enumerate(values)
+                if value.startswith('P') and get_player_handle(value) in focus_handles]] = True
+            graph_lines = damage_lines & (focus_codes[owner_codes] | focus_codes[target_id_codes])
+        graph_indices = (timestamps // (graph_resolution * 1_000_000)).astype(int64)
+        overview_graphs = dict()
+        for owner_code in dict.fromkeys(owner_codes[graph_lines].tolist()):
+            owner_lines = graph_lines & (owner_codes == owner_code)
+            graph = numpy__bincount(
+                graph_indices[owner_lines], abs(magnitudes[owner_lines]), total_graph_points)
+            handle = get_player_handle(values[owner_code])
+            if handle in overview_graphs:
+                overview_graphs[handle] += graph
+            else:
+                overview_graphs[handle] = graph
+        # heals, damage taken and self-damage don't affect combat time
+        target_name_codes = codes[:, TARGET_NAME]
+        active_lines = numpy__flatnonzero(
+            damage_lines & (owner_codes != target_id_codes)
+            & (target_name_codes != _find_code(values, '*')))
+        overview_graph_intervals: dict[str, tuple[int, int]] = dict()
+        for owner_code in dict.fromkeys(owner_codes[active_lines].tolist()):
+            owner_lines = active_lines[owner_codes[active_lines] == owner_code]
+            start = int(timestamps[owner_lines[0]]) / 1_000_000
+            end = int(timestamps[owner_lines[-1]]) / 1_000_000
+            overview_graph_intervals[get_player_handle(values[owner_code])] = (
+                int(start // graph_resolution), int(end // graph_resolution + 1))
+        combat.graph_resolution = graph_resolution
+        combat.overview_graphs = overview_graphs
+        for player in combat.players.values():
+            if player.handle in overview_graph_intervals:
+                combat.create_overview_graphs(player, overview_graph_intervals[player.handle])
+        return True
+
+
+def _get_code_map(value_codes: dict[str, int], values: list[str]) -> NDArray[int32]:
+    """
+    (Internal Function) Returns array mapping codes into `values` to codes in `value_codes`; adds
+    missing values to `value_codes`.
+    """
+    return numpy__array(
+        [value_codes.setdefault(value, len(value_codes)) for value in values], int32)
+
+
+def _find_code(values: list[str], value: str) -> int:
+    """
+    (Internal Function) Returns code of `value`, -1 if it does not occur.
+    """
+    try:
+        return values.index(value)
+    except ValueError:
+        return -1
+
+
+def _concatenate_rows(first: NDArray, second: NDArray) -> NDArray:
+    """
+    (Internal Function) Concatenates two arrays along the first axis.
+    """
+    result = numpy__empty((len(first) + len(second),) + first.shape[1:], first.dtype)
+    result[:len(first)] = first
+    result[len(first):] = second
+    return result
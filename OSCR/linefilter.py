@@ -0,0 +1,71 @@
+import re
+from typing import Iterable
+
+from .constants import BANNED_ABILITIES
+
+
+class LineFilter:
+    """
+    Decides whether a combatlog line is dropped based on its raw fields. Applied right after a line
+    has been split at its commas, before any timestamp or number is converted.
+    """
+
+    __slots__ = ('event_ids', 'abilities', 'types', 'entity_pattern', 'dropped_lines')
+
+    def __init__(
+            self, event_ids: Iterable[str] = (), abilities: Iterable[str] = (),
+            entity_patterns: Iterable[str] = (), types: Iterable[str] = ()):
+        """
+        Parameters:
+        - :param event_ids: drops lines with one of these event ids
+        - :param abilities: drops lines with one of these ability names in addition to
+        `BANNED_ABILITIES`
+        - :param entity_patterns: regular expressions; drops lines where one of them matches the
+        owner, source or target id
+        - :param types: drops lines with one of these types, for example "Shield"
+        """
+        self.event_ids = frozenset(event_ids)
+        self.abilities = frozenset(abilities) | BANNED_ABILITIES
+        self.types = frozenset(types)
+        patterns = list(entity_patterns)
+        if len(patterns) > 0:
+            self.entity_pattern = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+        else:
+            self.entity_pattern = None
+        self.dropped_lines = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'LineFilter':
+        """
+        Creates filter from the keys "excluded_event_ids", "excluded_abilities",
+        "excluded_entities" and "excluded_types" of `settings`; missing keys exclude nothing.
+        """
+        return cls(
+            settings.get('excluded_event_ids', ()), settings.get('excluded_abilities', ()),
+            settings.get('excluded_entities', ()), settings.get('excluded_types', ()))
+
+    def drops(self, line_fields: list[str]) -> bool:
+        """
+        Returns `True` and counts the line if it is excluded by the filter.
+
+        Parameters:
+        - :param line_fields: the 12 fields of the line; the first field may still be prefixed with
+        the timestamp
+        """
+        if (line_fields[7] in self.event_ids or line_fields[6] in self.abilities
+                or line_fields[8] in self.types
+                or (self.entity_pattern is not None and (
+                    self.entity_pattern.search(line_fields[1])
+                    or self.entity_pattern.search(line_fields[3])
+                    or self.entity_pattern.search(line_fields[5])))):
+            self.dropped_lines += 1
+            return True
+        return False
+
+    def take_dropped_lines(self) -> int:
+        """
+        Returns number of lines dropped since the last call and resets the counter.
+        """
+        dropped_lines = self.dropped_lines
+        self.dropped_lines = 0
+        return dropped_lines
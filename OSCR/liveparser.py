@@ -1,11 +1,20 @@
 from collections.abc import Callable
 from copy import deepcopy
+from io import TextIOWrapper
 import os
 import time
-from threading import Event, Lock, Thread, Timer
+from threading import Event, Lock, Thread
 from types import FunctionType, BuiltinFunctionType, MethodType
-from typing import Any
+from typing import Any, TextIO
 
+from .constants import HEAL_TREE_HEADER, TREE_HEADER
+from .datamodels import DamageTableRow, HealTableRow, LogLine, RingBuffer, TreeModel
+from .iofunc import open_logfile
+from .linefilter import LineFilter
+from .livepublisher import LivePublisher
+from .parser import (
+    calculate_damage_row_stats, calculate_heal_row_stats, get_flags, get_outgoing_target_row,
+    iter_leaf_rows, sum_damage_rows, sum_heal_rows)
 from .utilities import to_datetime
 
 CALLABLE = (FunctionType, BuiltinFunctionType, MethodType)
@@ -32,18 +41,37 @@ class LiveParser():
         - :param start_callback: function that is called immediately before the live parser starts
         to analyze the logfile initiated by the LiveParser.start() function; no arguments will be
         passed
-        - :param update_callback: function that is called once every second when the parser is
-        running; it will be passed a dictionary with the player data acquired in the last second as
-        positional argument and the total combat time as second positional argument
+        - :param update_callback: function that is called once every update interval when the
+        parser is running; it will be passed a dictionary with the player data acquired in the last
+        interval as positional argument and the total combat time as second positional argument
         - :param settings: contains settings
             - "seconds_between_combats": number of inactive seconds after which a new engagement
             resets the collected data
+            - "update_interval": seconds between two calls of the update callback, at least 0.1
+            - "rolling_windows": lengths of the trailing windows in seconds that rolling DPS and
+            HPS are calculated for
+            - "history_length": number of seconds covered by the DPS and HPS history
+            - "publish_socket": when not empty, the player data of every update is also published
+            to subscribers connected to a Unix domain socket at this path (see `LivePublisher`)
+            - "live_trees": when `True`, per-ability damage and heal trees are updated with every
+            line and their first level is passed to the update callback under the keys
+            "damage_out" and "heals_out" of each player
         """
         self._active: Event = Event()
         self._lock: Lock = Lock()
         self._players: dict[str, dict[str]] = dict()
+        self._damage_out: TreeModel = TreeModel(TREE_HEADER)
+        self._heals_out: TreeModel = TreeModel(HEAL_TREE_HEADER)
+        self._actor_combat_durations: dict[str, list[float]] = dict()
+        self._series: dict[str, tuple[RingBuffer, RingBuffer]] = dict()
+        self._generation: int = 0
+        self._series_generation: int = 0
         self._inactive_seconds: float = 0.0
         self._reset: bool = False
+        self._scheduler_stop: Event = Event()
+        self._scheduler_thread: Thread | None = None
+        self.dropped_ticks: int = 0
+        self._publisher: LivePublisher | None = None
         if isinstance(start_callback, CALLABLE):
             self.start_callback = start_callback
         else:
@@ -52,14 +80,25 @@ class LiveParser():
             self.update_callback = update_callback
         else:
             self.update_callback = _f
-        self._update_timer: Timer = Timer(interval=1, function=self.update_data)
         self._log_path: str | None = None
         self.settings = {
-            'seconds_between_combats': 100
+            'seconds_between_combats': 100,
+            'live_trees': False,
+            'update_interval': 1.0,
+            'rolling_windows': (5, 10, 30),
+            'history_length': 30,
+            'publish_socket': '',
+            'excluded_event_ids': ['Autodesc.Combatevent.Falling'],
+            'excluded_abilities': [],
+            'excluded_entities': [],
+            'excluded_types': []
         }
-        for key in self.settings:
-            if key in settings:
-                self.settings[key] = settings[key]
+        if settings is not None:
+            for key in self.settings:
+                if key in settings:
+                    self.settings[key] = settings[key]
+        self.settings['update_interval'] = max(0.1, self.settings['update_interval'])
+        self._line_filter: LineFilter = LineFilter.from_settings(self.settings)
 
     def __del__(self):
         """
@@ -67,6 +106,11 @@ class LiveParser():
         """
         self.stop()
 
+    @property
+    def filtered_lines(self) -> int:
+        """Number of lines dropped by the line filter"""
+        return self._line_filter.dropped_lines
+
     @property
     def log_path(self):
         """Path to logfile the LiveParser will analyze"""
@@ -91,10 +135,13 @@ class LiveParser():
         """
         if not self._active.is_set():
             self.start_callback()
+            self._start_publisher()
             analyzer_thread = Thread(target=self.analyze, args=())
             analyzer_thread.start()
-            self._update_timer = Timer(interval=1, function=self.update_data)
-            self._update_timer.start()
+            self._scheduler_stop = Event()
+            self._scheduler_thread = Thread(
+                target=self._run_scheduler, args=(self._scheduler_stop,), daemon=True)
+            self._scheduler_thread.start()
 
     def stop(self):
         """
@@ -102,26 +149,83 @@ class LiveParser():
         iteration before the process ends.
         """
         self._active.clear()
-        self._update_timer.cancel()
+        self._scheduler_stop.set()
+        self._stop_publisher()
+
+    def _start_publisher(self):
+        """
+        (Internal Function) Starts publishing player data if a socket path is configured.
+        """
+        if self.settings['publish_socket'] and self._publisher is None:
+            self._publisher = LivePublisher(self.settings['publish_socket'])
+            self._publisher.start()
+
+    def _stop_publisher(self):
+        """
+        (Internal Function) Stops publishing player data.
+        """
+        if self._publisher is not None:
+            self._publisher.stop()
+            self._publisher = None
+
+    def _run_scheduler(self, stop_event: Event):
+        """
+        (Internal Function) Calls `update_data` once per update interval until `stop_event` is set.
+        Ticks that could not be executed in time because the previous tick took too long are
+        skipped and counted in `self.dropped_ticks`.
+
+        Parameters:
+        - :param stop_event: ends the scheduler when set
+        """
+        interval = self.settings['update_interval']
+        next_tick = time.monotonic() + interval
+        while not stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            if self._active.is_set():
+                self.update_data()
+            next_tick += interval
+            delay = time.monotonic() - next_tick
+            if delay > 0:
+                missed_ticks = int(delay // interval) + 1
+                self.dropped_ticks += missed_ticks
+                next_tick += missed_ticks * interval
+
+    def _create_series(self) -> tuple[RingBuffer, RingBuffer]:
+        """
+        (Internal Function) Creates damage and heal ring buffers according to the settings.
+        """
+        interval = self.settings['update_interval']
+        windows = [max(1, round(w / interval)) for w in self.settings['rolling_windows']]
+        capacity = max(windows + [max(1, round(self.settings['history_length'] / interval))])
+        return RingBuffer(capacity, windows), RingBuffer(capacity, windows)
 
     def update_data(self):
         """
-        Refines the data and executes the update_callback. Runs once per second when active.
+        Refines the data and executes the update_callback. Runs once per update interval when
+        active.
         """
-        if not self._active:
+        if not self._active.is_set():
             return
-        self._update_timer = Timer(interval=1, function=self.update_data)
-        self._update_timer.start()
         if len(self._players) < 1:
             return
         total_attacks_in = 0
         with self._lock:
             player_copy = deepcopy(self._players)
+            if self.settings['live_trees']:
+                tree_snapshot = self._get_tree_snapshot()
             for player in self._players.values():
                 total_attacks_in += player['attacks_in_buffer']
                 player['attacks_in_buffer'] = 0
                 player['base_damage_buffer'] = 0
                 player['damage_buffer'] = 0
+                player['heal_buffer'] = 0
+            generation = self._generation
+        if generation != self._series_generation:
+            self._series = dict()
+            self._series_generation = generation
+        interval = self.settings['update_interval']
+        history_length = max(1, round(self.settings['history_length'] / interval))
+        rolling_windows = {
+            w: max(1, round(w / interval)) for w in self.settings['rolling_windows']}
         output = dict()
         first_player_attacks = list()
         last_player_attacks = list()
@@ -153,6 +257,12 @@ class LiveParser():
                 attacks_in_share = player_data['attacks_in_buffer'] / total_attacks_in
             except ZeroDivisionError:
                 attacks_in_share = 0
+            try:
+                damage_series, heal_series = self._series[player]
+            except KeyError:
+                damage_series, heal_series = self._series[player] = self._create_series()
+            damage_series.append(player_data['damage_buffer'])
+            heal_series.append(player_data['heal_buffer'])
             output[name_and_handle] = {
                 'dps': dps,
                 'combat_time': combat_time,
@@ -160,109 +270,608 @@ class LiveParser():
                 'local_attacks_in_share': attacks_in_share * 100,
                 'hps': hps,
                 'kills': player_data['kills'],
-                'deaths': player_data['deaths']
+                'deaths': player_data['deaths'],
+                'rolling_dps': {
+                    seconds: damage_series.window_mean(w) / interval
+                    for seconds, w in rolling_windows.items()},
+                'rolling_hps': {
+                    seconds: heal_series.window_mean(w) / interval
+                    for seconds, w in rolling_windows.items()},
+                'dps_history': [v / interval for v in damage_series.history(history_length)],
+                'hps_history': [v / interval for v in heal_series.history(history_length)]
             }
+            if self.settings['live_trees']:
+                output[name_and_handle].update(
+                    tree_snapshot.get(player, {'damage_out': [], 'heals_out': []}))
         if len(first_player_attacks) > 0:
             player_combat_duration = max(last_player_attacks) - min(first_player_attacks)
         else:
             player_combat_duration = 0
+        if self._publisher is not None:
+            self._publisher.publish(output, player_combat_duration)
         self.update_callback(output, player_combat_duration)
 
+    def get_tree_snapshot(self) -> dict[str, dict[str, list[tuple]]]:
+        """
+        Returns the current per-ability damage and heal tables of all players. Maps player ids to a
+        dictionary containing the keys "damage_out" and "heals_out". Their values contain one row
+        per ability or pet group of the player formatted according to `TREE_HEADER` and
+        `HEAL_TREE_HEADER` respectively. Requires setting "live_trees" to be enabled.
+        """
+        with self._lock:
+            return self._get_tree_snapshot()
+
+    def _get_tree_snapshot(self) -> dict[str, dict[str, list[tuple]]]:
+        """
+        (Internal Function) Creates tree snapshot. Lock must be held by caller.
+        """
+        snapshot = dict()
+        for player in self._damage_out._player._children:
+            player_id = player.data.id[0]
+            combat_time = self._get_actor_combat_time(player_id)
+            snapshot[player_id] = {
+                'damage_out': [
+                    calculate_damage_row_stats(
+                        sum_damage_rows(iter_leaf_rows(ability), ability.data), combat_time)
+                    for ability in player._children],
+                'heals_out': list()
+            }
+        for player in self._heals_out._player._children:
+            player_id = player.data.id[0]
+            combat_time = self._get_actor_combat_time(player_id)
+            heal_rows = [
+                calculate_heal_row_stats(
+                    sum_heal_rows(iter_leaf_rows(ability), ability.data), combat_time)
+                for ability in player._children]
+            if player_id in snapshot:
+                snapshot[player_id]['heals_out'] = heal_rows
+            else:
+                snapshot[player_id] = {'damage_out': list(), 'heals_out': heal_rows}
+        return snapshot
+
+    def _get_actor_combat_time(self, actor_id: str) -> float:
+        """
+        (Internal Function) Returns combat time of actor rounded like `analyze_combat` does.
+        """
+        try:
+            start_time, end_time = self._actor_combat_durations[actor_id]
+        except KeyError:
+            return 0
+        return round(end_time - start_time, 1)
+
+    def _reset_trees(self):
+        """
+        (Internal Function) Clears live trees. Lock must be held by caller.
+        """
+        self._damage_out = TreeModel(TREE_HEADER)
+        self._heals_out = TreeModel(HEAL_TREE_HEADER)
+        self._actor_combat_durations = dict()
+
+    def _update_trees(self, line_data: list[str], timestamp: float):
+        """
+        (Internal Function) Adds a line where a player is the attacker to the live trees using the
+        same logic as `analyze_combat`.
+
+        Parameters:
+        - :param line_data: line split at commas
+        - :param timestamp: timestamp of the line
+        """
+        line = LogLine(
+            timestamp, line_data[0].split('::', 1)[1], *line_data[1:10], float(line_data[10]),
+            float(line_data[11]))
+        is_shield_line = line.type == 'Shield'
+        is_heal = (
+                (line.type == 'HitPoints' and line.magnitude < 0)
+                or (is_shield_line and line.magnitude < 0 and line.magnitude2 >= 0))
+        crit_flag, miss_flag, flank_flag, kill_flag, _, _ = get_flags(line.flags)
+        magnitude = abs(line.magnitude)
+        if is_heal:
+            _, ability_target = get_outgoing_target_row(
+                self._heals_out, line, True, HealTableRow, 0)
+            if crit_flag:
+                ability_target.critical_heals += 1
+            ability_target.total_heal += magnitude
+            ability_target.heal_ticks += 1
+            if is_shield_line:
+                ability_target.shield_heal += magnitude
+                ability_target.shield_heal_ticks += 1
+            else:
+                ability_target.hull_heal += magnitude
+                ability_target.hull_heal_ticks += 1
+            if magnitude > ability_target.max_one_heal:
+                ability_target.max_one_heal = magnitude
+            return
+
+        _, ability_target = get_outgoing_target_row(
+            self._damage_out, line, True, DamageTableRow, 0)
+        if ability_target.name != '*' and line.owner_id != line.target_id:
+            try:
+                self._actor_combat_durations[line.owner_id][1] = timestamp
+            except KeyError:
+                self._actor_combat_durations[line.owner_id] = [timestamp, timestamp]
+        ability_target.total_damage += magnitude
+        ability_target.total_attacks += 1
+        if is_shield_line:
+            ability_target.total_shield_damage += magnitude
+            ability_target.shield_attacks += 1
+        else:
+            ability_target.total_hull_damage += magnitude
+            ability_target.hull_attacks += 1
+            ability_target.total_base_damage += abs(line.magnitude2)
+        if magnitude > ability_target.max_one_hit:
+            ability_target.max_one_hit = magnitude
+        if miss_flag:
+            ability_target.misses += 1
+        if flank_flag:
+            ability_target.flank_num += 1
+        if crit_flag:
+            ability_target.crit_num += 1
+        if kill_flag:
+            ability_target.kills += 1
+
+    def _clear_data(self):
+        """
+        (Internal Function) Removes all collected player data.
+        """
+        with self._lock:
+            self._players = dict()
+            self._reset_trees()
+            self._generation += 1
+
     def analyze(self):
         """
         Analyzes the log continuously until LiveParser.stop() is called. Clears existing data first
         when called.
         """
-        with self._lock:
-            self._players = dict()
+        self._clear_data()
         self._reset = False
         with open(self.log_path, 'r', encoding='utf-8') as logfile:
             logfile.seek(0, 2)
             self._active.set()
             while self._active.is_set():
-                line: str = logfile.readline()
-                if not line:
+                if self._read_lines(logfile) == 0:
                     time.sleep(0.5)
-                    if self._reset:
-                        continue
-                    elif self._inactive_seconds >= self.settings['seconds_between_combats']:
-                        self._inactive_seconds = 0
-                        self._reset = True
-                    else:
-                        self._inactive_seconds += 0.5
-                    continue
-                if self._reset:
-                    with self._lock:
-                        self._players = dict()
-                    self._reset = False
-                self._inactive_seconds = 0
-                line_data = line.split(',')
-                if len(line_data) != 12:
-                    continue
-                timestamp = to_datetime(line_data[0].split('::')[0]).timestamp()
-                player_attacks = line_data[1].startswith("P")
-                player_attacked = line_data[5].startswith("P") and not line_data[2]
-                if not player_attacks and not player_attacked:
+                    self._add_idle_time(0.5)
+
+    def _read_lines(self, logfile: TextIO, max_lines: int = -1) -> int:
+        """
+        (Internal Function) Processes lines appended to the logfile until the end of the file is
+        reached or `max_lines` lines have been processed. Returns number of lines read.
+
+        Parameters:
+        - :param logfile: logfile opened in text mode
+        - :param max_lines: maximum number of lines to process; negative for no limit
+        """
+        line_count = 0
+        while line_count != max_lines:
+            line: str = logfile.readline()
+            if not line:
+                break
+            if self._reset:
+                self._clear_data()
+                self._reset = False
+            self._inactive_seconds = 0
+            self._process_line(line)
+            line_count += 1
+        return line_count
+
+    def _add_idle_time(self, seconds: float):
+        """
+        (Internal Function) Registers time without new lines; schedules a reset of the collected
+        data when no new lines were added for "seconds_between_combats" seconds.
+
+        Parameters:
+        - :param seconds: time since the last check in seconds
+        """
+        if self._reset:
+            return
+        elif self._inactive_seconds >= self.settings['seconds_between_combats']:
+            self._inactive_seconds = 0
+            self._reset = True
+        else:
+            self._inactive_seconds += seconds
+
+    def replay(self, path: str, speed: float = 1.0) -> dict[str, float | int]:
+        """
+        Feeds an existing logfile (plain or gzip-compressed) through the live pipeline. Update ticks
+        are driven by the timestamps of the log, so the update callback receives the same data it
+        would have received while the log was being written. Blocks until the log has been consumed
+        or LiveParser.stop() is called and returns statistics about the replay:
+            - "lines": number of lines processed
+            - "duration": wall time of the replay in seconds
+            - "lines_per_second": lines processed per second of wall time
+            - "ticks": number of executed update ticks
+            - "dropped_ticks": ticks skipped because processing fell behind the replay speed
+            - "mean_tick_latency" / "max_tick_latency": wall time in seconds spent per update tick,
+            including the update callback
+            - "filtered_lines": number of lines dropped by the line filter
+
+        Parameters:
+        - :param path: path to the logfile to replay
+        - :param speed: replay speed relative to real time (2 replays twice as fast as the log was
+        recorded); 0 replays as fast as possible
+        """
+        self.start_callback()
+        self._start_publisher()
+        try:
+            return self._replay(path, speed)
+        finally:
+            self._stop_publisher()
+
+    def _replay(self, path: str, speed: float) -> dict[str, float | int]:
+        """
+        (Internal Function) Replays logfile, see `LiveParser.replay`.
+        """
+        self._clear_data()
+        self._reset = False
+        filtered_lines = self._line_filter.dropped_lines
+        interval = self.settings['update_interval']
+        reset_delta = self.settings['seconds_between_combats']
+        max_idle_ticks = max(1, int(reset_delta // interval))
+        line_count = 0
+        tick_count = 0
+        dropped_ticks = 0
+        tick_latencies = list()
+        next_tick = None
+        last_timestamp = 0.0
+        first_timestamp = 0.0
+        self._active.set()
+        replay_start = pace_start = time.perf_counter()
+        with TextIOWrapper(open_logfile(path), encoding='utf-8') as logfile:
+            for line in logfile:
+                if not self._active.is_set():
+                    break
+                line_count += 1
+                parsed_line = self._parse_line(line)
+                if parsed_line is None:
                     continue
-                magnitude = float(line_data[10])
-                magnitude2 = float(line_data[11])
-                is_shield = line_data[8] == 'Shield'
-                is_heal = (
-                    (is_shield and magnitude < 0 and magnitude2 >= 0)
-                    or (line_data[8] == 'HitPoints' and magnitude < 0))
-                is_kill = 'Kill' in line_data[9]
-                magnitude = abs(magnitude)
-                magnitude2 = abs(magnitude2)
-
-                attacker_id = line_data[1]
-                target_id = line_data[5]
-
-                if player_attacks:
-                    if attacker_id not in self._players:
-                        with self._lock:
-                            self._players[attacker_id] = {
-                                'damage': 0,
-                                'combat_start': None,
-                                'combat_end': None,
-                                'base_damage_buffer': 0,
-                                'damage_buffer': 0,
-                                'heal': 0,
-                                'attacks_in_buffer': 0,
-                                'kills': 0,
-                                'deaths': 0
-                            }
-                            if not is_heal and line_data[5] != '*':
-                                self._players[attacker_id]['combat_start'] = timestamp
-                    if line_data[3] == '*' and line_data[5] == '*':
-                        pass
-                    elif is_heal:
-                        with self._lock:
-                            self._players[attacker_id]['heal'] += magnitude
-                    else:
-                        if self._players[attacker_id]['combat_start'] is None:
-                            with self._lock:
-                                self._players[attacker_id]['combat_start'] = timestamp
-                        with self._lock:
-                            self._players[attacker_id]['combat_end'] = timestamp
-                            self._players[attacker_id]['damage'] += magnitude
-                            self._players[attacker_id]['damage_buffer'] += magnitude
-                            self._players[attacker_id]['base_damage_buffer'] += magnitude2
-                            if is_kill:
-                                self._players[attacker_id]['kills'] += 1
-                if player_attacked and not is_shield:
-                    if target_id not in self._players:
-                        with self._lock:
-                            self._players[target_id] = {
-                                'damage': 0,
-                                'combat_start': None,
-                                'base_damage_buffer': 0,
-                                'damage_buffer': 0,
-                                'heal': 0,
-                                'attacks_in_buffer': 0,
-                                'kills': 0,
-                                'deaths': 0
-                            }
+                line_data, timestamp = parsed_line
+                if next_tick is None:
+                    first_timestamp = timestamp
+                    next_tick = timestamp + interval
+                    replay_start = pace_start = time.perf_counter()
+                elif timestamp - last_timestamp >= reset_delta:
+                    self._clear_data()
+                    # the data is cleared anyway, so the gap is skipped instead of waited for
+                    first_timestamp = timestamp
+                    next_tick = timestamp + interval
+                    pace_start = time.perf_counter()
+                else:
+                    idle_ticks = 0
+                    while timestamp >= next_tick:
+                        if speed > 0:
+                            due = pace_start + (next_tick - first_timestamp) / speed
+                            delay = time.perf_counter() - due
+                            if delay > interval / speed:
+                                dropped_ticks += 1
+                                next_tick += interval
+                                continue
+                            elif delay < 0:
+                                time.sleep(-delay)
+                        if idle_ticks < max_idle_ticks:
+                            tick_start = time.perf_counter()
+                            self.update_data()
+                            tick_latencies.append(time.perf_counter() - tick_start)
+                            tick_count += 1
+                        idle_ticks += 1
+                        next_tick += interval
+                self._apply_line(line_data, timestamp)
+                last_timestamp = timestamp
+        if self._active.is_set() and line_count > 0:
+            tick_start = time.perf_counter()
+            self.update_data()
+            tick_latencies.append(time.perf_counter() - tick_start)
+            tick_count += 1
+        self._active.clear()
+        duration = time.perf_counter() - replay_start
+        return {
+            'lines': line_count,
+            'duration': duration,
+            'lines_per_second': line_count / duration if duration > 0 else 0.0,
+            'ticks': tick_count,
+            'dropped_ticks': dropped_ticks,
+            'mean_tick_latency': (
+                sum(tick_latencies) / len(tick_latencies) if tick_latencies else 0.0),
+            'max_tick_latency': max(tick_latencies, default=0.0),
+            'filtered_lines': self._line_filter.dropped_lines - filtered_lines
+        }
+
+    def _process_line(self, line: str):
+        """
+        (Internal Function) Adds a single line to the collected data.
+
+        Parameters:
+        - :param line: raw line from the logfile
+        """
+        parsed_line = self._parse_line(line)
+        if parsed_line is not None:
+            self._apply_line(*parsed_line)
+
+    def _parse_line(self, line: str) -> tuple[list[str], float] | None:
+        """
+        (Internal Function) Splits line into its fields and decodes its timestamp. Returns `None` if
+        the line is malformed.
+
+        Parameters:
+        - :param line: raw line from the logfile
+        """
+        line_data = line.split(',')
+        if len(line_data) > 12:
+            # ability names containing commas are quoted; merged like in `OSCR._analyze_log_file`
+            line_data = line_data[:6] + [''.join(line_data[6:-5]).replace('"', '')] + line_data[-5:]
+        if len(line_data) != 12 or self._line_filter.drops(line_data):
+            return None
+        try:
+            timestamp = to_datetime(line_data[0].split('::')[0]).timestamp()
+        except (ValueError, TypeError):
+            return None
+        return line_data, timestamp
+
+    def _apply_line(self, line_data: list[str], timestamp: float):
+        """
+        (Internal Function) Adds the data of a single parsed line to the collected data.
+
+        Parameters:
+        - :param line_data: line split at commas
+        - :param timestamp: timestamp of the line
+        """
+        player_attacks = line_data[1].startswith("P")
+        player_attacked = line_data[5].startswith("P") and not line_data[2]
+        if not player_attacks and not player_attacked:
+            return
+        magnitude = float(line_data[10])
+        magnitude2 = float(line_data[11])
+        is_shield = line_data[8] == 'Shield'
+        is_heal = (
+            (is_shield and magnitude < 0 and magnitude2 >= 0)
+            or (line_data[8] == 'HitPoints' and magnitude < 0))
+        is_kill = 'Kill' in line_data[9]
+        magnitude = abs(magnitude)
+        magnitude2 = abs(magnitude2)
+
+        attacker_id = line_data[1]
+        target_id = line_data[5]
+
+        if player_attacks and self.settings['live_trees']:
+            with self._lock:
+                self._update_trees(line_data, timestamp)
+
+        if player_attacks:
+            if attacker_id not in self._players:
+                with self._lock:
+                    self._players[attacker_id] = {
+                        'damage': 0,
+                        'combat_start': None,
+                        'combat_end': None,
+                        'base_damage_buffer': 0,
+                        'damage_buffer': 0,
+                        'heal': 0,
+                        'heal_buffer': 0,
+                        'attacks_in_buffer': 0,
+                        'kills': 0,
+                        'deaths': 0
+                    }
+                    if not is_heal and line_data[5] != '*':
+                        self._players[attacker_id]['combat_start'] = timestamp
+            if line_data[3] == '*' and line_data[5] == '*':
+                pass
+            elif is_heal:
+                with self._lock:
+                    self._players[attacker_id]['heal'] += magnitude
+                    self._players[attacker_id]['heal_buffer'] += magnitude
+            else:
+                if self._players[attacker_id]['combat_start'] is None:
                     with self._lock:
-                        self._players[target_id]['attacks_in_buffer'] += 1
-                        if is_kill:
-                            self._players[target_id]['deaths'] += 1
+                        self._players[attacker_id]['combat_start'] = timestamp
+                with self._lock:
+                    self._players[attacker_id]['combat_end'] = timestamp
+                    self._players[attacker_id]['damage'] += magnitude
+                    self._players[attacker_id]['damage_buffer'] += magnitude
+                    self._players[attacker_id]['base_damage_buffer'] += magnitude2
+                    if is_kill:
+                        self._players[attacker_id]['kills'] += 1
+        if player_attacked and not is_shield:
+            if target_id not in self._players:
+                with self._lock:
+                    self._players[target_id] = {
+                        'damage': 0,
+                        'combat_start': None,
+                        'base_damage_buffer': 0,
+                        'damage_buffer': 0,
+                        'heal': 0,
+                        'heal_buffer': 0,
+                        'attacks_in_buffer': 0,
+                        'kills': 0,
+                        'deaths': 0
+                    }
+            with self._lock:
+                self._players[target_id]['attacks_in_buffer'] += 1
+                if is_kill:
+                    self._players[target_id]['deaths'] += 1
+
+
+class LiveParserGroup():
+    """
+    Tails multiple logfiles using a single thread. Every logfile is analyzed by its own
+    `LiveParser`, which keeps its own player data, settings and callbacks.
+    """
+
+    def __init__(
+            self, poll_interval: float = 0.1, max_lines_per_poll: int = 2000,
+            error_callback: Callable[[LiveParser, Exception], Any] | None = None):
+        """
+        Creates LiveParserGroup Instance.
+
+        Parameters:
+        - :param poll_interval: seconds to wait before checking the logfiles again when none of
+        them had new lines
+        - :param max_lines_per_poll: maximum number of lines read from one logfile before moving on
+        to the next one; prevents a single busy logfile from delaying the others
+        - :param error_callback: called with the LiveParser and the exception when opening,
+        reading or updating a logfile fails; the failing logfile is removed from the group while
+        the other logfiles are tailed on
+        """
+        self.poll_interval: float = poll_interval
+        self.max_lines_per_poll: int = max_lines_per_poll
+        if isinstance(error_callback, CALLABLE):
+            self.error_callback = error_callback
+        else:
+            self.error_callback = _f
+        self._parsers: list[LiveParser] = list()
+        self._lock: Lock = Lock()
+        self._stop_event: Event = Event()
+        self._thread: Thread | None = None
+
+    def __del__(self):
+        """
+        Stops the thread when the object is garbage-collected.
+        """
+        self.stop()
+
+    @property
+    def parsers(self) -> tuple[LiveParser]:
+        """LiveParsers of the logfiles in this group"""
+        with self._lock:
+            return tuple(self._parsers)
+
+    @property
+    def running(self) -> bool:
+        """`True` if the group is tailing its logfiles"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_log(
+            self, log_path: str,
+            update_callback: Callable[[dict[tuple, dict], float], Any] | None = None,
+            start_callback: Callable[[], Any] | None = None,
+            settings: dict[str] | None = None) -> LiveParser | None:
+        """
+        Adds logfile to the group. Can be called while the group is running. Returns the LiveParser
+        responsible for the logfile or `None` if the path is not an existing file.
+
+        Parameters:
+        - :param log_path: path to existing logfile
+        - :param update_callback: see `LiveParser`
+        - :param start_callback: see `LiveParser`; called when tailing of the logfile begins
+        - :param settings: see `LiveParser`
+        """
+        parser = LiveParser(start_callback, update_callback, settings)
+        if not parser.set_log_path(log_path):
+            return None
+        with self._lock:
+            self._parsers.append(parser)
+        return parser
+
+    def remove_log(self, parser: LiveParser):
+        """
+        Stops tailing the logfile analyzed by `parser`.
+
+        Parameters:
+        - :param parser: LiveParser returned by `LiveParserGroup.add_log`
+        """
+        parser.stop()
+        with self._lock:
+            if parser in self._parsers:
+                self._parsers.remove(parser)
+
+    def start(self):
+        """
+        Starts tailing all logfiles.
+        """
+        if not self.running:
+            self._stop_event = Event()
+            self._thread = Thread(target=self._run, args=(self._stop_event,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops tailing all logfiles.
+        """
+        self._stop_event.set()
+        for parser in self.parsers:
+            parser.stop()
+
+    def _run(self, stop_event: Event):
+        """
+        (Internal Function) Event loop reading all logfiles and executing their update ticks.
+
+        Parameters:
+        - :param stop_event: ends the loop when set
+        """
+        logfiles: dict[LiveParser, TextIO] = dict()
+        next_ticks: dict[LiveParser, float] = dict()
+        last_poll = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                parsers = self.parsers
+                for parser in parsers:
+                    if parser not in logfiles:
+                        try:
+                            self._open_log(parser, logfiles, next_ticks)
+                        except Exception as error:
+                            self._remove_failed(parser, error, logfiles, next_ticks)
+                for parser in tuple(logfiles.keys()):
+                    if parser not in parsers:
+                        logfiles.pop(parser).close()
+                        del next_ticks[parser]
+
+                now = time.monotonic()
+                idle_time = now - last_poll
+                last_poll = now
+                lines_read = False
+                next_wakeup = now + self.poll_interval
+                for parser, logfile in tuple(logfiles.items()):
+                    try:
+                        if parser._read_lines(logfile, self.max_lines_per_poll) > 0:
+                            lines_read = True
+                        else:
+                            parser._add_idle_time(idle_time)
+                        interval = parser.settings['update_interval']
+                        if time.monotonic() >= next_ticks[parser]:
+                            parser.update_data()
+                            next_ticks[parser] += interval
+                            delay = time.monotonic() - next_ticks[parser]
+                            if delay > 0:
+                                missed_ticks = int(delay // interval) + 1
+                                parser.dropped_ticks += missed_ticks
+                                next_ticks[parser] += missed_ticks * interval
+                    except Exception as error:
+                        self._remove_failed(parser, error, logfiles, next_ticks)
+                        continue
+                    next_wakeup = min(next_wakeup, next_ticks[parser])
+                if not lines_read:
+                    stop_event.wait(max(0.0, next_wakeup - time.monotonic()))
+        finally:
+            for logfile in logfiles.values():
+                logfile.close()
+            for parser in logfiles:
+                parser._active.clear()
+
+    def _open_log(
+            self, parser: LiveParser, logfiles: dict[LiveParser, TextIO],
+            next_ticks: dict[LiveParser, float]):
+        """
+        (Internal Function) Starts tailing the logfile of `parser` at its current end.
+        """
+        parser.start_callback()
+        parser._start_publisher()
+        parser._clear_data()
+        parser._reset = False
+        logfile = open(parser.log_path, 'r', encoding='utf-8')
+        logfile.seek(0, 2)
+        logfiles[parser] = logfile
+        next_ticks[parser] = time.monotonic() + parser.settings['update_interval']
+        parser._active.set()
+
+    def _remove_failed(
+            self, parser: LiveParser, error: Exception, logfiles: dict[LiveParser, TextIO],
+            next_ticks: dict[LiveParser, float]):
+        """
+        (Internal Function) Removes parser whose logfile could not be opened, read or updated
+        from the group and reports the error to the error callback.
+        """
+        logfile = logfiles.pop(parser, None)
+        if logfile is not None:
+            logfile.close()
+        next_ticks.pop(parser, None)
+        self.remove_log(parser)
+        self.error_callback(parser, error)
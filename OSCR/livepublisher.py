@@ -0,0 +1,385 @@
+"""Publishes live parser data to local subscribers via a Unix domain socket"""
+
+import os
+import selectors
+import socket
+import struct
+from threading import Lock, Thread
+from typing import Iterator, Sequence
+
+from .constants import LIVE_FRAME_FIELDS
+
+FRAME_MAGIC = b'OSCR'
+FRAME_VERSION = 1
+FLAG_KEYFRAME = 1
+
+# frame length, magic, version, flags, sequence number, combat time, changed players, removed players
+_FRAME_HEADER = struct.Struct('<I4sBBIdHH')
+_PLAYER_HEADER = struct.Struct('<H')
+_STRING_LENGTH = struct.Struct('<H')
+_FIELD_VALUE = struct.Struct('<d')
+
+
+def _encode_string(string: str) -> bytes:
+    encoded = string.encode('utf-8')
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _decode_string(data: bytes | memoryview, position: int) -> tuple[str, int]:
+    length, = _STRING_LENGTH.unpack_from(data, position)
+    position += _STRING_LENGTH.size
+    return bytes(data[position:position + length]).decode('utf-8'), position + length
+
+
+def encode_frame(
+        sequence: int, combat_time: float, changed: dict[tuple[str, str], dict[str, float]],
+        removed: Sequence[tuple[str, str]] = (), keyframe: bool = False) -> bytes:
+    """
+    Encodes player data into a binary frame. Only the fields contained in the player dictionaries
+    are added to the frame.
+
+    Frame layout (little endian): u32 length of the remaining frame, 4 bytes magic "OSCR", u8
+    version, u8 flags (1 = keyframe), u32 sequence number, f64 combat time, u16 number of changed
+    players, u16 number of removed players; then name and handle of every removed player; then for
+    every changed player name, handle, u16 field bitmask (bit i refers to `LIVE_FRAME_FIELDS[i]`)
+    and one f64 per set bit in ascending bit order. Strings are encoded as u16 length followed by
+    utf-8 bytes.
+
+    Parameters:
+    - :param sequence: sequence number of the frame
+    - :param combat_time: current combat time
+    - :param changed: maps (name, handle) of players to the changed fields and their values
+    - :param removed: players that are no longer part of the data
+    - :param keyframe: `True` if the frame contains the complete state
+    """
+    body = bytearray()
+    for name, handle in removed:
+        body += _encode_string(name) + _encode_string(handle)
+    for (name, handle), fields in changed.items():
+        mask = 0
+        values = bytearray()
+        for bit, field in enumerate(LIVE_FRAME_FIELDS):
+            if field in fields:
+                mask |= 1 << bit
+                values += _FIELD_VALUE.pack(fields[field])
+        body += _encode_string(name) + _encode_string(handle)
+        body += _PLAYER_HEADER.pack(mask) + values
+    header = _FRAME_HEADER.pack(
+        _FRAME_HEADER.size - 4 + len(body), FRAME_MAGIC, FRAME_VERSION,
+        FLAG_KEYFRAME if keyframe else 0, sequence, combat_time, len(changed), len(removed))
+    return header + body
+
+
+def decode_frame(frame: bytes | memoryview) -> dict:
+    """
+    Decodes a single binary frame created by `encode_frame`, including its length prefix. Returns
+    dictionary with the keys "sequence", "combat_time", "keyframe", "changed" and "removed".
+
+    Parameters:
+    - :param frame: frame to decode
+    """
+    _, magic, version, flags, sequence, combat_time, changed_count, removed_count = (
+        _FRAME_HEADER.unpack_from(frame, 0))
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError('Invalid frame')
+    position = _FRAME_HEADER.size
+    removed = list()
+    for _ in range(removed_count):
+        name, position = _decode_string(frame, position)
+        handle, position = _decode_string(frame, position)
+        removed.append((name, handle))
+    changed = dict()
+    for _ in range(changed_count):
+        name, position = _decode_string(frame, position)
+        handle, position = _decode_string(frame, position)
+        mask, = _PLAYER_HEADER.unpack_from(frame, position)
+        position += _PLAYER_HEADER.size
+        fields = dict()
+        for bit, field in enumerate(LIVE_FRAME_FIELDS):
+            if mask & (1 << bit):
+                fields[field], = _FIELD_VALUE.unpack_from(frame, position)
+                position += _FIELD_VALUE.size
+        changed[(name, handle)] = fields
+    return {
+        'sequence': sequence,
+        'combat_time': combat_time,
+        'keyframe': bool(flags & FLAG_KEYFRAME),
+        'changed': changed,
+        'removed': removed
+    }
+
+
+class LivePublisher():
+    """
+    Serves live parser data on a Unix domain socket. Subscribers receive a keyframe containing the
+    complete state after connecting and delta frames containing only changed players and fields
+    afterwards. Encoding and sending happens on a separate thread; publishing never blocks.
+    """
+
+    def __init__(self, socket_path: str, max_buffer_size: int = 1 << 20):
+        """
+        Parameters:
+        - :param socket_path: path of the Unix domain socket; an existing socket at this path is
+        replaced
+        - :param max_buffer_size: subscribers with more than this many unsent bytes are
+        disconnected
+        """
+        self.socket_path: str = socket_path
+        self.max_buffer_size: int = max_buffer_size
+        self._lock: Lock = Lock()
+        self._pending: tuple[dict, float] | None = None
+        self._state: dict[tuple[str, str], dict[str, float]] = dict()
+        self._combat_time: float = 0.0
+        self._sequence: int = 0
+        self._clients: dict[socket.socket, bytearray] = dict()
+        self._server: socket.socket | None = None
+        self._wakeup_receiver: socket.socket | None = None
+        self._wakeup_sender: socket.socket | None = None
+        self._selector: selectors.BaseSelector | None = None
+        self._thread: Thread | None = None
+        self._running: bool = False
+
+    def __del__(self):
+        self.stop()
+
+    @property
+    def subscriber_count(self) -> int:
+        """number of connected subscribers"""
+        return len(self._clients)
+
+    def start(self):
+        """
+        Creates the socket and starts serving subscribers.
+        """
+        if self._running:
+            return
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError('Unix domain sockets are not supported on this platform.')
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ)
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Disconnects all subscribers and removes the socket.
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        self._thread.join()
+        for client in tuple(self._clients):
+            self._drop_client(client)
+        self._selector.close()
+        self._server.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def publish(self, player_data: dict[tuple[str, str], dict], combat_time: float):
+        """
+        Publishes new player data. Returns immediately; if the publisher thread has not sent the
+        previous data yet, it is replaced by the new data.
+
+        Parameters:
+        - :param player_data: player data as passed to the update callback of `LiveParser`
+        - :param combat_time: combat time as passed to the update callback of `LiveParser`
+        """
+        if not self._running:
+            return
+        with self._lock:
+            self._pending = (player_data, combat_time)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        """
+        (Internal Function) Accepts subscribers, encodes published data and sends frames.
+        """
+        while self._running:
+            for key, events in self._selector.select():
+                sock = key.fileobj
+                if sock is self._server:
+                    self._accept()
+                elif sock is self._wakeup_receiver:
+                    try:
+                        while sock.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    if events & selectors.EVENT_READ and not self._receive(sock):
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self._flush(sock)
+            with self._lock:
+                pending = self._pending
+                self._pending = None
+            if pending is not None:
+                self._broadcast(*pending)
+
+    def _accept(self):
+        try:
+            client, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        client.setblocking(False)
+        self._clients[client] = bytearray(encode_frame(
+            self._sequence, self._combat_time, self._state, keyframe=True))
+        self._selector.register(client, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def _broadcast(self, player_data: dict[tuple[str, str], dict], combat_time: float):
+        """
+        (Internal Function) Encodes the difference between the last sent state and `player_data`
+        and queues the frame for all subscribers.
+        """
+        changed = dict()
+        new_state = dict()
+        for player, data in player_data.items():
+            fields = {field: float(data[field]) for field in LIVE_FRAME_FIELDS if field in data}
+            new_state[player] = fields
+            previous = self._state.get(player)
+            if previous is None:
+                changed[player] = fields
+            else:
+                delta = {f: value for f, value in fields.items() if previous.get(f) != value}
+                if delta:
+                    changed[player] = delta
+        removed = [player for player in self._state if player not in new_state]
+        self._state = new_state
+        self._combat_time = combat_time
+        self._sequence += 1
+        frame = encode_frame(self._sequence, combat_time, changed, removed)
+        for client, buffer in tuple(self._clients.items()):
+            if len(buffer) + len(frame) > self.max_buffer_size:
+                self._drop_client(client)
+                continue
+            if not buffer:
+                self._selector.modify(client, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            buffer += frame
+
+    def _receive(self, client: socket.socket) -> bool:
+        """
+        (Internal Function) Discards data sent by the subscriber. Returns `False` if the subscriber
+        disconnected.
+        """
+        try:
+            if client.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._drop_client(client)
+        return False
+
+    def _flush(self, client: socket.socket):
+        """
+        (Internal Function) Sends as much of the buffered data to the subscriber as possible.
+        """
+        buffer = self._clients.get(client)
+        if buffer is None:
+            return
+        try:
+            sent = client.send(buffer)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop_client(client)
+            return
+        del buffer[:sent]
+        if not buffer:
+            self._selector.modify(client, selectors.EVENT_READ)
+
+    def _drop_client(self, client: socket.socket):
+        self._clients.pop(client, None)
+        try:
+            self._selector.unregister(client)
+        except (KeyError, ValueError):
+            pass
+        client.close()
+
+
+class LiveSubscriber():
+    """
+    Connects to a `LivePublisher` and keeps the complete player state by applying received frames.
+    """
+
+    def __init__(self, socket_path: str):
+        """
+        Parameters:
+        - :param socket_path: path of the Unix domain socket the publisher serves on
+        """
+        self.socket_path: str = socket_path
+        self.players: dict[tuple[str, str], dict[str, float]] = dict()
+        self.combat_time: float = 0.0
+        self.sequence: int = -1
+        self._socket: socket.socket | None = None
+        self._buffer: bytearray = bytearray()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        self.close()
+
+    def connect(self):
+        """Connects to the publisher."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.socket_path)
+
+    def close(self):
+        """Closes the connection."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def __iter__(self) -> Iterator[dict]:
+        """
+        Yields decoded frames (see `decode_frame`) after applying them to `self.players` until the
+        publisher closes the connection.
+        """
+        while True:
+            while len(self._buffer) < 4 or len(self._buffer) < 4 + int.from_bytes(
+                    self._buffer[:4], 'little'):
+                data = self._socket.recv(65536)
+                if not data:
+                    return
+                self._buffer += data
+            frame_length = 4 + int.from_bytes(self._buffer[:4], 'little')
+            frame = decode_frame(bytes(self._buffer[:frame_length]))
+            del self._buffer[:frame_length]
+            self._apply(frame)
+            yield frame
+
+    def _apply(self, frame: dict):
+        if frame['keyframe']:
+            self.players = dict()
+        for player in frame['removed']:
+            self.players.pop(player, None)
+        for player, fields in frame['changed'].items():
+            if player in self.players:
+                self.players[player].update(fields)
+            else:
+                self.players[player] = fields
+        self.combat_time = frame['combat_time']
+        self.sequence = frame['sequence']
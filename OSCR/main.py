@@ -1,18 +1,78 @@
+from collections import deque
 from collections.abc import Callable
+from copy import deepcopy
 from datetime import timedelta, datetime
 from multiprocessing import Process, Queue
-from multiprocessing.pool import Pool
+from multiprocessing.pool import Pool, ThreadPool
 import os
-from queue import Empty as EmptyException
+from queue import Empty as EmptyException, Queue as ThreadQueue
+import sys
+from threading import Event, Thread
+from time import perf_counter
 
+from .archive import ARCHIVE_BLOCK_SIZE, read_archive_index
 from .combat import Combat
-from .constants import BANNED_ABILITIES
+from .combatstore import CombatStore
 from .datamodels import LogLine
 from .detection import Detection
-from .iofunc import extract_bytes, reset_temp_folder
+from .history import PlayerHistory
+from .instrumentation import Instrumentation
+from .iofunc import archive_logfile, extract_bytes, open_logfile, reset_temp_folder
+from .linecolumns import LineColumns
+from .linefilter import LineFilter
 from .oscr_read_file_backwards import ReadFileBackwards
-from .parser import analyze_combat
-from .utilities import datetime_to_display, get_entity_name, to_datetime
+from .overview import analyze_overview
+from .parser import analyze_combat, can_resume_analysis, resume_analysis
+from .pipeline import InFlightLimit, PipelineMetrics
+from .progress import CancellationToken, Progress, PROGRESS_INTERVAL, ProgressReporter
+from .timeindex import find_combat_end, find_last_line_end, TimestampIndex
+from .utilities import datetime_to_display, get_entity_name, to_datetime, to_microseconds
+
+# number of combats large enough to isolate all combats of a logfile
+ALL_COMBATS = 1 << 30
+# number of workers analyzing combats in `analyze_log_file_mp`
+ANALYSIS_WORKERS = 4
+# seconds `analyze_log_file_mp` waits for the isolating process to find the next combat
+ISOLATION_TIMEOUT = 15
+# subfolder of the temporary folder holding the folders of the combat stores; not deleted when
+# resetting the temporary folder, as other instances may keep their only copy of combats there
+COMBAT_SPILL_FOLDER = 'combats'
+# settings that change which lines are parsed; changing them requires reading the logfile again
+LINE_FILTER_SETTINGS = (
+    'excluded_event_ids', 'excluded_abilities', 'excluded_entities', 'excluded_types')
+
+# settings used by `OSCR` unless overridden by the settings passed to it
+DEFAULT_SETTINGS = {
+    "combats_to_parse": 10,
+    "seconds_between_combats": 100,
+    "combat_min_lines": 20,
+    "excluded_event_ids": ["Autodesc.Combatevent.Falling"],
+    "excluded_abilities": [],
+    "excluded_entities": [],
+    "excluded_types": [],
+    "focus_players": [],
+    "graph_resolution": 0.2,
+    "instrumentation": False,
+    "interval_index": False,
+    "column_cache": False,
+    "timestamp_index_folder_path": "",
+    "combat_memory_budget": 0,
+    "keep_log_data": False,
+    "max_combats_in_flight": 2 * ANALYSIS_WORKERS,
+    "max_bytes_in_flight": 0,
+    "analysis_backend": "auto",
+    "templog_folder_path": f"{os.path.dirname(os.path.abspath(__file__))}/~temp_log_files",
+}
+
+
+def default_settings(settings: dict | None = None) -> dict:
+    """
+    Returns a copy of `DEFAULT_SETTINGS` updated with `settings`.
+    """
+    merged_settings = deepcopy(DEFAULT_SETTINGS)
+    if settings is not None:
+        merged_settings.update(settings)
+    return merged_settings
 
 
 def _f(*args, **kwargs):
@@ -25,24 +85,43 @@ class OSCR:
 
     def __init__(self, log_path: str = '', settings: dict = None):
         self.log_path = log_path
-        self.combats: list[Combat] = list()
-        self.bytes_consumed: int = 0  # -1 would mean entire log has been consumed
+        # part of the logfile read so far as positions of its first byte and the byte after it;
+        # older combats are read from `read_start` (0 once the entire log has been read) and
+        # `refresh` reads the bytes appended after `read_end`; both are -1 before the first read
+        self.read_start: int = -1
+        self.read_end: int = -1
+        self.filtered_lines: int = 0  # lines dropped by the line filter in last isolate_combats
+        # one row per player and analyzed combat; kept when the parser is reset
+        self.history: PlayerHistory = PlayerHistory()
         self.combat_analyzed_callback: Callable[[Combat], None] = _f
         self.task_finished_callback: Callable[[list[int]], None] = _f
-        self._settings = {
-            "combats_to_parse": 10,
-            "seconds_between_combats": 100,
-            "combat_min_lines": 20,
-            "excluded_event_ids": ["Autodesc.Combatevent.Falling"],
-            "graph_resolution": 0.2,
-            "templog_folder_path": f"{os.path.dirname(os.path.abspath(__file__))}/~temp_log_files",
-        }
+        self._settings = default_settings(settings)
         self._pool = None
         self._queue = None
+        self._submit_times: dict[int, tuple[float, float]] = dict()
+        self._timestamp_indexes: dict[str, TimestampIndex] = dict()
+        # queue depths and stage utilization of the last `analyze_log_file_mp` run
+        self.pipeline_metrics: PipelineMetrics | None = None
 
-        if settings is not None:
-            self._settings.update(settings)
-        reset_temp_folder(self._settings['templog_folder_path'])
+        # stage timings and counters of all analyzed combats; None if instrumentation is disabled
+        self.instrumentation: Instrumentation | None = None
+        if self._settings['instrumentation']:
+            self.instrumentation = Instrumentation()
+        reset_temp_folder(self._settings['templog_folder_path'], (COMBAT_SPILL_FOLDER,))
+        self.combats: CombatStore = self._create_combat_store()
+        # columns of the lines read so far; only kept if the setting "column_cache" is enabled
+        self.line_columns: LineColumns | None = None
+
+    def _create_combat_store(self) -> CombatStore:
+        """
+        (Internal Function) Creates store for analyzed combats from the settings
+        "combat_memory_budget" (approximate bytes of analyzed combats to keep in memory; 0 keeps
+        all) and "keep_log_data" (keeps raw lines of analyzed combats).
+        """
+        return CombatStore(
+            self._settings['combat_memory_budget'],
+            os.path.join(self._settings['templog_folder_path'], COMBAT_SPILL_FOLDER),
+            self._settings['keep_log_data'])
 
     def __del__(self):
         if isinstance(self._pool, Pool):
@@ -54,26 +133,46 @@ class OSCR:
         Contains tuple with available combats.
         """
         res = list()
-        for c in self.combats:
-            if c.difficulty:
+        for summary in self.combats.summaries():
+            if summary is None:
+                continue
+            map_name, difficulty, start_time, _ = summary
+            if difficulty:
                 res.append(
-                    f"{c.map} ({c.difficulty} Difficulty) at {datetime_to_display(c.start_time)}")
+                    f"{map_name} ({difficulty} Difficulty) at {datetime_to_display(start_time)}")
             else:
-                res.append(f"{c.map} {datetime_to_display(c.start_time)}")
+                res.append(f"{map_name} {datetime_to_display(start_time)}")
         return res
 
+    @property
+    def bytes_consumed(self) -> int:
+        """
+        Number of bytes of the logfile read so far; -1 if the entire logfile has been read.
+        """
+        if self.read_start == 0:
+            return -1
+        return max(self.read_end - self.read_start, 0)
+
     def reset_parser(self):
         """
         Resets the parser to default state. Removes stored combats, logfile data and log path.
         """
         self.log_path = ''
-        self.combats = list()
-        self.bytes_consumed = 0
+        self.combats.clear()
+        self.read_start = -1
+        self.read_end = -1
+        self.line_columns = None
+        if self.instrumentation is not None:
+            self.instrumentation.reset()
 
     @staticmethod
     def _analyze_log_file(
-            log_path: str, total_combats: int, first_combat_id: int, offset: int, settings: dict,
-            combat_handler: Callable[[Combat], None] = _f) -> int:
+            log_path: str, total_combats: int, first_combat_id: int, end_position: int,
+            settings: dict, combat_handler: Callable[[Combat], None] = _f,
+            columns_handler: Callable[[LineColumns], None] = _f,
+            stop_time: datetime | None = None, start_position: int = 0,
+            progress: ProgressReporter | None = None,
+            cancel_token: CancellationToken | None = None) -> tuple[int, int]:
         """
         (Internal Function) Reads a logfile, isolates combats and calls `combat_handler` for each
         combat as soon as it has been found.
@@ -82,14 +181,26 @@ class OSCR:
         - :param log_path: log path to be analyzed; overwrites `self.log_path`
         - :param total_combats: stops isolating combats when combat id reaches `total_combats`
         - :param first_combat_id: id that the first found combat gets; id is incremented per combat
-        - :param offset: offset in bytes from the end of the logfile
-        - :param settings: contains settings for parser; uses keys "seconds_between_combats" and
-        "graph_resolution"
+        - :param end_position: position of the byte after the last byte to read; -1 reads up to the
+        end of the file
+        - :param settings: contains settings for parser; uses keys "seconds_between_combats",
+        "graph_resolution", "instrumentation", "column_cache" and the line filter keys
         - :param combat_handler: Called once for each analyzed combat as soon as the combats
         analyzation is complete
+        - :param columns_handler: Called with the columns of all read lines after reading; only
+        called if "column_cache" is enabled
+        - :param stop_time: stops isolating combats after the combat ongoing at this time, or the
+        last combat before it, has been found
+        - :param start_position: position of the first byte to read, which must be the start of a
+        line; if not 0, the combat starting there is passed to `combat_handler` regardless of its
+        number of lines, as it may continue a combat before `start_position`
+        - :param progress: updated with the number of bytes read and combats found once per chunk
+        - :param cancel_token: checked once per chunk; when cancelled, reading stops and the combat
+        being isolated is discarded, so that the read part of the file ends with the last found
+        combat
 
-        :return: -1 if entire file has been consumed; otherwise next byte to analyze counted from
-        the end of the file
+        :return: positions of the first byte and the byte after the read part of the file; the
+        first position is `start_position` if the file has been read up to it
         """
         combat_delta = timedelta(seconds=settings['seconds_between_combats'])
         combat_id = first_combat_id
@@ -97,7 +208,38 @@ class OSCR:
         log_consumed = True
         broken_line_temp: str = ''
         broken_lines: list[str] = list()
-        with ReadFileBackwards(log_path, offset) as backwards_file:
+        line_filter = LineFilter.from_settings(settings)
+        instrumented = settings.get('instrumentation', False)
+        if instrumented:
+            segment_start = perf_counter()
+            segment_read_time = 0.0
+        column_cache = settings.get('column_cache', False)
+        if column_cache:
+            read_lines: list[LogLine] = list()
+            line_ends: list[int] = list()
+            boundary_gap = -1
+            broken_line_end = -1
+            cancel_lines = 0
+
+        def check_chunk(bytes_read: int) -> bool:
+            if cancel_token is not None and cancel_token.cancelled:
+                return False
+            if progress is not None:
+                progress.update(bytes_read, combat_id - first_combat_id)
+            return True
+        chunk_callback = None
+        if progress is not None or cancel_token is not None:
+            chunk_callback = check_chunk
+        with ReadFileBackwards(
+                log_path, timed=instrumented, positions=column_cache,
+                end_position=end_position, start_position=start_position,
+                chunk_callback=chunk_callback) as backwards_file:
+            offset = backwards_file.offset
+            # start of the part of the file the found combats cover; reading stops there if the
+            # operation is cancelled
+            cancel_position = backwards_file.filesize - offset
+            if progress is not None:
+                progress.total_bytes = cancel_position - start_position
             try:
                 last_log_time = to_datetime(backwards_file.top.split('::')[0])
             except BaseException:
@@ -107,9 +249,13 @@ class OSCR:
             for line in backwards_file:
                 if len(line) <= 2:
                     continue
+                if column_cache:
+                    record_end = backwards_file.line_end
                 try:
                     time_data, attack_data = line.split('::')
                     splitted_line = attack_data.split(',')
+                    if len(splitted_line) == 12 and line_filter.drops(splitted_line):
+                        continue
                     log_time = to_datetime(time_data)
                     current_line = LogLine(
                         log_time,
@@ -122,8 +268,13 @@ class OSCR:
                         line_data = line.split('::')
                     else:
                         line_data = (line + broken_line_temp).split('::')
+                        if column_cache:
+                            # lines continued in following lines end with their last part
+                            record_end = broken_line_end
                     if len(line_data) != 2:
                         broken_line_temp = line + broken_line_temp
+                        if column_cache:
+                            broken_line_end = record_end
                         continue
                     log_time = to_datetime(line_data[0])
                     attack_parts = line_data[1].split(',')
@@ -139,6 +290,8 @@ class OSCR:
                     broken_line_temp = ''
                     splitted_line[6] = (
                         splitted_line[6].replace('\r', '').replace('\n', '').replace('"', ''))
+                    if line_filter.drops(splitted_line):
+                        continue
                     try:
                         current_line = LogLine(
                             log_time,
@@ -149,8 +302,6 @@ class OSCR:
                     except ValueError:
                         continue
 
-                if splitted_line[6] in BANNED_ABILITIES:
-                    continue
                 if last_log_time - log_time > combat_delta:
                     current_file_position = backwards_file.filesize - (
                         backwards_file.get_bytes_read(True) + offset)
@@ -158,30 +309,90 @@ class OSCR:
                         current_combat.start_time = last_log_time
                         current_combat.file_pos[0] = current_file_position
                         current_combat.meta['broken_lines'] = broken_lines[:30]
+                        current_combat.meta['filtered_lines'] = line_filter.take_dropped_lines()
+                        if instrumented:
+                            OSCR._instrument_isolated_combat(
+                                current_combat, perf_counter() - segment_start,
+                                backwards_file.read_time - segment_read_time, len(broken_lines))
                         broken_lines.clear()
                         combat_handler(current_combat)
+                        if instrumented:
+                            segment_start = perf_counter()
+                            segment_read_time = backwards_file.read_time
                         combat_id += 1
-                    if combat_id >= total_combats:
+                    else:
+                        line_filter.take_dropped_lines()
+                    if combat_id >= total_combats or (
+                            stop_time is not None and log_time < stop_time):
                         log_consumed = False
-                        new_offset = backwards_file.get_bytes_read(True) + offset
+                        read_start = current_file_position
+                        if column_cache:
+                            boundary_gap = to_microseconds(last_log_time - log_time)
                         break
+                    cancel_position = current_file_position
+                    if column_cache:
+                        cancel_lines = len(read_lines)
+                        cancel_gap = to_microseconds(last_log_time - log_time)
                     current_combat = Combat(settings['graph_resolution'], combat_id, log_path)
                     current_combat.end_time = log_time
                     current_combat.file_pos[1] = current_file_position
                 last_log_time = log_time
                 current_combat.log_data.appendleft(current_line)
+                if column_cache:
+                    read_lines.append(current_line)
+                    line_ends.append(record_end)
+        if backwards_file.stopped:
+            log_consumed = False
+            read_start = cancel_position
+            if column_cache:
+                del read_lines[cancel_lines:]
+                del line_ends[cancel_lines:]
+                if cancel_lines > 0:
+                    boundary_gap = cancel_gap
         if log_consumed:
-            if len(current_combat.log_data) >= settings['combat_min_lines']:
+            if len(current_combat.log_data) >= settings['combat_min_lines'] or (
+                    start_position > 0 and len(current_combat.log_data) > 0):
                 current_combat.start_time = log_time
-                current_combat.file_pos[0] = 0
+                current_combat.file_pos[0] = start_position
                 current_combat.meta['broken_lines'] = broken_lines[:30]
+                current_combat.meta['filtered_lines'] = line_filter.take_dropped_lines()
+                if instrumented:
+                    OSCR._instrument_isolated_combat(
+                        current_combat, perf_counter() - segment_start,
+                        backwards_file.read_time - segment_read_time, len(broken_lines))
                 combat_handler(current_combat)
-            new_offset = -1
-        return new_offset
+            read_start = start_position
+        read_end = backwards_file.filesize - offset
+        if column_cache:
+            columns_handler(LineColumns(
+                log_path, read_lines, line_ends, read_start, read_end, boundary_gap))
+        return read_start, read_end
+
+    @staticmethod
+    def _instrument_isolated_combat(
+            combat: Combat, segment_time: float, read_time: float, broken_line_count: int):
+        """
+        (Internal Function) Initializes timings and counters of a freshly isolated combat.
+
+        Parameters:
+        - :param combat: isolated combat
+        - :param segment_time: time spent isolating the combat, including reading
+        - :param read_time: time spent reading and decoding the file while isolating the combat
+        - :param broken_line_count: number of lines of the combat that could not be parsed
+        """
+        combat.meta['timings'] = {'read': read_time, 'tokenize': segment_time - read_time}
+        combat.meta['counters'] = {
+            'lines': len(combat.log_data),
+            'bytes': combat.file_pos[1] - combat.file_pos[0],
+            'broken_lines': broken_line_count,
+            'filtered_lines': combat.meta['filtered_lines'],
+        }
 
     def analyze_log_file(
-            self, log_path: str = '', max_combats: int = -1, offset: int = -1,
-            result_handler: Callable[[Combat], None] = _f) -> list[int] | None:
+            self, log_path: str = '', max_combats: int = -1, end_position: int = -1,
+            result_handler: Callable[[Combat], None] = _f,
+            progress_handler: Callable[[Progress], None] | None = None,
+            cancel_token: CancellationToken | None = None) -> list[int] | None:
         """
         Analyzes log file in `self.log_file` and appends analyzed combats to `self.combats`.
         (Can cause duplicate combats to appear, use `self.reset_parser` if analyzing new log file.)
@@ -191,58 +402,325 @@ class OSCR:
         Parameters:
         - :param log_path: log path to be analyzed; overwrites `self.log_path`
         - :param max_combats: maximum number of combats to analyze
-        - :param offset: offset in bytes from the end of the logfile
+        - :param end_position: position of the byte after the last byte to read, counted from the
+        start of the logfile; defaults to `self.read_start`
         - :param result_handler: Called once for each analyzed combat as soon as the combats
         analyzation is complete
+        - :param progress_handler: called with the progress of reading the logfile at most every
+        0.1 seconds and once at the end
+        - :param cancel_token: stops reading when cancelled; the combats analyzed until then are
+        kept and returned, and the next call continues with the combat that was being isolated
+        """
+        return self._add_combats(
+            log_path, max_combats, end_position, result_handler, self.analyze_new_combat,
+            progress_handler, cancel_token)
+
+    def analyze_log_file_overview(
+            self, log_path: str = '', max_combats: int = -1, end_position: int = -1,
+            result_handler: Callable[[Combat], None] = _f,
+            progress_handler: Callable[[Progress], None] | None = None,
+            cancel_token: CancellationToken | None = None) -> list[int] | None:
+        """
+        Works like `analyze_log_file`, but only determines map, difficulty, durations and the
+        overview table of each combat in a single pass (see `analyze_overview`). The analysis trees
+        of the combats are not built, which makes this considerably faster when only the overview
+        is needed. Returns list of combat ids that were analyzed. Returns `None` if no valid log
+        file is provided or the entire log file has been consumed already.
+
+        Parameters:
+        - :param log_path: log path to be analyzed; overwrites `self.log_path`
+        - :param max_combats: maximum number of combats to analyze
+        - :param end_position: position of the byte after the last byte to read, counted from the
+        start of the logfile; defaults to `self.read_start`
+        - :param result_handler: Called once for each analyzed combat as soon as the combats
+        analyzation is complete
+        - :param progress_handler: called with the progress of reading the logfile at most every
+        0.1 seconds and once at the end
+        - :param cancel_token: stops reading when cancelled; the combats analyzed until then are
+        kept and returned, and the next call continues with the combat that was being isolated
+        """
+        return self._add_combats(
+            log_path, max_combats, end_position, result_handler,
+            self.analyze_new_combat_overview, progress_handler, cancel_token)
+
+    def _add_combats(
+            self, log_path: str, max_combats: int, end_position: int,
+            result_handler: Callable[[Combat], None], combat_handler: Callable[[Combat], None],
+            progress_handler: Callable[[Progress], None] | None = None,
+            cancel_token: CancellationToken | None = None) -> list[int] | None:
+        """
+        (Internal Function) Isolates combats from the logfile, passes them to `combat_handler` and
+        returns the ids of the new combats in `self.combats`.
         """
         if log_path != '':
             self.log_path = log_path
         elif self.log_path == '':
             return
-        if self.bytes_consumed < 0:
+        if self.read_start == 0:
             return
         next_combat_id = len(self.combats)
         if max_combats < 0:
             max_combats = self._settings['combats_to_parse']
         total_combats = len(self.combats) + max_combats
         self.combats.extend([None] * max_combats)
-        if offset < 0:
-            offset = self.bytes_consumed
+        if end_position < 0:
+            end_position = self.read_start
         if result_handler is not _f:
             self.combat_analyzed_callback = result_handler
-        self.bytes_consumed = OSCR._analyze_log_file(
-            self.log_path, total_combats, next_combat_id, offset, self._settings,
-            self.analyze_new_combat)
-        new_combat_ids = list()
-        for id, combat in enumerate(self.combats[next_combat_id:], next_combat_id):
-            if combat is None:
-                self.combats.pop(id)
+        progress = None
+        if progress_handler is not None:
+            progress = ProgressReporter(progress_handler, max_combats=max_combats)
+        read_start, read_end = OSCR._analyze_log_file(
+            self.log_path, total_combats, next_combat_id, end_position, self._settings,
+            combat_handler, self._add_line_columns, progress=progress, cancel_token=cancel_token)
+        self._add_read_part(read_start, read_end)
+        # combats are found in order, so unused slots are at the end
+        while len(self.combats) > next_combat_id and self.combats[-1] is None:
+            self.combats.pop()
+        if progress is not None:
+            progress.finish(read_end - read_start, len(self.combats) - next_combat_id)
+        return list(range(next_combat_id, len(self.combats)))
+
+    def _add_read_part(self, read_start: int, read_end: int):
+        """
+        (Internal Function) Extends the part of the logfile read so far by a newly read part.
+        """
+        if self.read_start < 0 or read_start < self.read_start:
+            self.read_start = read_start
+        self.read_end = max(self.read_end, read_end)
+
+    def timestamp_index(self, log_path: str = '') -> TimestampIndex:
+        """
+        Returns the timestamp index of a logfile, updated to its current size. Indexes are kept for
+        the lifetime of the parser and saved to the folder in the setting
+        "timestamp_index_folder_path" if it is not empty.
+
+        Parameters:
+        - :param log_path: path to the logfile; defaults to `self.log_path`
+        """
+        if log_path == '':
+            log_path = self.log_path
+        folder_path = self._settings['timestamp_index_folder_path']
+        index_key = os.path.abspath(log_path)
+        try:
+            index = self._timestamp_indexes[index_key]
+        except KeyError:
+            if folder_path != '':
+                index = TimestampIndex.load(folder_path, log_path)
             else:
-                new_combat_ids.append(id)
-        return new_combat_ids
+                index = TimestampIndex(log_path)
+            self._timestamp_indexes[index_key] = index
+        if index.update() and folder_path != '':
+            index.save(folder_path)
+        return index
+
+    def analyze_time_range(
+            self, start_time: datetime, end_time: datetime, log_path: str = '',
+            result_handler: Callable[[Combat], None] = _f,
+            overview: bool = False) -> list[int] | None:
+        """
+        Isolates and analyzes the combats overlapping the time range from `start_time` to
+        `end_time`, reading only this part of the logfile (see `timestamp_index`). Replaces the
+        combats in `self.combats`; older combats can be added with `analyze_log_file` afterwards.
+        Requires the lines of the logfile to be in chronological order. Returns list of combat ids
+        that were analyzed. Returns `None` if no valid log file is provided.
+
+        Parameters:
+        - :param start_time: start of the time range
+        - :param end_time: end of the time range
+        - :param log_path: log path to be analyzed; overwrites `self.log_path`
+        - :param result_handler: Called once for each analyzed combat as soon as the combats
+        analyzation is complete
+        - :param overview: only analyzes the overview of the combats, see
+        `analyze_log_file_overview`
+        """
+        if log_path != '':
+            self.log_path = log_path
+        elif self.log_path == '':
+            return
+        index = self.timestamp_index()
+        with open_logfile(self.log_path) as log_file:
+            range_end = find_combat_end(
+                log_file, index.find(log_file, end_time), end_time,
+                self._settings['seconds_between_combats'], index.size)
+        self.combats.clear()
+        self.line_columns = None
+        if result_handler is not _f:
+            self.combat_analyzed_callback = result_handler
+        if overview:
+            combat_handler = self.analyze_new_combat_overview
+        else:
+            combat_handler = self.analyze_new_combat
+
+        def add_combat(combat: Combat):
+            # the last combat before the time range is found before stopping
+            if combat.end_time >= start_time:
+                self.combats.append(None)
+                combat_handler(combat)
+
+        self.read_start, self.read_end = OSCR._analyze_log_file(
+            self.log_path, ALL_COMBATS, 0, range_end, self._settings, add_combat,
+            self._add_line_columns, start_time)
+        return list(range(len(self.combats)))
+
+    def refresh(
+            self, result_handler: Callable[[Combat], None] = _f,
+            overview: bool = False) -> list[int] | None:
+        """
+        Reads the bytes appended to the logfile since it was last read, for logfiles that are still
+        being written. The newest combat is completed with the lines continuing it and keeps its
+        id. Newly found combats are appended to `self.combats`. Returns ids of the new and updated
+        combats. Returns `None` if nothing has been read yet or the logfile is shorter than the
+        part read so far, for example because it was cleared.
+
+        The newest combat is analyzed keeping its analysis state (see `resume_analysis`), so that
+        later refreshes only read and analyze the new lines. Otherwise, for example after
+        `analyze_log_file` or when only analyzing overviews, the newest combat is read again
+        together with the new bytes and replaced. With setting "interval_index" enabled, the
+        interval index of the newest combat is rebuilt from all of its lines on every refresh, so
+        that part of the work still grows with the length of the combat.
+
+        Parameters:
+        - :param result_handler: Called once for each analyzed combat as soon as the combats
+        analyzation is complete
+        - :param overview: only analyzes the overview of the combats, see
+        `analyze_log_file_overview`
+        """
+        if self.log_path == '' or self.read_end < 0:
+            return
+        with open_logfile(self.log_path) as log_file:
+            file_size = log_file.seek(0, os.SEEK_END)
+            # the last line may still be being written
+            file_end = find_last_line_end(log_file, file_size)
+        if file_size < self.read_end:
+            return
+        if file_end <= self.read_end:
+            return list()
+        summaries = self.combats.summaries()
+        combat_ids = [
+            combat_id for combat_id, summary in enumerate(summaries) if summary is not None]
+        start_position = 0
+        if len(combat_ids) > 0:
+            newest_combat = self.combats[
+                max(combat_ids, key=lambda combat_id: summaries[combat_id][2])]
+            total_combats = ALL_COMBATS
+            stop_time = newest_combat.start_time
+            if not overview and can_resume_analysis(
+                    newest_combat, self._get_focus_players(), self._settings['interval_index']):
+                start_position = newest_combat.file_pos[1]
+                stop_time = None
+        else:
+            # without a combat to complete, new combats are isolated like in `analyze_log_file`
+            newest_combat = None
+            total_combats = len(self.combats) + self._settings['combats_to_parse']
+            stop_time = None
+        if result_handler is not _f:
+            self.combat_analyzed_callback = result_handler
+        combat_delta = timedelta(seconds=self._settings['seconds_between_combats'])
+        changed_ids = list()
+
+        def add_combat(combat: Combat):
+            # combats are isolated newest first, the combat continuing the newest combat last
+            if start_position > 0 and combat.file_pos[0] == start_position:
+                if combat.start_time - newest_combat.analysis_state.last_line_time <= combat_delta:
+                    self._continue_combat(newest_combat, combat, len(changed_ids) == 0)
+                    changed_ids.append(newest_combat.id)
+                    return
+                if len(combat.log_data) < self._settings['combat_min_lines']:
+                    return
+                self.combats.append(None)
+            elif newest_combat is not None and combat.file_pos[0] == newest_combat.file_pos[0]:
+                if combat.file_pos == newest_combat.file_pos:
+                    return
+                self.history.remove_combat(newest_combat)
+                combat.id = newest_combat.id
+            else:
+                self.combats.append(None)
+            changed_ids.append(combat.id)
+            if overview:
+                self.analyze_new_combat_overview(combat)
+            else:
+                self.analyze_new_combat(combat, resumable=len(changed_ids) == 1)
+
+        self._add_read_part(*OSCR._analyze_log_file(
+            self.log_path, total_combats, len(self.combats), file_end, self._settings,
+            add_combat, self._add_line_columns, stop_time, start_position))
+        if start_position > 0 and newest_combat.id not in changed_ids[:1]:
+            # only the newest combat can be continued by later lines
+            newest_combat.analysis_state = None
+            self.combats[newest_combat.id] = newest_combat
+        return changed_ids
+
+    def _continue_combat(self, combat: Combat, continuation: Combat, keep_state: bool):
+        """
+        (Internal Function) Adds the lines of `continuation`, which directly follow the lines of
+        `combat`, to `combat` and its analysis.
+
+        Parameters:
+        - :param combat: combat analyzed with `resumable=True`
+        - :param continuation: freshly isolated combat continuing `combat`
+        - :param keep_state: keeps the analysis state of the combat for further lines
+        """
+        self.history.remove_combat(combat)
+        if len(combat.log_data) > 0:
+            combat.log_data.extend(continuation.log_data)
+        combat.file_pos[1] = continuation.file_pos[1]
+        combat.meta['broken_lines'] = (
+            combat.meta['broken_lines'] + continuation.meta['broken_lines'])[:30]
+        combat.meta['filtered_lines'] = (
+            combat.meta.get('filtered_lines', 0) + continuation.meta['filtered_lines'])
+        # timings and counters describe the work done for this update
+        combat.meta['timings'] = continuation.meta['timings']
+        combat.meta['counters'] = continuation.meta['counters']
+        resume_analysis(combat, continuation.log_data, continuation.end_time)
+        if not keep_state:
+            combat.analysis_state = None
+        self.handle_analyzed_result(combat)
 
     def analyze_log_file_mp(
-            self, log_path: str = '', max_combats: int = -1, offset: int = -1,
-            result_handler: Callable[[Combat], None] = _f) -> list[int] | None:
+            self, log_path: str = '', max_combats: int = -1, end_position: int = -1,
+            result_handler: Callable[[Combat], None] = _f,
+            progress_handler: Callable[[Progress], None] | None = None,
+            cancel_token: CancellationToken | None = None) -> list[int] | None:
         """
         Analyzes log file in `self.log_file` and appends analyzed combats to `self.combats`.
         (Can cause duplicate combats to appear, use `self.reset_parser` if analyzing new log file.)
-        Blocks until given number of combats have been isolated. Returns list Returns of combat ids
-        that were isolated. Returns `None` if no valid log file is provided or the entire log file
-        has been consumed already.
+        Combats are isolated in a separate process and analyzed in a process pool. Blocks until
+        given number of combats have been isolated and analyzed. Returns list of combat ids that
+        were analyzed. Returns `None` if no valid log file is provided or the entire log file has
+        been consumed already.
+
+        The setting "analysis_backend" selects "processes" or "threads"; "auto" (default) uses
+        threads on free-threaded builds of Python with the GIL disabled, as they share the logfile
+        data and results without pickling them. Settings are read once when the analysis starts.
+        The result handler and the combat analyzed callback are called from a thread of the pool
+        with both backends.
+
+        The isolating process waits while the combats that have been isolated, but whose analysis
+        has not been delivered yet, reach the settings "max_combats_in_flight" or
+        "max_bytes_in_flight" (logfile bytes; 0 does not limit bytes), so that memory use does not
+        grow with the number of combats. Queue depths and stage utilization of the run are stored
+        in `self.pipeline_metrics`.
 
         Parameters:
         - :param log_path: log path to be analyzed; overwrites `self.log_path`
         - :param max_combats: maximum number of combats to analyze
-        - :param offset: offset in bytes from the end of the logfile
+        - :param end_position: position of the byte after the last byte to read, counted from the
+        start of the logfile; defaults to `self.read_start`
         - :param result_handler: Called once for each analyzed combat as soon as the combats
         analyzation is complete
+        - :param progress_handler: called with the progress at most every 0.1 seconds and once at
+        the end; processed bytes are the bytes of the combats analyzed so far
+        - :param cancel_token: terminates the isolating process and the process pool when
+        cancelled (the isolating thread stops at its next chunk); analyzed combats are kept and
+        returned up to the first combat whose analysis was not complete, later combats are
+        removed again
         """
         if log_path != '':
             self.log_path = log_path
         elif self.log_path == '':
             return
-        if self.bytes_consumed < 0:
+        if self.read_start == 0:
             self.task_finished_callback(list())
             return
         next_combat_id = len(self.combats)
@@ -250,72 +728,359 @@ class OSCR:
             max_combats = self._settings['combats_to_parse']
         total_combats = len(self.combats) + max_combats
         self.combats.extend([None] * max_combats)
-        if offset < 0:
-            offset = self.bytes_consumed
+        if end_position < 0:
+            end_position = self.read_start
         if result_handler is not _f:
             self.combat_analyzed_callback = result_handler
-        self._pool = Pool(4)
-        self._queue = Queue()
-        args = (self._queue, self.log_path, total_combats, next_combat_id, offset, self._settings)
-        logfile_process = Process(target=OSCR._analyze_file_helper, args=args)
-        logfile_process.start()
-        new_combat_ids = list()
-        while True:
+        progress = None
+        if progress_handler is not None:
+            progress = ProgressReporter(progress_handler, max_combats=max_combats)
+            progress.total_bytes = (
+                end_position if end_position >= 0 else os.path.getsize(self.log_path))
+        # settings may be replaced by another thread while this method runs
+        settings = self._settings
+        focus_players = self._get_focus_players()
+        threads = self._get_analysis_backend() == 'threads'
+        limit = InFlightLimit(
+            settings['max_combats_in_flight'], settings['max_bytes_in_flight'], not threads)
+        metrics = PipelineMetrics(ANALYSIS_WORKERS)
+        if threads:
+            self._pool = ThreadPool(ANALYSIS_WORKERS)
+            self._queue = ThreadQueue()
+        else:
+            self._pool = Pool(ANALYSIS_WORKERS)
+            self._queue = Queue()
+        args = (
+            self._queue, self.log_path, total_combats, next_combat_id, end_position,
+            settings, limit)
+        if threads:
+            # a thread cannot be terminated, so it checks the token between chunks
+            isolating_worker = Thread(
+                target=OSCR._analyze_file_helper, args=args + (cancel_token,), daemon=True)
+        else:
+            isolating_worker = Process(
+                target=OSCR._analyze_file_helper, args=args, daemon=True)
+        isolating_worker.start()
+        # isolated combats wait here for a free worker; the pool gets at most one combat per
+        # worker, as terminating the pool blocks while it is passing further combats to workers
+        waiting_combats: deque[Combat] = deque()
+        # file positions of every isolated combat
+        file_positions: dict[int, list[int]] = dict()
+        # ids of the combats whose analysis has been delivered or failed
+        completed: set[int] = set()
+        analysis_done = Event()
+
+        def finish_analysis(combat_id: int, size: int):
+            metrics.combats += 1
+            metrics.bytes += size
+            completed.add(combat_id)
+            limit.release(size)
+            analysis_done.set()
+
+        def submit(combat: Combat):
+            size = combat.file_pos[1] - combat.file_pos[0]
+            submit_time = perf_counter()
+            if combat.meta['timings'] is not None:
+                self._submit_times[combat.id] = (
+                    submit_time, sum(combat.meta['timings'].values()))
+
+            def handle_result(result_combat: Combat):
+                delivery_start = perf_counter()
+                metrics.analysis_time += delivery_start - submit_time
+                self.handle_analyzed_result(result_combat)
+                metrics.delivery_time += perf_counter() - delivery_start
+                finish_analysis(result_combat.id, size)
+
+            def handle_error(_):
+                metrics.analysis_time += perf_counter() - submit_time
+                finish_analysis(combat.id, size)
+            self._pool.apply_async(
+                analyze_combat, args=(combat, focus_players, settings['interval_index']),
+                callback=handle_result, error_callback=handle_error)
+        read_part = None
+        isolating = True
+        submitted = 0
+        idle_time = 0.0
+        while cancel_token is None or not cancel_token.cancelled:
+            analysis_done.clear()
+            running = submitted - len(completed)
+            while len(waiting_combats) > 0 and running < ANALYSIS_WORKERS:
+                submit(waiting_combats.popleft())
+                submitted += 1
+                running += 1
+            metrics.sample(limit.combats, limit.bytes, limit.combats - running)
+            if progress is not None:
+                progress.update(metrics.bytes, metrics.combats)
+            if running >= ANALYSIS_WORKERS or (not isolating and running > 0):
+                analysis_done.wait(PROGRESS_INTERVAL)
+                continue
+            if not isolating:
+                break
+            if self.instrumentation is not None:
+                wait_start = perf_counter()
             try:
-                data = self._queue.get(timeout=15)
+                data = self._queue.get(timeout=PROGRESS_INTERVAL)
             except EmptyException:
-                break
+                # the isolating process may be waiting for room while combats are analyzed
+                idle_time = idle_time + PROGRESS_INTERVAL if running == 0 else 0.0
+                if idle_time >= ISOLATION_TIMEOUT:
+                    isolating = False
+                    metrics.end_isolation()
+                continue
+            finally:
+                if self.instrumentation is not None:
+                    self.instrumentation.add_time('isolation_wait', perf_counter() - wait_start)
+            idle_time = 0.0
             if isinstance(data, Combat):
-                new_combat_ids.append(data.id)
-                self._pool.apply_async(
-                    analyze_combat, args=(data,), callback=self.handle_analyzed_result)
+                file_positions[data.id] = data.file_pos
+                waiting_combats.append(data)
+            elif isinstance(data, LineColumns):
+                self._add_line_columns(data)
             else:
-                self.bytes_consumed = data
-                for _ in range(max_combats - len(new_combat_ids)):
-                    self.combats.pop()
-                break
-        self._pool.close()
-        new_combat_ids.sort()
+                read_part = data
+                isolating = False
+                metrics.end_isolation()
+        if cancel_token is not None and cancel_token.cancelled:
+            # the isolating process may hold the lock of the limit, which is released by results
+            self._pool.terminate()
+            if threads:
+                limit.close()
+            else:
+                isolating_worker.terminate()
+            last_combat_id = next_combat_id
+            while last_combat_id in completed:
+                last_combat_id += 1
+            for combat in self.combats[last_combat_id:]:
+                if combat is not None:
+                    self.history.remove_combat(combat)
+            del self.combats[last_combat_id:]
+            read_part = None
+            if last_combat_id > next_combat_id:
+                read_part = (
+                    file_positions[last_combat_id - 1][0], file_positions[next_combat_id][1])
+        else:
+            self._pool.close()
+            self._pool.join()
+        metrics.finish(limit.wait_time)
+        self.pipeline_metrics = metrics
+        if self.instrumentation is not None:
+            instrumentation = self.instrumentation
+            instrumentation.add_time('backpressure_wait', metrics.backpressure_time)
+            instrumentation.add_counter('peak_in_flight', metrics.peak_combats_in_flight)
+            instrumentation.add_counter('peak_bytes_in_flight', metrics.peak_bytes_in_flight)
+        if read_part is not None:
+            self._add_read_part(*read_part)
+        # combats are isolated in order, so unused slots are at the end
+        while len(self.combats) > next_combat_id and self.combats[-1] is None:
+            self.combats.pop()
+        new_combat_ids = list(range(next_combat_id, len(self.combats)))
+        if progress is not None:
+            processed_bytes = 0
+            if read_part is not None:
+                processed_bytes = read_part[1] - read_part[0]
+            progress.finish(processed_bytes, len(new_combat_ids))
         self.task_finished_callback(new_combat_ids)
         return new_combat_ids
 
     @staticmethod
     def _analyze_file_helper(
-            queue: Queue, log_path: str, total_combats: int, first_combat_id: int, offset: int,
-            settings: dict[str]):
+            queue: Queue, log_path: str, total_combats: int, first_combat_id: int,
+            end_position: int, settings: dict[str], limit: InFlightLimit,
+            cancel_token: CancellationToken | None = None):
         """
         Helper method to put return value of function into queue to be sent to main process. Wraps
-        `_analyze_log_file`.
+        `_analyze_log_file`. Waits for room in `limit` before putting a combat into the queue.
+        `cancel_token` stops reading when the helper runs in a thread.
         """
+        def put_combat(combat: Combat):
+            limit.acquire(combat.file_pos[1] - combat.file_pos[0])
+            queue.put(combat)
         queue.put(OSCR._analyze_log_file(
-            log_path, total_combats, first_combat_id, offset, settings,
-            lambda combat: queue.put(combat)))
+            log_path, total_combats, first_combat_id, end_position, settings, put_combat,
+            queue.put, cancel_token=cancel_token))
 
-    def analyze_new_combat(self, combat: Combat):
+    def analyze_new_combat(self, combat: Combat, resumable: bool = False):
         """
         Analyzes isolated combat, puts it into `self.combats` and calls the combat analyzed callback
+
+        Parameters:
+        - :param combat: isolated combat
+        - :param resumable: keeps the analysis state, see `analyze_combat`
+        """
+        analyze_combat(
+            combat, self._get_focus_players(), self._settings['interval_index'], resumable)
+        self.handle_analyzed_result(combat)
+
+    def analyze_new_combat_overview(self, combat: Combat):
         """
-        analyze_combat(combat)
-        self.combats[combat.id] = combat
-        self.combat_analyzed_callback(combat)
+        Analyzes overview of isolated combat, puts it into `self.combats` and calls the combat
+        analyzed callback
+        """
+        analyze_overview(combat, self._get_focus_players())
+        self.handle_analyzed_result(combat)
 
     def handle_analyzed_result(self, result_combat: Combat):
         """
-        puts analyzed combat into `self.combats` and calls the combat analyzed callback
+        puts analyzed combat into `self.combats` and `self.history` and calls the combat analyzed
+        callback
         """
+        timings = result_combat.meta['timings']
+        if timings is not None and result_combat.id in self._submit_times:
+            # round trip to the worker minus the time spent analyzing there; includes the time the
+            # combat waited in the pool for a free worker
+            submit_time, isolation_time = self._submit_times.pop(result_combat.id)
+            analysis_time = sum(timings.values()) - isolation_time
+            timings['queue_and_ipc'] = perf_counter() - submit_time - analysis_time
         self.combats[result_combat.id] = result_combat
+        self.history.add_combat(result_combat)
+        if self.instrumentation is not None:
+            self.instrumentation.add_combat(result_combat.meta)
         self.combat_analyzed_callback(result_combat)
 
-    def isolate_combats(self, path: str, max_combats: int = -1) -> list[tuple]:
+    def reload_log_data(self, combat: Combat) -> bool:
+        """
+        Reads the raw lines of a combat whose lines have been dropped after analysis back from its
+        logfile into `combat.log_data`. Returns False if the lines could not be read.
+
+        Parameters:
+        - :param combat: analyzed combat
+        """
+        if len(combat.log_data) > 0:
+            return True
+        if self.line_columns is not None and self.line_columns.log_path == combat.log_file:
+            line_range = self.line_columns.find_lines(*combat.file_pos)
+            if line_range is not None:
+                combat.log_data = self.line_columns.lines(*line_range)
+                return True
+        reloaded_combats: list[Combat] = list()
+        try:
+            OSCR._analyze_log_file(
+                combat.log_file, combat.id + 1, combat.id, combat.file_pos[1],
+                dict(self._settings, column_cache=False), reloaded_combats.append)
+        except OSError:
+            return False
+        if len(reloaded_combats) == 0 or reloaded_combats[0].file_pos != combat.file_pos:
+            return False
+        combat.log_data = reloaded_combats[0].log_data
+        return True
+
+    def _add_line_columns(self, line_columns: LineColumns):
+        """
+        (Internal Function) Adds columns of freshly read lines to `self.line_columns`. The cache is
+        extended if the lines directly precede the cached lines or start at one of the cached
+        lines, and replaced otherwise.
+        """
+        cache = self.line_columns
+        if cache is None or cache.log_path != line_columns.log_path:
+            self.line_columns = line_columns
+        elif cache.region_start == line_columns.region_end:
+            cache.prepend(line_columns)
+        elif not cache.append(line_columns):
+            self.line_columns = line_columns
+
+    def update_settings(self, settings: dict) -> list[int] | None:
+        """
+        Updates settings. When "seconds_between_combats", "combat_min_lines" or "graph_resolution"
+        change, the combats in `self.combats` are re-split and re-binned from `self.line_columns`
+        instead of reading the logfile again: combats covering the same lines as before keep their
+        analysis and only get new overview graphs, other combats are recreated from the cached
+        lines and analyzed. A combat continuing before the cached lines is left out and isolated
+        by the next call of `analyze_log_file`. Returns ids of all combats after the update.
+        Returns `None` if the combats have to be read again (using `reset_parser`), because the
+        lines were not cached (see setting "column_cache") or settings affecting the parsed lines
+        changed.
+
+        Parameters:
+        - :param settings: settings to change
+        """
+        changed_settings = {
+            key for key, value in settings.items() if self._settings.get(key) != value}
+        # replaced instead of updated, so that running analyses keep using consistent settings
+        self._settings = {**self._settings, **settings}
+        if self._settings['column_cache'] is False:
+            self.line_columns = None
+        if changed_settings.intersection(LINE_FILTER_SETTINGS):
+            return None
+        if not changed_settings & {
+                'seconds_between_combats', 'combat_min_lines', 'graph_resolution'}:
+            return list(range(len(self.combats)))
+        line_columns = self.line_columns
+        if line_columns is None or line_columns.log_path != self.log_path:
+            return None
+        segments = line_columns.split(self._settings['seconds_between_combats'])
+        if line_columns.region_start > 0 and (
+                line_columns.boundary_gap <= self._settings['seconds_between_combats'] * 1_000_000):
+            # the oldest combat continues before the cached lines and is read again next time
+            if len(segments) <= 1:
+                self.read_start = line_columns.region_end
+                self.line_columns = None
+                segments = list()
+            else:
+                line_columns.truncate(segments[0][1])
+                segments = line_columns.split(self._settings['seconds_between_combats'])
+        if self.line_columns is not None:
+            self.read_start = line_columns.region_start
+        graph_resolution = self._settings['graph_resolution']
+        # combats are matched on their summaries and read from disk only if they are reused
+        old_combat_ids = {
+            summary[3]: combat_id for combat_id, summary in enumerate(self.combats.summaries())
+            if summary is not None}
+        if len(old_combat_ids) > 0 and (
+                self.combats[min(old_combat_ids.values())].damage_out is None):
+            combat_handler = self.analyze_new_combat_overview
+        else:
+            combat_handler = self.analyze_new_combat
+        segments = [
+            (first_line, end_line) for first_line, end_line in reversed(segments)
+            if end_line - first_line >= self._settings['combat_min_lines']]
+        reused_ids = [
+            old_combat_ids.get(line_columns.byte_range(first_line, end_line))
+            for first_line, end_line in segments]
+        for file_pos, old_combat_id in old_combat_ids.items():
+            if old_combat_id not in reused_ids:
+                self.history.remove_combat_at(self.log_path, file_pos)
+        self.combats.rearrange(reused_ids)
+        for combat_id, (first_line, end_line) in enumerate(segments):
+            combat = self.combats[combat_id]
+            if combat is not None and (
+                    combat.graph_resolution == graph_resolution
+                    or line_columns.rebin_overview_graphs(combat, graph_resolution)):
+                combat.id = combat_id
+                # stored again, because the store treats stored combats as immutable
+                self.combats[combat_id] = combat
+            else:
+                if combat is not None:
+                    self.history.remove_combat(combat)
+                combat_handler(line_columns.create_combat(
+                    first_line, end_line, graph_resolution, combat_id))
+        return list(range(len(self.combats)))
+
+    def isolate_combats(
+            self, path: str, max_combats: int = -1,
+            progress_handler: Callable[[Progress], None] | None = None,
+            cancel_token: CancellationToken | None = None) -> list[tuple]:
         """
         Returns list of combats in logfile at given `path`.
 
         Parameters:
         - :param path: path to the logfile
         - :param max_combats: maximum number of combats to isolate
+        - :param progress_handler: called with the progress of reading the logfile at most every
+        0.1 seconds and once at the end
+        - :param cancel_token: stops reading when cancelled; the combats isolated until then are
+        returned
 
         :return: tuple(number of combat in file, map, date, time, difficulty, byte_start, byte_end)
         """
+        archive_index = read_archive_index(path)
+        if (archive_index is not None
+                and archive_index['combat_settings'] == self._get_combat_settings()):
+            combats = [tuple(combat) for combat in archive_index['combats']]
+            # the combats are taken from the index, no lines are read
+            self.filtered_lines = 0
+            if max_combats > 0:
+                return combats[:max_combats]
+            return combats
         combat_delta = timedelta(seconds=self._settings['seconds_between_combats'])
         combat_id = 0
         current_map_and_difficulty = ['Combat', '']
@@ -324,7 +1089,23 @@ class OSCR:
         current_end_bytes = -1
         current_line_num = 0
         broken_line_temp = ''
-        with ReadFileBackwards(path) as backwards_file:
+        line_filter = LineFilter.from_settings(self._settings)
+        progress = None
+        if progress_handler is not None:
+            progress = ProgressReporter(progress_handler, max_combats=max(max_combats, 0))
+
+        def check_chunk(bytes_read: int) -> bool:
+            if cancel_token is not None and cancel_token.cancelled:
+                return False
+            if progress is not None:
+                progress.update(bytes_read, len(combats))
+            return True
+        chunk_callback = None
+        if progress is not None or cancel_token is not None:
+            chunk_callback = check_chunk
+        with ReadFileBackwards(path, chunk_callback=chunk_callback) as backwards_file:
+            if progress is not None:
+                progress.total_bytes = backwards_file.filesize
             if len(backwards_file.top) <= 2:
                 llt = datetime.now() + timedelta(days=1)
             else:
@@ -337,6 +1118,8 @@ class OSCR:
                     time_data, attack_data = line.split('::')
                     splitted_line = attack_data.split(',')
                     assert len(splitted_line) == 12
+                    if line_filter.drops(splitted_line):
+                        continue
                     log_time = to_datetime(time_data)
                 except BaseException:
                     if broken_line_temp == '':
@@ -349,7 +1132,7 @@ class OSCR:
                     log_time = to_datetime(line_data[0])
                     attack_parts = line_data[1].split(',')
                     if len(attack_parts) > 12:
-                        splitted_line = attack_parts[:6] + ''.join(attack_parts[6:-5])
+                        splitted_line = attack_parts[:6] + [''.join(attack_parts[6:-5])]
                         splitted_line += attack_parts[-5:]
                     elif len(attack_parts) < 12:
                         broken_line_temp = ''
@@ -358,6 +1141,8 @@ class OSCR:
                         splitted_line = attack_parts
                     splitted_line[6] = splitted_line[6].replace(os.linesep, '').replace('"', '')
                     broken_line_temp = ''
+                    if line_filter.drops(splitted_line):
+                        continue
                 if llt - log_time > combat_delta:
                     current_file_position = backwards_file.filesize - (
                             backwards_file.get_bytes_read(True))
@@ -372,6 +1157,10 @@ class OSCR:
                             current_end_bytes))
                         combat_id += 1
                     if combat_id >= max_combats > 0:
+                        self.filtered_lines = line_filter.dropped_lines
+                        if progress is not None:
+                            progress.finish(
+                                backwards_file.filesize - current_file_position, len(combats))
                         return combats
                     current_map_and_difficulty = ['Combat', '']
                     current_end_bytes = current_file_position
@@ -383,6 +1172,9 @@ class OSCR:
                         current_map_and_difficulty[1] = m['difficulty']
                 current_line_num += 1
                 llt = log_time
+        if backwards_file.stopped:
+            # the combat being isolated is incomplete
+            current_line_num = 0
         if current_line_num >= self._settings['combat_min_lines']:
             combats.append((
                 combat_id,
@@ -392,6 +1184,12 @@ class OSCR:
                 current_map_and_difficulty[1],
                 backwards_file.filesize - backwards_file.get_bytes_read(),
                 current_end_bytes))
+        self.filtered_lines = line_filter.dropped_lines
+        if progress is not None:
+            processed_bytes = backwards_file.filesize
+            if backwards_file.stopped:
+                processed_bytes -= current_end_bytes
+            progress.finish(processed_bytes, len(combats))
         return combats
 
     def export_combat(self, combat_num: int, path: str) -> bool:
@@ -407,3 +1205,60 @@ class OSCR:
         except IndexError:
             return False
         return extract_bytes(combat.log_file, path, combat.file_pos[0], combat.file_pos[1])
+
+    def _get_analysis_backend(self) -> str:
+        """
+        (Internal Function) Returns the backend of `analyze_log_file_mp` from the setting
+        "analysis_backend": "processes", "threads" or "auto", which uses threads if the GIL is
+        disabled and processes otherwise.
+        """
+        backend = self._settings['analysis_backend']
+        if backend == 'auto':
+            gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)
+            return 'processes' if gil_enabled() else 'threads'
+        if backend not in ('processes', 'threads'):
+            raise ValueError(f'Unknown analysis backend: {backend}')
+        return backend
+
+    def _get_focus_players(self) -> list[str] | None:
+        """
+        (Internal Function) Returns handles of the players the analysis is restricted to or `None`
+        to analyze all actors.
+        """
+        if len(self._settings['focus_players']) > 0:
+            return list(self._settings['focus_players'])
+        return None
+
+    def _get_combat_settings(self) -> dict:
+        """
+        (Internal Function) Returns settings that affect where combats are split.
+        """
+        return {
+            'seconds_between_combats': self._settings['seconds_between_combats'],
+            'combat_min_lines': self._settings['combat_min_lines'],
+            'excluded_event_ids': list(self._settings['excluded_event_ids']),
+            'excluded_abilities': list(self._settings['excluded_abilities']),
+            'excluded_entities': list(self._settings['excluded_entities']),
+            'excluded_types': list(self._settings['excluded_types']),
+        }
+
+    def archive_log_file(
+            self, source_path: str, target_path: str, codec: str = 'zlib',
+            block_size: int = ARCHIVE_BLOCK_SIZE) -> bool:
+        """
+        Recompresses logfile into seekable archive of independently compressed blocks. The
+        archive contains an index with the combats in the logfile, which `isolate_combats` uses
+        instead of scanning the file. Returns `True` if successful, returns `False` if
+        unsuccessful.
+
+        Parameters:
+        - :param source_path: path to the logfile to archive
+        - :param target_path: path to write the archive to, will overwrite existing files
+        - :param codec: compression used for the blocks, "zlib" or "lzma"
+        - :param block_size: number of uncompressed bytes per block; smaller blocks speed up
+        reading single combats at the cost of a lower compression ratio
+        """
+        combats = self.isolate_combats(source_path)
+        return archive_logfile(
+            source_path, target_path, combats, self._get_combat_settings(), codec, block_size,
+            self._settings['templog_folder_path'])
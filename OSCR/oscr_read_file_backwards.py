@@ -1,6 +1,9 @@
-import gzip
+from collections.abc import Callable
 import io
 import os
+from time import perf_counter
+
+from .iofunc import open_logfile
 
 _81920 = io.DEFAULT_BUFFER_SIZE * 10
 
@@ -10,9 +13,13 @@ class ReadFileBackwards():
 
     __slots__ = (
             '_buffer_size', '_file', '_path', '_offset', 'filesize', '_position', '_remainder',
-            '_lines', '_iter_counter')
+            '_lines', '_iter_counter', 'read_time', '_line_ends', '_end_position',
+            '_start_position', '_chunk_callback', 'stopped')
 
-    def __init__(self, path: str, offset: int = 0, buffer_size: int = _81920):
+    def __init__(
+            self, path: str, offset: int = 0, buffer_size: int = _81920, timed: bool = False,
+            positions: bool = False, end_position: int = -1, start_position: int = 0,
+            chunk_callback: Callable[[int], bool] | None = None):
         """
         Reads utf-8 encoded text file.
 
@@ -20,6 +27,13 @@ class ReadFileBackwards():
         - :param path: path to the text file
         - :param offset: number of bytes to ignore from the end of the file
         - :param buffer_size: number of bytes to buffer
+        - :param timed: measures the time spent reading and decoding chunks in `self.read_time`
+        - :param positions: keeps track of the position of every line, see `line_end`
+        - :param end_position: position of the byte after the last byte to read, counted from the
+        start of the file; overrides `offset` unless negative
+        - :param start_position: position of the first byte to read; must be the start of a line
+        - :param chunk_callback: called with the number of bytes read before reading every chunk;
+        reading stops early, as if the start of the file was reached, if it returns False
         """
         self._buffer_size = buffer_size
         self._file = None
@@ -30,6 +44,14 @@ class ReadFileBackwards():
         self._remainder = bytes()
         self._lines: list[str] | None = None
         self._iter_counter = None
+        self.read_time: float | None = 0.0 if timed else None
+        # position of the byte after every line in `self._lines`; None if positions are not tracked
+        self._line_ends: list[int] | None = list() if positions else None
+        self._end_position = end_position
+        self._start_position = start_position
+        self._chunk_callback = chunk_callback
+        # True if reading was stopped by `chunk_callback`
+        self.stopped: bool = False
 
     @property
     def top(self):
@@ -37,13 +59,29 @@ class ReadFileBackwards():
         try:
             return self._lines[-1 - self._iter_counter]
         except IndexError:
+            line_ends = self._line_ends
             next_chunk = self._get_chunk()
             if len(next_chunk) == 0:
                 return None
             else:
                 self._lines = next_chunk + self._lines
+                if line_ends is not None:
+                    self._line_ends += line_ends
                 return self._lines[-1 - self._iter_counter]
 
+    @property
+    def line_end(self) -> int:
+        """
+        Position of the byte following the line returned last, counted from the start of the
+        file. Requires the file to be opened with `positions=True`.
+        """
+        return self._line_ends[-self._iter_counter]
+
+    @property
+    def offset(self) -> int:
+        """number of bytes ignored at the end of the file"""
+        return self._offset
+
     @property
     def total_bytes_read(self):
         """
@@ -72,12 +110,11 @@ class ReadFileBackwards():
         return self.filesize - self._position - not_consumed_bytes - self._offset
 
     def __enter__(self):
-        self._file = open(self._path, 'rb')
-        if self._file.read(2) == b'\x1f\x8b':
-            self._file.close()
-            self._file = gzip.open(self._path, 'rb')
+        self._file = open_logfile(self._path)
         self._file.seek(0, os.SEEK_END)
         self.filesize = self._file.tell()
+        if self._end_position >= 0:
+            self._offset = max(self.filesize - self._end_position, 0)
         self._position = self._file.seek(self.filesize - self._offset)
         self._lines = self._get_chunk()
         self._iter_counter = 0
@@ -85,7 +122,7 @@ class ReadFileBackwards():
 
     def __exit__(self, ex_type, ex_value, ex_traceback):
         self._file.close()
-        if self._position > 0:
+        if self._position > self._start_position:
             self._position += self._calculate_not_consumed_bytes()
 
     def __iter__(self):
@@ -106,15 +143,35 @@ class ReadFileBackwards():
                 return self._lines[-1]
 
     def _get_chunk(self):
+        if (self._chunk_callback is not None and not self.stopped
+                and self._position > self._start_position):
+            if not self._chunk_callback(self.filesize - self._offset - self._position):
+                self.stopped = True
+        if self.stopped:
+            return list()
+        if self.read_time is None:
+            return self._read_chunk()
+        start = perf_counter()
+        new_lines = self._read_chunk()
+        self.read_time += perf_counter() - start
+        return new_lines
+
+    def _read_chunk(self):
         new_position = self._position - self._buffer_size
-        if new_position <= 0:
-            self._file.seek(0, 0)
-            # self._position contains the number of bytes *before* it, so reading that many bytes
-            # returns everything from the beginning up to (not including) the byte at self.position
-            new_text = (self._file.read(self._position) + self._remainder).decode('utf-8').strip()
+        if new_position <= self._start_position:
+            self._file.seek(self._start_position, 0)
+            # reads everything from the start up to (not including) the byte at self.position
+            raw_text = (
+                self._file.read(max(self._position - self._start_position, 0))
+                + self._remainder).decode('utf-8')
+            new_text = raw_text.strip()
             new_lines = new_text.splitlines(keepends=True)
+            if self._line_ends is not None:
+                self._set_line_ends(
+                    new_lines, self._start_position
+                    + len(raw_text[:len(raw_text) - len(raw_text.lstrip())].encode()))
             self._remainder = bytes()
-            self._position = 0
+            self._position = self._start_position
         else:
             self._position = self._file.seek(new_position, 0)
             new_bytes = self._file.read(self._buffer_size) + self._remainder
@@ -125,8 +182,21 @@ class ReadFileBackwards():
                 self._remainder = bytes()
                 line_bytes = new_bytes
             new_lines = line_bytes.decode('utf-8').splitlines(keepends=True)
+            if self._line_ends is not None:
+                self._set_line_ends(new_lines, self._position + len(self._remainder))
         return new_lines
 
+    def _set_line_ends(self, lines: list[str], chunk_start: int):
+        """
+        Stores the end positions of the lines of a new chunk starting at byte `chunk_start`.
+        """
+        line_ends = list()
+        position = chunk_start
+        for line in lines:
+            position += len(line.encode('utf-8'))
+            line_ends.append(position)
+        self._line_ends = line_ends
+
     def _calculate_not_consumed_bytes(self, ignore_lines: int = 0):
         if self._iter_counter == -1:
             return 0
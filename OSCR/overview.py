@@ -0,0 +1,229 @@
+from collections.abc import Iterable
+from datetime import datetime
+from time import perf_counter
+
+from numpy import float64, zeros as numpy__zeros
+
+from .combat import Combat
+from .datamodels import DamageTableRow, HealTableRow, OverviewTableRow
+from .instrumentation import record_stage
+from .parser import calculate_damage_row_stats, calculate_heal_row_stats, get_flags
+from .utilities import get_handle_from_id, get_player_handle, to_microseconds
+
+
+def analyze_overview(combat: Combat, focus_players: Iterable[str] | None = None) -> Combat:
+    """
+    Analyzes the given combat without building analysis trees and returns it. Fills map,
+    difficulty, durations, overview table and overview graphs with the same values a full analysis
+    with `analyze_combat` produces. The analysis trees of the combat stay empty.
+
+    Parameters:
+    - :param combat: combat to analyze
+    - :param focus_players: handles of the players to include in the overview; all players are
+    included if not given, shares are always calculated from all players
+    """
+    timings = combat.meta.get('timings')
+    if timings is not None:
+        stage_start = perf_counter()
+    damage_out: dict[str, DamageTableRow] = dict()
+    damage_in: dict[str, DamageTableRow] = dict()
+    heals_out: dict[str, HealTableRow] = dict()
+    npc_deaths: dict[str, int] = dict()
+    npc_damage: dict[str, float] = dict()
+    player_combat_durations: dict[str, list[datetime]] = dict()
+    graph_point_delta = combat.graph_resolution * 1_000_000
+    combat_duration_delta = combat.end_time - combat.start_time
+    total_graph_points = int(combat_duration_delta.total_seconds() // combat.graph_resolution + 2)
+    combat_start: datetime = combat.log_data[0].timestamp
+    for line in combat.log_data:
+        timestamp: datetime = line.timestamp
+        owner_id = line.owner_id
+        target_id = line.target_id
+        player_attacks = owner_id.startswith('P')
+        is_shield_line = line.type == 'Shield'
+        crit_flag, miss_flag, _, kill_flag, _, _ = get_flags(line.flags)
+        is_heal = (
+                (line.type == 'HitPoints' and line.magnitude < 0)
+                or (is_shield_line and line.magnitude < 0 and line.magnitude2 >= 0))
+        magnitude = abs(line.magnitude)
+
+        if is_heal:
+            if player_attacks:
+                try:
+                    heal_row = heals_out[owner_id]
+                except KeyError:
+                    heal_row = heals_out[owner_id] = HealTableRow(
+                        line.owner_name, get_handle_from_id(owner_id), owner_id)
+                heal_row.total_heal += magnitude
+                heal_row.heal_ticks += 1
+                if not is_shield_line:
+                    heal_row.hull_heal_ticks += 1
+                if crit_flag:
+                    heal_row.critical_heals += 1
+            continue
+
+        # Heals, damage taken and self-damage don't affect combat time
+        if player_attacks and (line.target_name or '*') != '*' and owner_id != target_id:
+            try:
+                player_combat_durations[owner_id][1] = timestamp
+            except KeyError:
+                player_combat_durations[owner_id] = [timestamp, timestamp]
+
+        if player_attacks:
+            try:
+                out_row = damage_out[owner_id]
+            except KeyError:
+                out_row = damage_out[owner_id] = DamageTableRow(
+                    line.owner_name, get_handle_from_id(owner_id), owner_id)
+                combat.overview_graphs[get_player_handle(owner_id)] = numpy__zeros(
+                    total_graph_points, float64)
+            out_row.total_damage += magnitude
+            out_row.total_attacks += 1
+            if not is_shield_line:
+                out_row.hull_attacks += 1
+                out_row.total_base_damage += abs(line.magnitude2)
+            if magnitude > out_row.max_one_hit:
+                out_row.max_one_hit = magnitude
+            if miss_flag:
+                out_row.misses += 1
+            if crit_flag:
+                out_row.crit_num += 1
+            time_idx = int(to_microseconds(timestamp - combat_start) // graph_point_delta)
+            combat.overview_graphs[get_player_handle(owner_id)][time_idx] += magnitude
+
+        if target_id.startswith('P'):
+            try:
+                in_row = damage_in[target_id]
+            except KeyError:
+                in_row = damage_in[target_id] = DamageTableRow(
+                    line.target_name, get_handle_from_id(target_id), target_id)
+            in_row.total_damage += magnitude
+            in_row.total_attacks += 1
+            if is_shield_line:
+                in_row.total_shield_damage += magnitude
+            else:
+                in_row.total_hull_damage += magnitude
+            if kill_flag:
+                in_row.kills += 1
+        else:
+            npc_damage[target_id] = npc_damage.get(target_id, 0) + magnitude
+            npc_deaths[target_id] = npc_deaths.get(target_id, 0) + kill_flag
+
+        if kill_flag and (
+                line.target_name == 'Borg Queen Octahedron'
+                or (target_id == '*' and (
+                    line.owner_name == 'Borg Queen Octahedron'
+                    or line.source_name == 'Borg Queen Octahedron'))):
+            if combat.map_is_hive_space(npc_damage):
+                combat_duration_delta = timestamp - combat_start
+                combat.end_time = timestamp
+                break  # ignore all lines after the Queen kill line in the Hive Space queue
+
+    if timings is not None:
+        stage_start = record_stage(timings, 'analyze', stage_start)
+        combat.meta['counters']['analyzed_lines'] = len(combat.log_data)
+    combat.meta['log_duration'] = combat_duration_delta.total_seconds()
+    overview_graph_intervals: dict[str, tuple[int, int]] = dict()
+    combat_times: dict[str, float] = dict()
+    for player_id, (start_time, end_time) in player_combat_durations.items():
+        start = int((start_time - combat.start_time).total_seconds() // combat.graph_resolution)
+        end = int((end_time - combat.start_time).total_seconds() // combat.graph_resolution + 1)
+        overview_graph_intervals[get_player_handle(player_id)] = (start, end)
+        combat_times[player_id] = round((end_time - start_time).total_seconds(), 1)
+    if len(player_combat_durations) > 0:
+        combat.meta['player_duration'] = (
+                max(end for _, end in player_combat_durations.values())
+                - min(start for start, _ in player_combat_durations.values())).total_seconds()
+    else:
+        combat.meta['player_duration'] = 0
+
+    combat.detect_map(
+        (npc_id, npc_deaths[npc_id], damage) for npc_id, damage in npc_damage.items())
+    if timings is not None:
+        stage_start = record_stage(timings, 'detect_map', stage_start)
+    create_overview_rows(
+        combat, damage_out, damage_in, heals_out, combat_times, overview_graph_intervals,
+        focus_players)
+    if timings is not None:
+        record_stage(timings, 'create_overview', stage_start)
+    return combat
+
+
+def create_overview_rows(
+        combat: Combat, damage_out: dict[str, DamageTableRow],
+        damage_in: dict[str, DamageTableRow], heals_out: dict[str, HealTableRow],
+        combat_times: dict[str, float], overview_graph_intervals: dict[str, tuple[int, int]],
+        focus_players: Iterable[str] | None = None):
+    """
+    Creates the players of the overview table from per-player rows the same way
+    `Combat.create_overview` creates them from the analysis trees.
+
+    Parameters:
+    - :param combat: combat to add the players to
+    - :param damage_out: maps player ids to their summed up outgoing damage
+    - :param damage_in: maps player ids to their summed up incoming damage
+    - :param heals_out: maps player ids to their summed up outgoing heals
+    - :param combat_times: maps player ids to their combat time
+    - :param overview_graph_intervals: maps player handles to their active combat start and end
+    times measured in graph points
+    - :param focus_players: handles of the players to include; includes all players if not given
+    """
+    combat_duration = combat.meta['player_duration']
+    if combat_duration == 0:
+        return
+    if focus_players is not None:
+        focus_handles = frozenset(
+            handle if handle.startswith('@') else f'@{handle}' for handle in focus_players)
+    else:
+        focus_handles = None
+    total_damage_out = 0
+    total_attacks_in = 0
+    total_damage_in = 0
+    total_heals = 0
+    for player_id, out_row in damage_out.items():
+        player_combat_duration = combat_times.get(player_id, 0)
+        if player_combat_duration <= 0:
+            continue
+        dmg_out_data = calculate_damage_row_stats(out_row, player_combat_duration)
+        total_damage_out += out_row.total_damage
+        in_row = damage_in.get(player_id)
+        if in_row is not None and in_row.name != out_row.name:
+            in_row = None
+        if in_row is not None:
+            total_damage_in += in_row.total_damage
+            total_attacks_in += in_row.total_attacks
+        heal_row = heals_out.get(player_id)
+        if heal_row is not None and heal_row.name != out_row.name:
+            heal_row = None
+        if heal_row is not None:
+            total_heals += heal_row.total_heal
+        if focus_handles is not None and out_row.handle not in focus_handles:
+            continue
+        player = OverviewTableRow(out_row.name, out_row.handle)
+        player.DPS = dmg_out_data[1]
+        player.combat_time = player_combat_duration
+        player.combat_time_share = player_combat_duration / combat_duration
+        player.total_damage = out_row.total_damage
+        player.debuff = dmg_out_data[3]
+        player.max_one_hit = out_row.max_one_hit
+        player.crit_chance = dmg_out_data[5]
+        player.total_attacks = out_row.total_attacks
+        player.hull_attacks = out_row.hull_attacks
+        player.crit_num = out_row.crit_num
+        player.misses = out_row.misses
+        if in_row is not None:
+            player.deaths = in_row.kills
+            player.total_damage_taken = in_row.total_damage
+            player.total_hull_damage_taken = in_row.total_hull_damage
+            player.total_shield_damage_taken = in_row.total_shield_damage
+            player.attacks_in_num = in_row.total_attacks
+        if heal_row is not None:
+            heal_out_data = calculate_heal_row_stats(heal_row, player_combat_duration)
+            player.total_heals = heal_row.total_heal
+            player.heal_crit_chance = heal_out_data[8]
+            player.heal_crit_num = heal_row.critical_heals
+            player.heal_num = heal_row.heal_ticks
+        if player.handle in overview_graph_intervals:
+            combat.create_overview_graphs(player, overview_graph_intervals[player.handle])
+        combat.players[player.name + player.handle] = player
+    combat.calculate_shares(total_damage_out, total_attacks_in, total_damage_in, total_heals)
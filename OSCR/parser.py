@@ -1,29 +1,136 @@
-from numpy import float64, sum as numpy__sum, zeros as numpy__zeros
+from numpy import (
+    concatenate as numpy__concatenate, float64, sum as numpy__sum, zeros as numpy__zeros)
+from collections.abc import Sequence
 from datetime import datetime
+from time import perf_counter
+from typing import Generator, Iterable
 
 from .combat import Combat
 from .constants import HEAL_TREE_HEADER, TREE_HEADER
 from .datamodels import (
-    AnalysisTableRow, DamageTableRow, HealTableRow, LogLine, TreeItem, TreeModel)
+    AnalysisState, AnalysisTableRow, DamageTableRow, HealTableRow, LogLine, TreeItem, TreeModel)
+from .instrumentation import count_tree_items, record_stage
+from .intervals import IntervalIndex
 from .utilities import bundle, get_handle_from_id, get_player_handle, to_microseconds
 
 
-def analyze_combat(combat: Combat) -> Combat:
+def analyze_combat(
+        combat: Combat, focus_players: Iterable[str] | None = None,
+        interval_index: bool = False, resumable: bool = False) -> Combat:
     """
     Fully analyzes the given combat and returns it.
+
+    Parameters:
+    - :param combat: combat to analyze
+    - :param focus_players: handles of players to analyze; if given, only lines where one of these
+    players is owner or target are added to the analysis trees and only these players appear in
+    the overview; all other lines only update combat-wide totals, so shares and map detection are
+    the same as in a full analysis
+    - :param interval_index: also creates `combat.interval_index`, which allows retrieving the rows
+    of the analysis trees for any time window of the combat
+    - :param resumable: keeps the accumulators of the analysis in `combat.analysis_state`, so that
+    lines appended to the combat later can be added using `resume_analysis`
     """
-    combat.damage_out = dmg_out_model = TreeModel(TREE_HEADER)
-    combat.damage_in = dmg_in_model = TreeModel(TREE_HEADER)
-    combat.heals_out = heal_out_model = TreeModel(HEAL_TREE_HEADER)
-    combat.heals_in = heal_in_model = TreeModel(HEAL_TREE_HEADER)
-    actor_combat_durations: dict[str, list[datetime]] = dict()
-    graph_point_delta = combat.graph_resolution * 1_000_000
+    timings = combat.meta.get('timings')
+    if timings is not None:
+        stage_start = perf_counter()
+    if focus_players is not None:
+        focus_handles = frozenset(
+            handle if handle.startswith('@') else f'@{handle}' for handle in focus_players)
+        combat.meta['focus_players'] = sorted(focus_handles)
+    else:
+        focus_handles = None
     combat_duration_delta = combat.end_time - combat.start_time
-    combat_duration_sec = int(combat_duration_delta.total_seconds()) + 1  # round up to full second
-    total_graph_points = int(combat_duration_delta.total_seconds() // combat.graph_resolution + 2)
-    combat_start: datetime = combat.log_data[0].timestamp
-    relative_combat_sec = 0
-    for line in combat.log_data:
+    state = AnalysisState(
+        combat.log_data[0].timestamp, combat.graph_resolution,
+        int(combat_duration_delta.total_seconds()) + 1, focus_handles, interval_index)
+    _apply_lines(state, combat, combat.log_data)
+    if timings is not None:
+        record_stage(timings, 'analyze', stage_start)
+    _complete_analysis(state, combat, len(combat.log_data), resumable)
+    combat.analysis_state = state if resumable else None
+    return combat
+
+
+def resume_analysis(combat: Combat, lines: Sequence[LogLine], end_time: datetime) -> Combat:
+    """
+    Adds lines appended to a combat analyzed with `resumable=True` to its analysis and completes
+    the analysis again. Only the new lines are analyzed; the result is the same as analyzing the
+    entire combat. An interval index (see `analyze_combat`) is rebuilt from all lines of the
+    combat. Returns the combat.
+
+    Parameters:
+    - :param combat: combat analyzed with `resumable=True`
+    - :param lines: lines following the lines analyzed so far, in chronological order
+    - :param end_time: timestamp of the last line of the combat including the new lines
+    """
+    state = combat.analysis_state
+    if state is None:
+        raise ValueError('Combat was analyzed without keeping the analysis state')
+    timings = combat.meta.get('timings')
+    if timings is not None:
+        stage_start = perf_counter()
+    combat.end_time = end_time
+    _apply_lines(state, combat, lines)
+    if timings is not None:
+        record_stage(timings, 'analyze', stage_start)
+    _complete_analysis(state, combat, len(lines), True)
+    return combat
+
+
+def can_resume_analysis(
+        combat: Combat, focus_players: Iterable[str] | None = None,
+        interval_index: bool = False) -> bool:
+    """
+    Returns whether lines can be added to the analysis of `combat` using `resume_analysis` with
+    results equal to analyzing it with the given settings.
+
+    Parameters:
+    - :param combat: analyzed combat
+    - :param focus_players: handles of the players to analyze, see `analyze_combat`
+    - :param interval_index: whether the combat is analyzed with interval index
+    """
+    state = combat.analysis_state
+    if state is None or state.graph_resolution != combat.graph_resolution:
+        return False
+    if focus_players is not None:
+        focus_players = frozenset(
+            handle if handle.startswith('@') else f'@{handle}' for handle in focus_players)
+    return (
+        state.focus_handles == focus_players
+        and (state.interval_events is not None) == interval_index)
+
+
+def _apply_lines(state: AnalysisState, combat: Combat, lines: Sequence[LogLine]):
+    """
+    (Internal Function) Adds lines to the accumulators of an analysis.
+
+    Parameters:
+    - :param state: accumulators to add the lines to
+    - :param combat: combat the lines belong to
+    - :param lines: lines to add in chronological order
+    """
+    if len(lines) == 0:
+        return
+    state.last_line_time = lines[-1].timestamp
+    if state.end_time is not None:
+        return
+    dmg_out_model = state.damage_out
+    dmg_in_model = state.damage_in
+    heal_out_model = state.heals_out
+    heal_in_model = state.heals_in
+    actor_combat_durations = state.actor_combat_durations
+    overview_graphs = state.overview_graphs
+    graph_point_delta = state.graph_resolution * 1_000_000
+    graph_duration = state.graph_duration
+    graph_points = int(graph_duration // state.graph_resolution + 2)
+    combat_start: datetime = state.combat_start
+    focus_handles = state.focus_handles
+    focus_ids = state.focus_ids
+    combat_totals = state.combat_totals
+    npc_ids = None if combat_totals is None else combat_totals.npc_damage
+    interval_events = state.interval_events
+    for line in lines:
         timestamp: datetime = line.timestamp
         player_attacks = line.owner_id.startswith('P')
         player_attacked = line.target_id.startswith('P')
@@ -34,13 +141,39 @@ def analyze_combat(combat: Combat) -> Combat:
                 or (is_shield_line and line.magnitude < 0 and line.magnitude2 >= 0))
 
         relative_combat_sec = (timestamp - combat_start).seconds
+        if relative_combat_sec >= graph_duration:
+            graph_duration = max(2 * graph_duration, relative_combat_sec + 1)
+            graph_points = int(graph_duration // state.graph_resolution + 2)
+            _grow_graphs(state, graph_duration, graph_points)
+
+        # Combat Duration
+        # Heals, damage taken and self-damage don't affect combat time
+        if not is_heal and (line.target_name or '*') != '*' and line.owner_id != line.target_id:
+            try:
+                actor_combat_durations[line.owner_id][1] = timestamp
+            except KeyError:
+                actor_combat_durations[line.owner_id] = [timestamp, timestamp]
+            if not line.source_id.startswith('P'):
+                try:
+                    actor_combat_durations[line.source_id][1] = timestamp
+                except KeyError:
+                    actor_combat_durations[line.source_id] = [timestamp, timestamp]
+
+        if combat_totals is not None:
+            combat_totals.add_line(line, is_heal, kill_flag)
+
+        # lines not involving a focus player only contribute to the combat-wide totals
+        if combat_totals is not None and not (
+                is_focus_actor(line.owner_id, focus_handles, focus_ids)
+                or is_focus_actor(line.target_id, focus_handles, focus_ids)):
+            pass
 
         # HEALS
-        if is_heal:
+        elif is_heal:
             target_item, ability_target = get_outgoing_target_row(
-                heal_out_model, line, player_attacks, HealTableRow, combat_duration_sec)
+                heal_out_model, line, player_attacks, HealTableRow, graph_duration)
             source_item, source_ability = get_incoming_target_row(
-                heal_in_model, line, player_attacked, HealTableRow, combat_duration_sec)
+                heal_in_model, line, player_attacked, HealTableRow, graph_duration)
 
             if crit_flag:
                 ability_target.critical_heals += 1
@@ -69,26 +202,17 @@ def analyze_combat(combat: Combat) -> Combat:
 
             target_item.graph_data[relative_combat_sec] += magnitude
             source_item.graph_data[relative_combat_sec] += magnitude
+            if interval_events is not None:
+                interval_events.append((
+                    relative_combat_sec, target_item, source_item, line, True, is_shield_line,
+                    crit_flag, False, False, False))
 
         # DAMAGE
         else:
             target_item, ability_target = get_outgoing_target_row(
-                dmg_out_model, line, player_attacks, DamageTableRow, combat_duration_sec)
+                dmg_out_model, line, player_attacks, DamageTableRow, graph_duration)
             source_item, source_ability = get_incoming_target_row(
-                dmg_in_model, line, player_attacked, DamageTableRow, combat_duration_sec)
-
-            # Combat Duration
-            # Heals, damage taken and self-damage don't affect combat time
-            if ability_target.name != '*' and line.owner_id != line.target_id:
-                try:
-                    actor_combat_durations[line.owner_id][1] = timestamp
-                except KeyError:
-                    actor_combat_durations[line.owner_id] = [timestamp, timestamp]
-                if not line.source_id.startswith('P'):
-                    try:
-                        actor_combat_durations[line.source_id][1] = timestamp
-                    except KeyError:
-                        actor_combat_durations[line.source_id] = [timestamp, timestamp]
+                dmg_in_model, line, player_attacked, DamageTableRow, graph_duration)
 
             # get table data
             magnitude = abs(line.magnitude)
@@ -122,11 +246,11 @@ def analyze_combat(combat: Combat) -> Combat:
             if player_attacks:
                 time_idx = int(to_microseconds(timestamp - combat_start) // graph_point_delta)
                 try:
-                    combat.overview_graphs[get_player_handle(line.owner_id)][time_idx] += magnitude
+                    overview_graphs[get_player_handle(line.owner_id)][time_idx] += magnitude
                 except KeyError:
-                    combat.overview_graphs[get_player_handle(line.owner_id)] = numpy__zeros(
-                        total_graph_points, float64)
-                    combat.overview_graphs[get_player_handle(line.owner_id)][time_idx] += magnitude
+                    overview_graphs[get_player_handle(line.owner_id)] = numpy__zeros(
+                        graph_points, float64)
+                    overview_graphs[get_player_handle(line.owner_id)][time_idx] += magnitude
 
             if miss_flag:
                 ability_target.misses += 1
@@ -140,19 +264,133 @@ def analyze_combat(combat: Combat) -> Combat:
             if kill_flag:
                 ability_target.kills += 1
                 source_ability.kills += 1
-                if (line.target_name == 'Borg Queen Octahedron'
-                        or (line.target_id == '*' and (line.owner_name == 'Borg Queen Octahedron'
-                            or line.source_name == 'Borg Queen Octahedron'))):
-                    if combat.map_is_hive_space():
-                        combat_duration_delta = line.timestamp - combat.log_data[0].timestamp
-                        combat.end_time = line.timestamp
-                        break  # ignore all lines after the Queen kill line in the Hive Space queue
+            if interval_events is not None:
+                interval_events.append((
+                    relative_combat_sec, target_item, source_item, line, False, is_shield_line,
+                    crit_flag, miss_flag, flank_flag, kill_flag))
+
+        if kill_flag and not is_heal and (
+                line.target_name == 'Borg Queen Octahedron'
+                or (line.target_id == '*' and (
+                    line.owner_name == 'Borg Queen Octahedron'
+                    or line.source_name == 'Borg Queen Octahedron'))):
+            if npc_ids is None:
+                is_hive_space = combat.map_is_hive_space(
+                    critter.data.id[0] for critter in dmg_in_model._npc._children)
+            else:
+                is_hive_space = combat.map_is_hive_space(npc_ids)
+            if is_hive_space:
+                state.end_time = timestamp
+                break  # ignore all lines after the Queen kill line in the Hive Space queue
+
+
+def _grow_graphs(state: AnalysisState, graph_duration: int, graph_points: int):
+    """
+    (Internal Function) Enlarges the graphs of the accumulators of an analysis.
+
+    Parameters:
+    - :param state: accumulators of the analysis
+    - :param graph_duration: new number of seconds of the graphs of the analysis trees
+    - :param graph_points: new number of intervals of the overview graphs
+    """
+    growth = graph_duration - state.graph_duration
+    pending: list[TreeItem] = [tree_model._root for tree_model in state.tree_models]
+    while len(pending) > 0:
+        item = pending.pop()
+        if item.child_count == 0:
+            item.graph_data = numpy__concatenate((item.graph_data, numpy__zeros(growth, float64)))
+        else:
+            pending.extend(item._children)
+    for handle, graph in state.overview_graphs.items():
+        state.overview_graphs[handle] = numpy__concatenate(
+            (graph, numpy__zeros(graph_points - len(graph), float64)))
+    state.graph_duration = graph_duration
+
+
+def _copy_tree_model(
+        tree_model: TreeModel, graph_duration: int,
+        item_copies: dict[TreeItem, TreeItem]) -> TreeModel:
+    """
+    (Internal Function) Copies the items of an uncompleted tree model, so that the copy can be
+    completed while the original keeps accumulating lines. Rows are shared, as completing the
+    tree replaces them instead of modifying them. The indexes of the model are not copied.
 
+    Parameters:
+    - :param tree_model: model to copy
+    - :param graph_duration: number of seconds the graphs of the copied leaves are cut to
+    - :param item_copies: the copy of every item is added to this dictionary
+    """
+    model_copy = TreeModel(tree_model._root.data)
+    pending = [
+        (tree_model._player, model_copy._player), (tree_model._npc, model_copy._npc)]
+    while len(pending) > 0:
+        item, parent_copy = pending.pop()
+        for child in item._children:
+            child_copy = TreeItem(child.data, parent_copy)
+            parent_copy.append_child(child_copy)
+            item_copies[child] = child_copy
+            if child.child_count == 0:
+                child_copy.graph_data = child.graph_data[:graph_duration].copy()
+            else:
+                pending.append((child, child_copy))
+    return model_copy
+
+
+def _complete_analysis(
+        state: AnalysisState, combat: Combat, line_count: int, keep_state: bool):
+    """
+    (Internal Function) Completes the analysis trees, detects the map and creates the overview of
+    the combat from the accumulators of its analysis.
+
+    Parameters:
+    - :param state: accumulators of the analysis
+    - :param combat: combat to complete
+    - :param line_count: number of lines added to the accumulators since the last completion
+    - :param keep_state: completes copies of the trees so that the accumulators can be resumed
+    """
+    timings = combat.meta.get('timings')
+    if timings is not None:
+        stage_start = perf_counter()
+        counters = combat.meta['counters']
+        counters['analyzed_lines'] = line_count
+        counters['peak_tree_items'] = sum(map(count_tree_items, state.tree_models))
+    combat_duration_delta = combat.end_time - combat.start_time
+    combat_duration_sec = int(combat_duration_delta.total_seconds()) + 1  # round up to full second
+    total_graph_points = int(combat_duration_delta.total_seconds() // combat.graph_resolution + 2)
+    if keep_state:
+        if combat_duration_sec > state.graph_duration:
+            # lines after the Queen kill line are not analyzed, but count towards the duration
+            _grow_graphs(state, combat_duration_sec, total_graph_points)
+        item_copies: dict[TreeItem, TreeItem] = dict()
+        dmg_out_model, dmg_in_model, heal_out_model, heal_in_model = (
+            _copy_tree_model(tree_model, combat_duration_sec, item_copies)
+            for tree_model in state.tree_models)
+        combat.overview_graphs = {
+            handle: graph[:total_graph_points].copy()
+            for handle, graph in state.overview_graphs.items()}
+    else:
+        dmg_out_model, dmg_in_model, heal_out_model, heal_in_model = state.tree_models
+        combat.overview_graphs = {
+            handle: graph[:total_graph_points] for handle, graph in state.overview_graphs.items()}
+    combat.damage_out = dmg_out_model
+    combat.damage_in = dmg_in_model
+    combat.heals_out = heal_out_model
+    combat.heals_in = heal_in_model
+    if state.end_time is not None:
+        combat_duration_delta = state.end_time - state.combat_start
+        combat.end_time = state.end_time
     combat.meta['log_duration'] = combat_duration_delta.total_seconds()
+    combat_start = state.combat_start
+    if state.interval_events is not None:
+        actor_spans = {
+            actor_id: ((start_time - combat_start).total_seconds(),
+                       (end_time - combat_start).total_seconds())
+            for actor_id, (start_time, end_time) in state.actor_combat_durations.items()}
+    actor_combat_durations: dict[str, float] = dict()
     overview_graph_intervals: dict[str, tuple] = dict()
     first_player_shot: list[datetime] = list()
     last_player_shot: list[datetime] = list()
-    for actor_id, (start_time, end_time) in actor_combat_durations.items():
+    for actor_id, (start_time, end_time) in state.actor_combat_durations.items():
         if actor_id.startswith('P'):
             start = int((start_time - combat.start_time).total_seconds() // combat.graph_resolution)
             end = int((end_time - combat.start_time).total_seconds() // combat.graph_resolution + 1)
@@ -171,9 +409,52 @@ def analyze_combat(combat: Combat) -> Combat:
     complete_damage_tree(dmg_in_model, actor_combat_durations)
     complete_heal_tree(heal_out_model, actor_combat_durations)
     complete_heal_tree(heal_in_model, actor_combat_durations)
-    combat.detect_map()
-    combat.create_overview(overview_graph_intervals)
-    return combat
+    if timings is not None:
+        stage_start = record_stage(timings, 'complete_trees', stage_start)
+    if state.interval_events is not None:
+        if keep_state:
+            interval_events = (
+                (event[0], item_copies[event[1]], item_copies[event[2]]) + event[3:]
+                for event in state.interval_events)
+        else:
+            interval_events = state.interval_events
+        combat.interval_index = IntervalIndex(interval_events, actor_spans, combat_duration_sec)
+        if timings is not None:
+            stage_start = record_stage(timings, 'interval_index', stage_start)
+    combat_totals = state.combat_totals
+    combat.difficulty = None
+    if combat_totals is None:
+        combat.detect_map()
+    else:
+        combat.detect_map(combat_totals.iter_npcs())
+    if timings is not None:
+        stage_start = record_stage(timings, 'detect_map', stage_start)
+    combat.players = dict()
+    if combat_totals is None:
+        combat.create_overview(overview_graph_intervals)
+    else:
+        combat.create_overview(
+            overview_graph_intervals, combat_totals.get_share_totals(actor_combat_durations),
+            state.focus_handles)
+    if timings is not None:
+        record_stage(timings, 'create_overview', stage_start)
+
+
+def is_focus_actor(actor_id: str, focus_handles: frozenset[str], cache: dict[str, bool]) -> bool:
+    """
+    Returns whether `actor_id` belongs to a player with one of the given handles.
+
+    Parameters:
+    - :param actor_id: owner or target id of a line
+    - :param focus_handles: handles of the focus players, including the leading "@"
+    - :param cache: maps already checked ids to the result
+    """
+    try:
+        return cache[actor_id]
+    except KeyError:
+        result = actor_id.startswith('P') and get_player_handle(actor_id) in focus_handles
+        cache[actor_id] = result
+        return result
 
 
 def get_outgoing_target_row(
@@ -572,3 +853,68 @@ def complete_heal_tree(tree_model: TreeModel, combat_durations: dict):
         current_combat_time = combat_durations.get(actor.data.id[0], 0)
         actor.data.combat_time = current_combat_time
         complete_heal_sub_tree(actor, current_combat_time)
+
+
+def iter_leaf_rows(item: TreeItem) -> Generator[AnalysisTableRow, None, None]:
+    """
+    Yields the raw data rows of all leaves below `item` without modifying the tree. Only valid for
+    trees that have not been completed yet.
+
+    Parameters:
+    - :param item: item to collect leaf rows from
+    """
+    for child in item._children:
+        if child.child_count == 0:
+            yield child.data
+        else:
+            yield from iter_leaf_rows(child)
+
+
+def sum_damage_rows(rows: Iterable[DamageTableRow], name: str, handle: str = '') -> DamageTableRow:
+    """
+    Sums up raw damage rows into a new row. The given rows are not modified.
+
+    Parameters:
+    - :param rows: raw rows to sum up
+    - :param name: name of the resulting row
+    - :param handle: handle of the resulting row
+    """
+    result = DamageTableRow(name, handle, '')
+    for row in rows:
+        result.total_damage += row.total_damage
+        result.kills += row.kills
+        result.total_attacks += row.total_attacks
+        result.misses += row.misses
+        result.crit_num += row.crit_num
+        result.flank_num += row.flank_num
+        result.total_shield_damage += row.total_shield_damage
+        result.total_hull_damage += row.total_hull_damage
+        result.total_base_damage += row.total_base_damage
+        result.hull_attacks += row.hull_attacks
+        result.shield_attacks += row.shield_attacks
+        if row.max_one_hit > result.max_one_hit:
+            result.max_one_hit = row.max_one_hit
+    return result
+
+
+def sum_heal_rows(rows: Iterable[HealTableRow], name: str, handle: str = '') -> HealTableRow:
+    """
+    Sums up raw heal rows into a new row. The given rows are not modified.
+
+    Parameters:
+    - :param rows: raw rows to sum up
+    - :param name: name of the resulting row
+    - :param handle: handle of the resulting row
+    """
+    result = HealTableRow(name, handle, '')
+    for row in rows:
+        result.total_heal += row.total_heal
+        result.hull_heal += row.hull_heal
+        result.shield_heal += row.shield_heal
+        result.heal_ticks += row.heal_ticks
+        result.critical_heals += row.critical_heals
+        result.hull_heal_ticks += row.hull_heal_ticks
+        result.shield_heal_ticks += row.shield_heal_ticks
+        if row.max_one_heal > result.max_one_heal:
+            result.max_one_heal = row.max_one_heal
+    return result
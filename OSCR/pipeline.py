@@ -0,0 +1,256 @@
+"""Flow control and metrics of the isolation and analysis pipeline of `OSCR.analyze_log_file_mp`"""
+
+import multiprocessing
+import threading
+from time import perf_counter
+
+
+class _Value:
+    """
+    (Internal Class) Counterpart of `multiprocessing.RawValue` for use within one process.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: int | float):
+        self.value: int | float = value
+
+
+class InFlightLimit:
+    """
+    (Internal Class) Bounds the combats between their isolation and the delivery of their analysis.
+    The isolating process reserves room for every combat before passing it on and waits while the
+    pipeline is full; the room is freed when the analysis of the combat has been delivered. A
+    combat larger than the byte limit passes when the pipeline is empty.
+    """
+
+    __slots__ = (
+        'max_combats', 'max_bytes', '_condition', '_combats', '_bytes', '_wait_time', '_closed')
+
+    def __init__(self, max_combats: int, max_bytes: int = 0, processes: bool = True):
+        """
+        Parameters:
+        - :param max_combats: maximum number of combats in the pipeline; at least 1
+        - :param max_bytes: maximum number of logfile bytes of the combats in the pipeline; 0 does
+        not limit bytes
+        - :param processes: the limit can be passed to child processes; otherwise it can only be
+        shared between threads, which is cheaper
+        """
+        self.max_combats: int = max(max_combats, 1)
+        self.max_bytes: int = max_bytes
+        if processes:
+            self._condition = multiprocessing.Condition()
+            self._combats = multiprocessing.RawValue('q', 0)
+            self._bytes = multiprocessing.RawValue('q', 0)
+            self._wait_time = multiprocessing.RawValue('d', 0.0)
+            self._closed = multiprocessing.RawValue('b', 0)
+        else:
+            self._condition = threading.Condition()
+            self._combats = _Value(0)
+            self._bytes = _Value(0)
+            self._wait_time = _Value(0.0)
+            self._closed = _Value(0)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__}: {self.combats}/{self.max_combats} combats, '
+            f'{self.bytes} bytes>')
+
+    @property
+    def combats(self) -> int:
+        """
+        Number of combats in the pipeline.
+        """
+        return self._combats.value
+
+    @property
+    def bytes(self) -> int:
+        """
+        Number of logfile bytes of the combats in the pipeline.
+        """
+        return self._bytes.value
+
+    @property
+    def wait_time(self) -> float:
+        """
+        Seconds spent waiting for room in the pipeline.
+        """
+        return self._wait_time.value
+
+    def acquire(self, size: int):
+        """
+        Waits until a combat of `size` bytes fits into the pipeline and reserves room for it.
+        """
+        with self._condition:
+            if not self._fits(size):
+                wait_start = perf_counter()
+                self._condition.wait_for(lambda: self._fits(size))
+                self._wait_time.value += perf_counter() - wait_start
+            self._combats.value += 1
+            self._bytes.value += size
+
+    def close(self):
+        """
+        Lets waiting and future acquisitions pass without limit, so that a waiting isolating
+        thread can notice that the pipeline has been cancelled. Must not be called after a process
+        using the limit has been terminated, as it may have left the lock acquired.
+        """
+        with self._condition:
+            self._closed.value = 1
+            self._condition.notify_all()
+
+    def release(self, size: int):
+        """
+        Frees the room of a combat of `size` bytes.
+        """
+        with self._condition:
+            self._combats.value -= 1
+            self._bytes.value -= size
+            self._condition.notify_all()
+
+    def _fits(self, size: int) -> bool:
+        """
+        (Internal Function) Returns whether a combat of `size` bytes fits into the pipeline.
+        """
+        if self._combats.value == 0 or self._closed.value:
+            return True
+        if self._combats.value >= self.max_combats:
+            return False
+        return self.max_bytes <= 0 or self._bytes.value + size <= self.max_bytes
+
+
+class PipelineMetrics:
+    """
+    Queue depths and stage utilization of a run of `OSCR.analyze_log_file_mp`. Combats in flight
+    have been isolated, but their analysis has not been delivered yet; queued combats are in flight
+    and wait for a free worker. Depths are sampled whenever the pipeline changes and at least every
+    0.1 seconds; means are weighted by time.
+    """
+
+    __slots__ = (
+        'workers', 'combats', 'bytes', 'wall_time', 'isolation_time', 'backpressure_time',
+        'analysis_time', 'delivery_time', 'peak_combats_in_flight', 'peak_bytes_in_flight',
+        'peak_queued_combats', '_combats_area', '_queued_area', '_last_sample', '_last_depths',
+        '_start_time')
+
+    def __init__(self, workers: int):
+        """
+        Parameters:
+        - :param workers: number of workers analyzing combats
+        """
+        self.workers: int = workers
+        self.combats: int = 0  # combats whose analysis has been delivered or failed
+        self.bytes: int = 0  # logfile bytes of these combats
+        self.wall_time: float = 0.0
+        self.isolation_time: float = 0.0
+        self.backpressure_time: float = 0.0  # isolation time spent waiting for room
+        self.analysis_time: float = 0.0  # sum of the times combats spent in workers
+        self.delivery_time: float = 0.0  # time spent storing results and calling callbacks
+        self.peak_combats_in_flight: int = 0
+        self.peak_bytes_in_flight: int = 0
+        self.peak_queued_combats: int = 0
+        self._combats_area: float = 0.0
+        self._queued_area: float = 0.0
+        self._start_time: float = perf_counter()
+        self._last_sample: float = self._start_time
+        self._last_depths: tuple[int, int] = (0, 0)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.combats} combats, {self.wall_time:.3f}s>'
+
+    @property
+    def mean_combats_in_flight(self) -> float:
+        """
+        Mean number of combats in flight.
+        """
+        return self._combats_area / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def mean_queued_combats(self) -> float:
+        """
+        Mean number of combats waiting for a free worker.
+        """
+        return self._queued_area / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def isolation_utilization(self) -> float:
+        """
+        Share of the isolation time the isolating process was not waiting for room.
+        """
+        if self.isolation_time <= 0:
+            return 0.0
+        return max(self.isolation_time - self.backpressure_time, 0.0) / self.isolation_time
+
+    @property
+    def analysis_utilization(self) -> float:
+        """
+        Share of the wall time the workers were busy.
+        """
+        if self.wall_time <= 0:
+            return 0.0
+        return min(self.analysis_time / (self.workers * self.wall_time), 1.0)
+
+    @property
+    def delivery_utilization(self) -> float:
+        """
+        Share of the wall time spent delivering results.
+        """
+        return self.delivery_time / self.wall_time if self.wall_time > 0 else 0.0
+
+    def sample(self, combats_in_flight: int, bytes_in_flight: int, queued_combats: int):
+        """
+        Records the current depths of the pipeline.
+        """
+        now = perf_counter()
+        self._add_area(now)
+        queued_combats = max(queued_combats, 0)
+        self._last_depths = (combats_in_flight, queued_combats)
+        self.peak_combats_in_flight = max(self.peak_combats_in_flight, combats_in_flight)
+        self.peak_bytes_in_flight = max(self.peak_bytes_in_flight, bytes_in_flight)
+        self.peak_queued_combats = max(self.peak_queued_combats, queued_combats)
+
+    def end_isolation(self):
+        """
+        Records the end of isolating combats.
+        """
+        self.isolation_time = perf_counter() - self._start_time
+
+    def finish(self, backpressure_time: float):
+        """
+        Records the end of the run.
+
+        Parameters:
+        - :param backpressure_time: seconds the isolating process spent waiting for room
+        """
+        now = perf_counter()
+        self._add_area(now)
+        self.wall_time = now - self._start_time
+        if self.isolation_time <= 0:
+            self.isolation_time = self.wall_time
+        self.backpressure_time = backpressure_time
+
+    def report(self) -> str:
+        """
+        Returns metrics formatted as text table.
+        """
+        lines = [
+            f'{self.combats} combats, {self.bytes:,} bytes, {self.wall_time:.3f}s total',
+            f"  {'isolation':<20}{self.isolation_time:>10.4f}s {self.isolation_utilization:>7.1%}",
+            f"  {'analysis':<20}{self.analysis_time:>10.4f}s {self.analysis_utilization:>7.1%}",
+            f"  {'delivery':<20}{self.delivery_time:>10.4f}s {self.delivery_utilization:>7.1%}",
+            f"  {'backpressure':<20}{self.backpressure_time:>10.4f}s",
+            f"  {'combats in flight':<20}{self.mean_combats_in_flight:>11.2f} mean "
+            f'{self.peak_combats_in_flight:>6} peak',
+            f"  {'queued combats':<20}{self.mean_queued_combats:>11.2f} mean "
+            f'{self.peak_queued_combats:>6} peak',
+            f"  {'bytes in flight':<20}{self.peak_bytes_in_flight:>11,} peak"]
+        return '\n'.join(lines)
+
+    def _add_area(self, now: float):
+        """
+        (Internal Function) Accumulates the depths since the last sample, weighted by time.
+        """
+        duration = now - self._last_sample
+        self._combats_area += self._last_depths[0] * duration
+        self._queued_area += self._last_depths[1] * duration
+        self._last_sample = now
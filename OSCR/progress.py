@@ -0,0 +1,159 @@
+"""Progress reporting and cancellation of long-running operations"""
+
+from collections.abc import Callable
+from threading import Event
+from time import perf_counter
+
+# minimum number of seconds between two progress reports
+PROGRESS_INTERVAL = 0.1
+
+
+class CancellationToken:
+    """
+    Flag that stops long-running operations early. Operations check the token between chunks of
+    work and return the results completed until then. The token can be cancelled from another
+    thread, for example from a GUI while the operation runs in a worker thread. Cancelling cannot
+    be undone; use a new token for the next operation.
+    """
+
+    __slots__ = ('_event',)
+
+    def __init__(self):
+        self._event = Event()
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: cancelled={self.cancelled}>'
+
+    def cancel(self):
+        """
+        Requests operations using this token to stop.
+        """
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        True once `cancel` has been called.
+        """
+        return self._event.is_set()
+
+
+class Progress:
+    """
+    Progress of an operation on a logfile.
+    """
+
+    __slots__ = (
+        'processed_bytes', 'total_bytes', 'combats', 'max_combats', 'elapsed', 'remaining')
+
+    def __init__(
+            self, processed_bytes: int, total_bytes: int, combats: int, max_combats: int,
+            elapsed: float, remaining: float | None):
+        """
+        Parameters:
+        - :param processed_bytes: number of bytes of the logfile processed so far
+        - :param total_bytes: number of bytes the operation processes at most
+        - :param combats: number of combats completed so far
+        - :param max_combats: number of combats after which the operation ends; 0 if unlimited
+        - :param elapsed: seconds since the operation started
+        - :param remaining: estimated seconds until the operation ends; None if there is no
+        estimate yet
+        """
+        self.processed_bytes: int = processed_bytes
+        self.total_bytes: int = total_bytes
+        self.combats: int = combats
+        self.max_combats: int = max_combats
+        self.elapsed: float = elapsed
+        self.remaining: float | None = remaining
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__}: {self.processed_bytes}/{self.total_bytes} bytes, '
+            f'{self.combats} combats, {self.fraction:.0%}>')
+
+    @property
+    def fraction(self) -> float:
+        """
+        Completed part of the operation between 0 and 1. The operation ends when either all bytes
+        have been processed or `max_combats` combats have been found, so the larger of both
+        fractions is used.
+        """
+        fraction = 0.0
+        if self.total_bytes > 0:
+            fraction = self.processed_bytes / self.total_bytes
+        if self.max_combats > 0:
+            fraction = max(fraction, self.combats / self.max_combats)
+        return min(fraction, 1.0)
+
+
+class ProgressReporter:
+    """
+    Passes the progress of an operation to a handler. Operations update the reporter once per
+    chunk of work; the handler is called at most once per `interval` seconds and once when the
+    operation ends.
+    """
+
+    __slots__ = (
+        'handler', 'total_bytes', 'max_combats', 'interval', 'processed_bytes', 'combats',
+        '_start_time', '_last_report')
+
+    def __init__(
+            self, handler: Callable[[Progress], None], total_bytes: int = 0,
+            max_combats: int = 0, interval: float = PROGRESS_INTERVAL):
+        """
+        Parameters:
+        - :param handler: called with the current `Progress`
+        - :param total_bytes: number of bytes the operation processes at most; can be set later
+        - :param max_combats: number of combats after which the operation ends; 0 if unlimited
+        - :param interval: minimum number of seconds between two calls of `handler`
+        """
+        self.handler: Callable[[Progress], None] = handler
+        self.total_bytes: int = total_bytes
+        self.max_combats: int = max_combats
+        self.interval: float = interval
+        self.processed_bytes: int = 0
+        self.combats: int = 0
+        self._start_time: float = perf_counter()
+        self._last_report: float = self._start_time
+
+    def update(self, processed_bytes: int, combats: int):
+        """
+        Updates the progress and calls the handler if the last report is older than `interval`.
+
+        Parameters:
+        - :param processed_bytes: number of bytes processed so far
+        - :param combats: number of combats completed so far
+        """
+        self.processed_bytes = processed_bytes
+        self.combats = combats
+        now = perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.handler(self._create_progress(now))
+
+    def finish(self, processed_bytes: int, combats: int):
+        """
+        Reports the final progress when the operation has ended, completed or not.
+
+        Parameters:
+        - :param processed_bytes: number of bytes processed by the operation
+        - :param combats: number of combats found by the operation
+        """
+        self.processed_bytes = processed_bytes
+        self.combats = combats
+        progress = self._create_progress(perf_counter())
+        progress.remaining = 0.0
+        self.handler(progress)
+
+    def _create_progress(self, now: float) -> Progress:
+        """
+        (Internal Function) Returns current progress; the remaining time is extrapolated from the
+        completed fraction.
+        """
+        elapsed = now - self._start_time
+        progress = Progress(
+            self.processed_bytes, self.total_bytes, self.combats, self.max_combats, elapsed, None)
+        fraction = progress.fraction
+        if fraction > 0:
+            progress.remaining = elapsed * (1 - fraction) / fraction
+        return progress
@@ -0,0 +1,286 @@
+"""Sparse index mapping timestamps to positions in a logfile"""
+
+from bisect import bisect_right
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from hashlib import blake2b
+import json
+import os
+from typing import BinaryIO
+
+from .iofunc import open_logfile
+from .utilities import to_datetime
+
+DEFAULT_INDEX_INTERVAL = 1 << 20
+PROBE_SIZE = 1 << 12
+
+
+def _parse_line_time(line: bytes) -> datetime | None:
+    """
+    (Internal Function) Returns timestamp of a raw line, None if it does not start with one.
+    """
+    time_data, separator, _ = line[:32].partition(b'::')
+    if not separator:
+        return None
+    try:
+        return to_datetime(time_data.decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def iter_line_times(
+        log_file: BinaryIO, position: int, end: int) -> Iterator[tuple[int, datetime]]:
+    """
+    Yields start position and timestamp of the lines starting at or after `position` and before
+    `end`. Lines without valid timestamp, like the continuation of broken lines, are skipped.
+
+    Parameters:
+    - :param log_file: logfile opened for reading in binary mode
+    - :param position: first byte to consider; a line that started before it is skipped
+    - :param end: position that no yielded line starts at or after
+    """
+    buffer_start = max(position - 1, 0)
+    log_file.seek(buffer_start)
+    buffer = b''
+    line_start = 0
+    skip_line = position > 0
+    while buffer_start + line_start < end:
+        newline = buffer.find(b'\n', line_start)
+        if newline < 0:
+            data = log_file.read(PROBE_SIZE)
+            if len(data) > 0:
+                buffer = buffer[line_start:] + data
+                buffer_start += line_start
+                line_start = 0
+                continue
+            # last line of the file without line break
+            newline = len(buffer)
+            if newline == line_start:
+                return
+        if skip_line:
+            skip_line = False
+        else:
+            line_time = _parse_line_time(buffer[line_start:newline])
+            if line_time is not None:
+                yield buffer_start + line_start, line_time
+        line_start = newline + 1
+
+
+def read_line_time(log_file: BinaryIO, position: int, end: int) -> tuple[int, datetime] | None:
+    """
+    Returns start position and timestamp of the first line with valid timestamp starting at or
+    after `position` and before `end`; None if there is no such line.
+    """
+    return next(iter_line_times(log_file, position, end), None)
+
+
+def find_last_line_end(log_file: BinaryIO, size: int) -> int:
+    """
+    Returns position after the last line break of the first `size` bytes of a logfile, which is
+    the end of the last complete line; 0 if there is no line break.
+
+    Parameters:
+    - :param log_file: logfile opened for reading in binary mode
+    - :param size: number of bytes to consider
+    """
+    position = size
+    while position > 0:
+        chunk_start = max(position - PROBE_SIZE, 0)
+        log_file.seek(chunk_start)
+        newline = log_file.read(position - chunk_start).rfind(b'\n')
+        if newline >= 0:
+            return chunk_start + newline + 1
+        position = chunk_start
+    return 0
+
+
+def bisect_logfile(log_file: BinaryIO, time: datetime, low: int, high: int) -> int:
+    """
+    Binary search for `time` in a time-ordered region of a logfile. Returns position of the start
+    of a line with timestamp at or before `time`, less than `PROBE_SIZE` bytes before the first
+    line with timestamp after `time`. Returns `low` if all lines are after `time`.
+
+    Parameters:
+    - :param log_file: logfile opened for reading in binary mode
+    - :param time: time to search for
+    - :param low: start of a line at or before `time` or the start of the file
+    - :param high: position after the region to search
+    """
+    while high - low > PROBE_SIZE:
+        middle = (low + high) // 2
+        probe = read_line_time(log_file, middle, high)
+        if probe is None or probe[1] > time:
+            high = middle
+        else:
+            low = probe[0]
+    return low
+
+
+def find_combat_end(
+        log_file: BinaryIO, position: int, time: datetime, seconds_between_combats: float,
+        end: int) -> int:
+    """
+    Reads forward from `position` and returns the start of the first line after `time` that
+    starts a new combat, which is the end of the combat ongoing at `time`. Returns `position` if
+    the first line is after `time` and `end` if no combat starts after `time` before `end`.
+
+    Parameters:
+    - :param log_file: logfile opened for reading in binary mode
+    - :param position: start of a line at or before `time`
+    - :param time: time that the combat to search is ongoing at
+    - :param seconds_between_combats: minimum number of seconds between two combats
+    - :param end: position after the region to search
+    """
+    combat_delta = timedelta(seconds=seconds_between_combats)
+    last_line_time = None
+    for line_start, line_time in iter_line_times(log_file, position, end):
+        if line_time > time and (
+                last_line_time is None or line_time - last_line_time > combat_delta):
+            return line_start
+        last_line_time = line_time
+    return end
+
+
+class TimestampIndex:
+    """
+    Sparse index of a time-ordered logfile: samples the start position and timestamp of one line
+    every `interval` bytes, so that the position of a given time can be found reading only a few
+    small parts of the file. Growing logfiles are indexed incrementally. Random access is cheap
+    for plain logfiles and archives, but requires decompressing gzip-compressed logfiles.
+    """
+
+    __slots__ = ('log_path', 'interval', 'size', 'offsets', 'timestamps')
+
+    def __init__(self, log_path: str, interval: int = DEFAULT_INDEX_INTERVAL):
+        """
+        Parameters:
+        - :param log_path: path to the logfile
+        - :param interval: number of bytes between two samples
+        """
+        self.log_path: str = log_path
+        self.interval: int = interval
+        # size of the logfile when it was indexed
+        self.size: int = 0
+        self.offsets: list[int] = list()
+        self.timestamps: list[datetime] = list()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {len(self.offsets)} samples of {self.log_path}>'
+
+    @property
+    def first_time(self) -> datetime | None:
+        """
+        Timestamp of the first line of the logfile, None if nothing has been indexed.
+        """
+        return self.timestamps[0] if len(self.timestamps) > 0 else None
+
+    def update(self, log_file: BinaryIO | None = None) -> bool:
+        """
+        Samples the part of the logfile added since the last update. Rebuilds the index if the
+        logfile was replaced or truncated. Returns True if the index changed.
+
+        Parameters:
+        - :param log_file: logfile opened for reading in binary mode; opened if not given
+        """
+        if log_file is None:
+            with open_logfile(self.log_path) as log_file:
+                return self.update(log_file)
+        size = log_file.seek(0, os.SEEK_END)
+        if size < self.size or not self._is_valid(log_file, size):
+            self.offsets.clear()
+            self.timestamps.clear()
+            self.size = 0
+        if size == self.size:
+            return False
+        position = 0 if len(self.offsets) == 0 else self.offsets[-1] + self.interval
+        while position < size:
+            sample = read_line_time(log_file, position, size)
+            if sample is None:
+                break
+            line_start, line_time = sample
+            # samples of lines that are out of order would break the binary search
+            if len(self.timestamps) == 0 or line_time >= self.timestamps[-1]:
+                self.offsets.append(line_start)
+                self.timestamps.append(line_time)
+            position = max(line_start + 1, position + self.interval)
+        self.size = size
+        return True
+
+    def _is_valid(self, log_file: BinaryIO, size: int) -> bool:
+        """
+        (Internal Function) Checks whether the last sample still matches the logfile.
+        """
+        if len(self.offsets) == 0:
+            return True
+        sample = read_line_time(log_file, self.offsets[-1], size)
+        return sample == (self.offsets[-1], self.timestamps[-1])
+
+    def find(self, log_file: BinaryIO, time: datetime) -> int:
+        """
+        Returns position of the start of a line at or shortly before `time`, see `bisect_logfile`.
+        Returns 0 if the logfile starts after `time`.
+
+        Parameters:
+        - :param log_file: logfile opened for reading in binary mode
+        - :param time: time to search for
+        """
+        sample_num = bisect_right(self.timestamps, time)
+        low = self.offsets[sample_num - 1] if sample_num > 0 else 0
+        high = self.offsets[sample_num] if sample_num < len(self.offsets) else self.size
+        return bisect_logfile(log_file, time, low, high)
+
+    def save(self, folder_path: str):
+        """
+        Writes index to `folder_path`; see `load`.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        data = {
+            'log_path': os.path.abspath(self.log_path),
+            'interval': self.interval,
+            'size': self.size,
+            'offsets': self.offsets,
+            'timestamps': [timestamp.isoformat() for timestamp in self.timestamps],
+        }
+        with open(_get_index_path(folder_path, self.log_path), 'w') as index_file:
+            json.dump(data, index_file, separators=(',', ':'))
+
+    @classmethod
+    def load(
+            cls, folder_path: str, log_path: str,
+            interval: int = DEFAULT_INDEX_INTERVAL) -> 'TimestampIndex':
+        """
+        Returns index of `log_path` previously saved to `folder_path`. Returns a new, empty index if
+        there is no saved index for the logfile or it was created with a different interval.
+
+        Parameters:
+        - :param folder_path: folder the index was saved to
+        - :param log_path: path to the logfile
+        - :param interval: number of bytes between two samples
+        """
+        index = cls(log_path, interval)
+        try:
+            with open(_get_index_path(folder_path, log_path)) as index_file:
+                data = json.load(index_file)
+            if data['log_path'] != os.path.abspath(log_path) or data['interval'] != interval:
+                return index
+            timestamps = list(map(datetime.fromisoformat, data['timestamps']))
+            offsets = list(map(int, data['offsets']))
+            size = int(data['size'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return index
+        if len(offsets) == len(timestamps):
+            index.offsets = offsets
+            index.timestamps = timestamps
+            index.size = size
+        return index
+
+
+def _get_index_path(folder_path: str, log_path: str) -> str:
+    """
+    (Internal Function) Returns path of the saved index of a logfile.
+    """
+    path_hash = blake2b(os.path.abspath(log_path).encode(), digest_size=12).hexdigest()
+    return os.path.join(folder_path, f'{path_hash}.json')
@@ -0,0 +1,4 @@
+from .generator import CombatlogGenerator, generate_combatlog
+from .suite import BENCHMARKS, run_suite
+
+__all__ = ('BENCHMARKS', 'CombatlogGenerator', 'generate_combatlog', 'run_suite')
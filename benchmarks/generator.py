@@ -0,0 +1,293 @@
+"""Deterministic synthetic STO combatlog generator"""
+
+from datetime import datetime, timedelta
+import gzip
+from random import Random
+from typing import Iterator, TextIO
+from zlib import crc32
+
+from OSCR.detection import Detection
+
+GENERIC_NPCS = (
+    'Space_Borg_Cube_Generic', 'Space_Borg_Sphere_Generic', 'Space_Borg_Probe_Generic',
+    'Space_Borg_Tactical_Cube_Generic')
+PLAYER_ABILITIES = (
+    'Phaser Beam Array', 'Photon Torpedo', 'Fire at Will III', 'Gravity Well III',
+    'Kinetic Cutting Beam', 'Quantum Phase Beam Array', 'Dark Matter Quantum Torpedo')
+PET_ABILITIES = ('Phaser Turret', 'Tachyon Beam', 'Photon Torpedo')
+HEAL_ABILITIES = (
+    'Hazard Emitters III', 'Auxiliary to Structural III', 'Emergency Power to Shields')
+# abilities players activate on themselves; logged with empty target name and target id '*'
+SELF_ABILITIES = (
+    'Attack Pattern Beta III', 'Emergency Power to Weapons III', 'Tactical Team III')
+NPC_ABILITIES = ('Borg Cutting Beam', 'Borg Plasma Torpedo', 'Borg Disruptor Beam Array')
+# names containing commas; they are written quoted like STO writes them
+COMMA_ABILITIES = ('Entwined Tactical Matrices, Rank 3', 'Torpedo: Spread, Rank 2')
+COMMA_PETS = ('Rehona, Sister of the Qowat Milat',)
+DAMAGE_TYPES = ('Phaser', 'Plasma', 'Kinetic', 'Antiproton')
+DAMAGE_FLAGS = ('', '', '', 'Critical', 'Flank', 'Critical|Flank', 'Miss')
+
+
+def format_timestamp(timestamp: datetime) -> str:
+    """
+    Formats `timestamp` the way STO writes it to the combatlog: "24:01:13:04:37:45.7"
+    """
+    return (
+        f'{timestamp.year - 2000:02d}:{timestamp.month:02d}:{timestamp.day:02d}:'
+        f'{timestamp.hour:02d}:{timestamp.minute:02d}:{timestamp.second:02d}.'
+        f'{timestamp.microsecond // 100000}')
+
+
+class CombatlogGenerator:
+    """
+    Generates synthetic combatlogs. The same parameters always produce the same log.
+    """
+
+    __slots__ = (
+        '_random', '_players', '_pets', '_map_npcs', '_generic_npcs', 'edge_case_rate',
+        'multiline_rate', 'broken_line_rate', 'self_target_rate', 'combat_gap', 'start_time')
+
+    def __init__(
+            self, players: int = 5, pets_per_player: int = 2, npcs: int = 20,
+            map_name: str | None = 'Hive Space', difficulty: str | None = None, seed: int = 0,
+            edge_case_rate: float = 0.01, multiline_rate: float = 0.001,
+            broken_line_rate: float = 0.0005, self_target_rate: float = 0.02,
+            combat_gap: float = 200.0):
+        """
+        Parameters:
+        - :param players: number of players per combat
+        - :param pets_per_player: number of pets attacking for each player
+        - :param npcs: number of generic NPC critters per combat in addition to the map entities
+        - :param map_name: map whose identifying entities are added to each combat, see
+        `Detection`; None adds generic NPCs only
+        - :param difficulty: difficulty whose entity death counts each combat satisfies; defaults to
+        the highest difficulty known for the map
+        - :param seed: seed of the random generator
+        - :param edge_case_rate: share of player lines using ability or pet names containing commas
+        - :param multiline_rate: share of player lines whose ability name contains a line break
+        - :param broken_line_rate: share of lines that are truncated and miss fields
+        - :param self_target_rate: share of lines where a player activates an ability on
+        themselves, written like STO with empty target name and target id '*'
+        - :param combat_gap: seconds between two combats; must exceed the
+        "seconds_between_combats" setting of the parser to separate them
+        """
+        self._random = Random(seed)
+        self._players = [
+            (f'Player{i}', f'P[{10_000 + i}@{20_000 + i} Player{i}@player{i}]')
+            for i in range(players)]
+        self._pets = [
+            (f'Pet {player_index}-{i}', f'C[{30_000 + player_index * 100 + i} Pet_Fighter_{i}]')
+            for player_index in range(players) for i in range(pets_per_player)]
+        for i, pet_name in enumerate(COMMA_PETS):
+            self._pets.append((pet_name, f'C[{40_000 + i} Pet_Qowat_Milat]'))
+        self._map_npcs: dict[str, int] = dict()
+        if map_name is not None:
+            for entity, entity_map in Detection.MAP_IDENTIFIERS_EXISTENCE.items():
+                if entity_map['map'] == map_name:
+                    self._map_npcs[entity] = 1
+            death_counts = Detection.MAP_DIFFICULTY_ENTITY_DEATH_COUNTS.get(map_name, {})
+            if difficulty is None and len(death_counts) > 0:
+                difficulty = tuple(death_counts.keys())[-1]
+            for entity, death_count in death_counts.get(difficulty, {}).items():
+                self._map_npcs[entity] = max(death_count, self._map_npcs.get(entity, 0))
+            for entity in Detection.MAP_DIFFICULTY_ENTITY_HULL_COUNTS.get(map_name, {}).get(
+                    difficulty, {}):
+                self._map_npcs.setdefault(entity, 1)
+        self._generic_npcs = [GENERIC_NPCS[i % len(GENERIC_NPCS)] for i in range(npcs)]
+        self.edge_case_rate = edge_case_rate
+        self.multiline_rate = multiline_rate
+        self.broken_line_rate = broken_line_rate
+        self.self_target_rate = self_target_rate
+        self.combat_gap = combat_gap
+        self.start_time = datetime(2024, 1, 13, 4, 0, 0)
+
+    def lines(self, combats: int, lines_per_combat: int) -> Iterator[str]:
+        """
+        Yields the lines of the log including their line breaks, oldest first.
+
+        Parameters:
+        - :param combats: number of combats
+        - :param lines_per_combat: approximate number of lines per combat
+        """
+        rand = self._random
+        timestamp = self.start_time
+        critter_id = 0
+        for _ in range(combats):
+            critters = list()
+            for entity, deaths in self._map_npcs.items():
+                for _ in range(max(deaths, 1)):
+                    critters.append([f'C[{critter_id} {entity}]', entity, deaths > 0])
+                    critter_id += 1
+            for entity in self._generic_npcs:
+                critters.append([f'C[{critter_id} {entity}]', entity, rand.random() < 0.5])
+                critter_id += 1
+            killed_critters = [critter for critter in critters if critter[2]]
+            kill_range = range(lines_per_combat // 2, lines_per_combat)
+            kill_lines = dict(zip(
+                rand.sample(kill_range, min(len(killed_critters), len(kill_range))),
+                killed_critters))
+            for line_num in range(lines_per_combat):
+                timestamp += timedelta(milliseconds=rand.randrange(0, 200, 100))
+                critter = kill_lines.get(line_num)
+                if critter is not None:
+                    line = self._player_attack(critter, kill=True)
+                else:
+                    line = self._random_line(rand.choice(critters))
+                yield f'{format_timestamp(timestamp)}::{line}\n'
+            timestamp += timedelta(seconds=self.combat_gap)
+
+    def _random_line(self, critter: list) -> str:
+        """
+        (Internal Function) Returns a random line without timestamp.
+        """
+        roll = self._random.random()
+        if roll < self.broken_line_rate:
+            return self._player_attack(critter).rsplit(',', 4)[0]
+        elif roll < self.broken_line_rate + self.self_target_rate:
+            return self._self_buff()
+        elif roll < 0.55:
+            return self._player_attack(critter)
+        elif roll < 0.7:
+            return self._pet_attack(critter)
+        elif roll < 0.88:
+            return self._npc_attack(critter)
+        else:
+            return self._heal()
+
+    def _player_attack(self, critter: list, kill: bool = False) -> str:
+        """
+        (Internal Function) Returns line of a player damaging `critter`.
+        """
+        rand = self._random
+        player_name, player_id = rand.choice(self._players)
+        roll = rand.random()
+        if roll < self.multiline_rate:
+            ability = rand.choice(PLAYER_ABILITIES).replace(' ', '\n', 1)
+        elif roll < self.multiline_rate + self.edge_case_rate:
+            ability = f'"{rand.choice(COMMA_ABILITIES)}"'
+        else:
+            ability = rand.choice(PLAYER_ABILITIES)
+        return self._damage(player_name, player_id, '', '*', critter, ability, kill)
+
+    def _pet_attack(self, critter: list) -> str:
+        """
+        (Internal Function) Returns line of a pet damaging `critter`.
+        """
+        rand = self._random
+        player_name, player_id = rand.choice(self._players)
+        pet_name, pet_id = rand.choice(self._pets)
+        return self._damage(
+            player_name, player_id, pet_name, pet_id, critter, rand.choice(PET_ABILITIES), False)
+
+    def _damage(
+            self, owner_name: str, owner_id: str, source_name: str, source_id: str,
+            critter: list, ability: str, kill: bool) -> str:
+        """
+        (Internal Function) Returns damage line without timestamp; alternates between shield and
+        hull damage.
+        """
+        rand = self._random
+        critter_id, critter_name, _ = critter
+        ability_id = f'Pn.{crc32(ability.encode()) % 1_000_000:06d}'
+        if rand.random() < 0.3:
+            magnitude = rand.uniform(100, 4000)
+            damage_type = 'Shield'
+            base_magnitude = -magnitude
+        else:
+            magnitude = rand.uniform(100, 20_000)
+            damage_type = rand.choice(DAMAGE_TYPES)
+            base_magnitude = magnitude * rand.uniform(0.5, 1)
+        flags = 'Kill' if kill else rand.choice(DAMAGE_FLAGS)
+        if 'Miss' in flags:
+            magnitude = base_magnitude = 0
+        return (
+            f'{owner_name},{owner_id},{source_name},{source_id},{critter_name},{critter_id},'
+            f'{ability},{ability_id},{damage_type},{flags},{magnitude:.2f},{base_magnitude:.2f}')
+
+    def _npc_attack(self, critter: list) -> str:
+        """
+        (Internal Function) Returns line of `critter` damaging a player.
+        """
+        rand = self._random
+        critter_id, critter_name, _ = critter
+        player_name, player_id = rand.choice(self._players)
+        ability = rand.choice(NPC_ABILITIES)
+        damage_type = rand.choice(('Shield', 'Plasma', 'Plasma'))
+        magnitude = rand.uniform(100, 3000)
+        flags = 'Kill' if rand.random() < 0.002 else rand.choice(DAMAGE_FLAGS)
+        return (
+            f'{critter_name},{critter_id},,*,{player_name},{player_id},{ability},'
+            f'Pn.{NPC_ABILITIES.index(ability)},{damage_type},{flags},{magnitude:.2f},'
+            f'{magnitude:.2f}')
+
+    def _self_buff(self) -> str:
+        """
+        (Internal Function) Returns line of a player activating an ability on themselves.
+        """
+        rand = self._random
+        player_name, player_id = rand.choice(self._players)
+        ability = rand.choice(SELF_ABILITIES)
+        return (
+            f'{player_name},{player_id},,*,,*,{ability},Pn.{SELF_ABILITIES.index(ability)},'
+            f'Shield,,0,0')
+
+    def _heal(self) -> str:
+        """
+        (Internal Function) Returns line of a player healing a player.
+        """
+        rand = self._random
+        player_name, player_id = rand.choice(self._players)
+        target_name, target_id = rand.choice(self._players)
+        ability = rand.choice(HEAL_ABILITIES)
+        magnitude = rand.uniform(100, 5000)
+        if rand.random() < 0.4:
+            heal_type = 'Shield'
+            base_magnitude = 0
+        else:
+            heal_type = 'HitPoints'
+            base_magnitude = -magnitude
+        flags = 'Critical' if rand.random() < 0.1 else ''
+        return (
+            f'{player_name},{player_id},,*,{target_name},{target_id},{ability},'
+            f'Pn.{HEAL_ABILITIES.index(ability)},{heal_type},{flags},{-magnitude:.2f},'
+            f'{base_magnitude:.2f}')
+
+    def write(
+            self, path: str, combats: int, lines_per_combat: int,
+            compress: bool = False) -> int:
+        """
+        Writes the log to `path` and returns the number of lines written.
+
+        Parameters:
+        - :param path: target file; overwritten if it exists
+        - :param combats: number of combats
+        - :param lines_per_combat: approximate number of lines per combat
+        - :param compress: writes gzip-compressed log if True
+        """
+        log_file: TextIO
+        if compress:
+            log_file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        else:
+            log_file = open(path, 'w', encoding='utf-8', newline='')
+        line_count = 0
+        with log_file:
+            for line in self.lines(combats, lines_per_combat):
+                log_file.write(line)
+                line_count += 1
+        return line_count
+
+
+def generate_combatlog(
+        path: str, combats: int = 6, lines_per_combat: int = 5000, compress: bool = False,
+        **generator_args) -> int:
+    """
+    Writes synthetic combatlog to `path` and returns the number of lines written.
+
+    Parameters:
+    - :param path: target file; overwritten if it exists
+    - :param combats: number of combats
+    - :param lines_per_combat: approximate number of lines per combat
+    - :param compress: writes gzip-compressed log if True
+    - :param generator_args: passed to `CombatlogGenerator`
+    """
+    return CombatlogGenerator(**generator_args).write(path, combats, lines_per_combat, compress)
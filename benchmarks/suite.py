@@ -0,0 +1,320 @@
+"""Throughput and peak memory benchmarks of OSCR's processing stages"""
+
+from argparse import ArgumentParser
+from collections.abc import Callable
+from copy import deepcopy
+import json
+import multiprocessing
+from multiprocessing import forkserver
+import os
+import shutil
+from statistics import median
+import sys
+import tempfile
+from time import perf_counter
+
+from OSCR import LiveParser, OSCR, repair_logfile
+from OSCR.combat import Combat
+from OSCR.parser import analyze_combat
+
+from .generator import generate_combatlog
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_SIZES = (10_000, 100_000, 500_000)
+LINES_PER_COMBAT = 5000
+ALL_COMBATS = 10_000  # more combats than any generated log contains
+
+# A benchmark receives the log path and a scratch folder and returns a setup function and the
+# function to measure. The setup function is called before every run, outside of the measured time,
+# and its return value is passed to the measured function.
+Benchmark = Callable[[str, str], tuple[Callable[[], object], Callable[[object], object]]]
+
+
+def _parser_settings(work_dir: str) -> dict:
+    """
+    (Internal Function) Returns settings for `OSCR` instances of the benchmarks.
+    """
+    return {
+        'combats_to_parse': ALL_COMBATS,
+        'templog_folder_path': os.path.join(work_dir, 'templog'),
+    }
+
+
+def bench_isolate_combats(log_path: str, work_dir: str):
+    """
+    Measures `OSCR.isolate_combats` on the entire log.
+    """
+    settings = _parser_settings(work_dir)
+    return (lambda: OSCR(settings=settings)), (lambda parser: parser.isolate_combats(log_path))
+
+
+def bench_analyze_log_file(log_path: str, work_dir: str):
+    """
+    Measures reading, tokenizing and splitting the entire log with `OSCR._analyze_log_file`.
+    """
+    settings = _parser_settings(work_dir)
+    settings.update(OSCR(settings=settings)._settings)
+    return (lambda: None), (
+        lambda _: OSCR._analyze_log_file(log_path, ALL_COMBATS, 0, -1, settings))
+
+
+def bench_analyze_combat(log_path: str, work_dir: str):
+    """
+    Measures `analyze_combat` on all combats of the log; isolating them is not measured.
+    """
+    settings = _parser_settings(work_dir)
+    settings.update(OSCR(settings=settings)._settings)
+    combats: list[Combat] = list()
+    OSCR._analyze_log_file(log_path, ALL_COMBATS, 0, -1, settings, combats.append)
+
+    def run(isolated_combats: list[Combat]):
+        for combat in isolated_combats:
+            analyze_combat(combat)
+    return (lambda: deepcopy(combats)), run
+
+
+def bench_analyze_log_file_mp(log_path: str, work_dir: str):
+    """
+    Measures `OSCR.analyze_log_file_mp` with processes until all combats have been analyzed.
+    """
+    settings = _parser_settings(work_dir)
+    settings['analysis_backend'] = 'processes'
+
+    def run(parser: OSCR):
+        parser.analyze_log_file_mp(log_path)
+        multiprocessing.active_children()  # reaps the isolating process
+    return (lambda: OSCR(settings=settings)), run
+
+
+def bench_analyze_log_file_mp_threads(log_path: str, work_dir: str):
+    """
+    Measures `OSCR.analyze_log_file_mp` with threads until all combats have been analyzed. Only
+    faster than processes on free-threaded builds of Python with the GIL disabled.
+    """
+    settings = _parser_settings(work_dir)
+    settings['analysis_backend'] = 'threads'
+    return (lambda: OSCR(settings=settings)), (lambda parser: parser.analyze_log_file_mp(log_path))
+
+
+def bench_live_replay(log_path: str, work_dir: str):
+    """
+    Measures `LiveParser.replay` at full speed.
+    """
+    return (lambda: LiveParser()), (lambda parser: parser.replay(log_path, speed=0))
+
+
+def bench_repair_logfile(log_path: str, work_dir: str):
+    """
+    Measures `repair_logfile` on a fresh copy of the log.
+    """
+    repair_path = os.path.join(work_dir, 'repair.log')
+    templog_path = os.path.join(work_dir, 'templog')
+    os.makedirs(templog_path, exist_ok=True)
+    return (
+        (lambda: shutil.copyfile(log_path, repair_path)),
+        (lambda _: repair_logfile(repair_path, templog_path)))
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    'isolate_combats': bench_isolate_combats,
+    '_analyze_log_file': bench_analyze_log_file,
+    'analyze_combat': bench_analyze_combat,
+    'analyze_log_file_mp': bench_analyze_log_file_mp,
+    'analyze_log_file_mp_threads': bench_analyze_log_file_mp_threads,
+    'live_replay': bench_live_replay,
+    'repair_logfile': bench_repair_logfile,
+}
+# benchmarks that can only read plain text logs
+PLAIN_ONLY = frozenset(('repair_logfile',))
+
+
+def time_benchmark(
+        benchmark: Benchmark, log_path: str, work_dir: str, repetitions: int,
+        warmup: int) -> list[float]:
+    """
+    Runs benchmark `warmup + repetitions` times and returns the durations of the last
+    `repetitions` runs in seconds.
+    """
+    setup, function = benchmark(log_path, work_dir)
+    durations = list()
+    for run_num in range(warmup + repetitions):
+        state = setup()
+        start = perf_counter()
+        function(state)
+        duration = perf_counter() - start
+        if run_num >= warmup:
+            durations.append(duration)
+    return durations
+
+
+def _max_rss() -> int:
+    """
+    (Internal Function) Returns largest resident set size of this process and its waited-for
+    children in bytes.
+    """
+    rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _measure_memory(name: str, log_path: str, work_dir: str, connection):
+    """
+    (Internal Function) Runs benchmark once and sends resident set size before and after the run to
+    `connection`. Executed in a fresh process.
+    """
+    setup, function = BENCHMARKS[name](log_path, work_dir)
+    state = setup()
+    baseline = _max_rss()
+    function(state)
+    connection.send((baseline, _max_rss()))
+    connection.close()
+
+
+def measure_memory(name: str, log_path: str, work_dir: str) -> tuple[int, int] | None:
+    """
+    Runs benchmark `name` once in a fresh process and returns its peak resident set size before
+    and after the measured function ran in bytes, including worker processes forked by it. Returns
+    None if the platform does not support measuring it.
+
+    The process is forked from the fork server because the peak resident set size is inherited by
+    child processes; call `multiprocessing.forkserver.ensure_running` before the benchmarking
+    process grows to start the server while it is small.
+    """
+    if resource is None:
+        return None
+    context = multiprocessing.get_context('forkserver')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_memory, args=(name, log_path, work_dir, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    return result
+
+
+def run_suite(
+        sizes: tuple[int] = DEFAULT_SIZES, benchmarks: tuple[str] | None = None,
+        repetitions: int = 3, warmup: int = 1, memory: bool = True, compress: bool = False,
+        work_dir: str = '', seed: int = 0,
+        progress_callback: Callable[[dict], None] | None = None) -> list[dict]:
+    """
+    Generates a synthetic log for every size, runs the benchmarks on it and returns one result
+    dictionary per benchmark and size.
+
+    Parameters:
+    - :param sizes: numbers of lines of the generated logs
+    - :param benchmarks: names of the benchmarks to run, see `BENCHMARKS`; runs all if not given
+    - :param repetitions: number of measured runs per benchmark and size
+    - :param warmup: number of unmeasured runs before the measured runs
+    - :param memory: measures peak memory in an additional run in a fresh process
+    - :param compress: generates gzip-compressed logs; benchmarks that require plain logs still
+    get a plain log
+    - :param work_dir: folder for generated logs and scratch files; a temporary folder that is
+    deleted afterwards is used if not given
+    - :param seed: seed of the log generator
+    - :param progress_callback: called with every result as soon as it is available
+    """
+    if benchmarks is None:
+        benchmarks = tuple(BENCHMARKS.keys())
+    remove_work_dir = work_dir == ''
+    if remove_work_dir:
+        work_dir = tempfile.mkdtemp(prefix='oscr_bench_')
+    else:
+        os.makedirs(work_dir, exist_ok=True)
+    if memory and resource is not None:
+        forkserver.ensure_running()
+    results = list()
+    try:
+        for size in sizes:
+            combats = max(1, size // LINES_PER_COMBAT)
+            plain_path = os.path.join(work_dir, f'bench_{size}.log')
+            line_count = generate_combatlog(
+                plain_path, combats, size // combats, seed=seed)
+            if compress:
+                compressed_path = plain_path + '.gz'
+                generate_combatlog(compressed_path, combats, size // combats, True, seed=seed)
+            for name in benchmarks:
+                if compress and name not in PLAIN_ONLY:
+                    log_path = compressed_path
+                else:
+                    log_path = plain_path
+                durations = time_benchmark(
+                    BENCHMARKS[name], log_path, work_dir, repetitions, warmup)
+                result = {
+                    'benchmark': name,
+                    'lines': line_count,
+                    'bytes': os.path.getsize(plain_path),
+                    'compressed': log_path != plain_path,
+                    'durations': durations,
+                    'median': median(durations),
+                    'best': min(durations),
+                }
+                result['lines_per_second'] = line_count / result['median']
+                result['mb_per_second'] = result['bytes'] / result['median'] / 1_000_000
+                if memory:
+                    rss = measure_memory(name, log_path, work_dir)
+                    result['baseline_rss'], result['peak_rss'] = rss if rss else (None, None)
+                results.append(result)
+                if progress_callback is not None:
+                    progress_callback(result)
+    finally:
+        if remove_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def format_result(result: dict) -> str:
+    """
+    Formats result of `run_suite` as table row.
+    """
+    if result.get('peak_rss') is not None:
+        memory = (
+            f"{result['peak_rss'] / 1_048_576:>9.1f} MiB "
+            f"(+{(result['peak_rss'] - result['baseline_rss']) / 1_048_576:.1f})")
+    else:
+        memory = f"{'-':>13}"
+    return (
+        f"{result['benchmark']:<30}{result['lines']:>10,}{result['median']:>10.3f}s"
+        f"{result['lines_per_second']:>13,.0f}{result['mb_per_second']:>10.2f}  {memory}")
+
+
+def main():
+    """
+    Runs the benchmark suite from the command line.
+    """
+    arg_parser = ArgumentParser(
+        prog='python -m benchmarks', description='Benchmarks OSCR on synthetic combatlogs.')
+    arg_parser.add_argument(
+        '--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+        help='comma-separated numbers of lines of the generated logs')
+    arg_parser.add_argument(
+        '--only', action='append', choices=tuple(BENCHMARKS.keys()),
+        help='runs only this benchmark; can be given multiple times')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='measured runs per benchmark')
+    arg_parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs per benchmark')
+    arg_parser.add_argument(
+        '--no-memory', action='store_true', help='skips measuring peak memory')
+    arg_parser.add_argument('--gzip', action='store_true', help='benchmarks gzip-compressed logs')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the log generator')
+    arg_parser.add_argument(
+        '--work-dir', default='', help='keeps generated logs in this folder')
+    arg_parser.add_argument('--json', default='', help='writes results as JSON to this file')
+    args = arg_parser.parse_args()
+    print(
+        f"{'benchmark':<30}{'lines':>10}{'median':>11}{'lines/s':>13}{'MB/s':>10}  "
+        f"{'peak memory':>13}")
+    results = run_suite(
+        tuple(int(size) for size in args.sizes.split(',')),
+        tuple(args.only) if args.only else None, args.repeat, args.warmup, not args.no_memory,
+        args.gzip, args.work_dir, args.seed, lambda result: print(format_result(result)))
+    if args.json != '':
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)